@@ -0,0 +1,159 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from disk_cache import DiskCache
+
+# Server-side quiz store: a served quiz (chapter + full MCQs with answer keys and
+# explanations) is kept under a short random id, so clients only ever hold the id
+# and send back id + answers. Quizzes expire after QUIZ_TTL seconds.
+#
+#   QUIZ_STORE=memory                      in-process, bounded by count and bytes (default)
+#   QUIZ_STORE=sqlite:../cache/quizzes.sqlite   shared by the workers of one host
+#   QUIZ_STORE=redis://localhost:6379/0    shared across hosts (needs the redis package)
+
+QUIZ_STORE = os.getenv("QUIZ_STORE", "memory")
+QUIZ_TTL = float(os.getenv("QUIZ_TTL", 2 * 3600))
+MAX_QUIZZES = 10000
+MAX_QUIZ_BYTES = 64 * 1024 * 1024
+# 9 random bytes -> 12 URL-safe characters
+QUIZ_ID_BYTES = 9
+QUIZ_KEY_PREFIX = "quiz:"
+
+def new_quiz_id() -> str:
+    return secrets.token_urlsafe(QUIZ_ID_BYTES)
+
+def public_mcqs(mcqs: List[Dict]) -> List[Dict]:
+    # What the client may see: no correct option, letter or explanation
+    return [{k: v for k, v in mcq.items() if k not in ("correct", "correct_letter", "explanation")} for mcq in mcqs]
+
+def parse_answers(user_answers, count: int) -> List[int]:
+    # Option indexes from a check_mcqs payload, one per question; missing or null
+    # answers count as unanswered (-1). Raises ValueError on anything else.
+    if user_answers is None:
+        user_answers = []
+    if not isinstance(user_answers, list):
+        raise ValueError("user_answers must be a list of option indexes.")
+    answers = []
+    for answer in user_answers[:count]:
+        if answer is None:
+            answers.append(-1)
+            continue
+        try:
+            answers.append(int(answer))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid answer {answer!r}; expected an option index.")
+    return answers + [-1] * (count - len(answers))
+
+class QuizStore:
+    # In-process store; the oldest quizzes are evicted past `max_quizzes` or `max_bytes`
+    # (serialized size), expired ones on access
+    def __init__(self, ttl: float = QUIZ_TTL, max_quizzes: int = MAX_QUIZZES, max_bytes: int = MAX_QUIZ_BYTES):
+        self.ttl = ttl
+        self.max_quizzes = max_quizzes
+        self.max_bytes = max_bytes
+        self._quizzes = OrderedDict()  # id -> (expires, size, quiz)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def create(self, chapter: str, mcqs: List[Dict]) -> str:
+        quiz = {"chapter": chapter, "mcqs": [dict(mcq) for mcq in mcqs]}
+        size = len(json.dumps(quiz))
+        quiz_id = new_quiz_id()
+        with self._lock:
+            self._quizzes[quiz_id] = (time.time() + self.ttl, size, quiz)
+            self._bytes += size
+            self._evict()
+        return quiz_id
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._quizzes.get(quiz_id)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._drop(quiz_id)
+                return None
+            quiz = entry[2]
+        return {"chapter": quiz["chapter"], "mcqs": [dict(mcq) for mcq in quiz["mcqs"]]}
+
+    def delete(self, quiz_id: str):
+        with self._lock:
+            if quiz_id in self._quizzes:
+                self._drop(quiz_id)
+
+    def _drop(self, quiz_id: str):
+        self._bytes -= self._quizzes.pop(quiz_id)[1]
+
+    def _evict(self):
+        now = time.time()
+        # Insertion order is expiry order (fixed TTL), so expired quizzes are at the front
+        while self._quizzes and next(iter(self._quizzes.values()))[0] < now:
+            self._drop(next(iter(self._quizzes)))
+        while self._quizzes and (len(self._quizzes) > self.max_quizzes or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._quizzes)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"quizzes": len(self._quizzes), "bytes": self._bytes}
+
+class SqliteQuizStore:
+    # Quizzes as JSON in a DiskCache, which already handles TTL and the byte bound
+    def __init__(self, path: str, ttl: float = QUIZ_TTL, max_bytes: int = MAX_QUIZ_BYTES):
+        self.cache = DiskCache(path, max_bytes=max_bytes, ttl=ttl)
+
+    def create(self, chapter: str, mcqs: List[Dict]) -> str:
+        quiz_id = new_quiz_id()
+        self.cache.set(QUIZ_KEY_PREFIX + quiz_id, json.dumps({"chapter": chapter, "mcqs": mcqs}))
+        return quiz_id
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        value = self.cache.get(QUIZ_KEY_PREFIX + quiz_id)
+        return None if value is None else json.loads(value)
+
+    def delete(self, quiz_id: str):
+        self.cache.delete(QUIZ_KEY_PREFIX + quiz_id)
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+class RedisQuizStore:
+    # Any Redis-protocol server (Redis, Valkey, KeyDB...); expiry via SETEX, memory
+    # bounds via the server's maxmemory policy
+    def __init__(self, url: str, ttl: float = QUIZ_TTL):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("QUIZ_STORE=redis://... needs the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def create(self, chapter: str, mcqs: List[Dict]) -> str:
+        quiz_id = new_quiz_id()
+        self.client.setex(QUIZ_KEY_PREFIX + quiz_id, int(self.ttl), json.dumps({"chapter": chapter, "mcqs": mcqs}))
+        return quiz_id
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        value = self.client.get(QUIZ_KEY_PREFIX + quiz_id)
+        return None if value is None else json.loads(value)
+
+    def delete(self, quiz_id: str):
+        self.client.delete(QUIZ_KEY_PREFIX + quiz_id)
+
+    def stats(self) -> Dict:
+        return {"backend": "redis"}
+
+def open_quiz_store(spec: str = QUIZ_STORE, ttl: float = QUIZ_TTL):
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQuizStore(spec, ttl=ttl)
+    if spec.startswith("sqlite:"):
+        path = spec[len("sqlite:"):]
+        if not os.path.isabs(path):
+            path = os.path.abspath(os.path.join(os.path.dirname(__file__), path))
+        return SqliteQuizStore(path, ttl=ttl)
+    if spec == "memory":
+        return QuizStore(ttl=ttl)
+    raise ValueError(f"Unknown QUIZ_STORE {spec!r}; use memory, sqlite:<path> or redis://...")
@@ -0,0 +1,94 @@
+import json
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from embedding_server import make_faiss_store
+from together_rag import TogetherRAG, open_response_cache
+from async_rag import AsyncTogetherRAG
+from answer_keys import open_quiz_store, parse_answers, public_mcqs
+from chapter_registry import ChapterRegistry
+from metrics import instrument_asgi, stage
+
+# asyncio serving path with the same routes as flask_rag_custom.py:
+#   uvicorn asgi_app:app --workers 1
+# LLM calls are awaited on a pooled async client and retrieval runs in a bounded
+# executor, so one worker can keep many slow completions in flight. Blocking disk
+# I/O (response cache, quiz store) goes through the same executor.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Hot chapters load in a background thread; the first requests need not wait
+    registry.prewarm()
+    yield
+    await async_rag.aclose()
+
+app = FastAPI(lifespan=lifespan)
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
+
+FAISS_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../faiss_indexes'))
+faiss_store = make_faiss_store(FAISS_INDEX_DIR)
+rag = TogetherRAG(faiss_store, cache=open_response_cache())
+async_rag = AsyncTogetherRAG(rag)
+registry = ChapterRegistry(faiss_store, FAISS_INDEX_DIR)
+
+quiz_store = open_quiz_store()
+instrument_asgi(app, rag, quiz_store, registry)
+
+@app.get("/")
+async def index(request: Request):
+    with stage("render"):
+        return templates.TemplateResponse(request, "rag_ui.html", {"chapters": registry.chapters()})
+
+@app.get("/chapters")
+async def chapters():
+    return {"chapters": await async_rag._offload(registry.info)}
+
+@app.post("/generate_notes")
+async def generate_notes(request: Request):
+    chapter = (await request.json()).get("chapter")
+    try:
+        notes = await async_rag.generate_chapter_notes(chapter)
+        return {"success": True, "notes": notes}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@app.get("/stream_notes")
+async def stream_notes(chapter: str):
+    async def events():
+        try:
+            async for delta in async_rag.stream_chapter_notes(chapter):
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/generate_mcqs")
+async def generate_mcqs(request: Request):
+    body = await request.json()
+    chapter = body.get("chapter")
+    num_mcqs = int(body.get("num_mcqs", 3))
+    try:
+        mcqs = await async_rag.generate_mcq(chapter, num_mcqs=num_mcqs)
+        # Answer keys stay on the server; the client only gets the quiz id
+        quiz_id = await async_rag._offload(quiz_store.create, chapter, mcqs)
+        return {"success": True, "quiz_id": quiz_id, "mcqs": public_mcqs(mcqs)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@app.post("/check_mcqs")
+async def check_mcqs(request: Request):
+    body = await request.json()
+    user_answers = body.get("user_answers")
+    quiz = await async_rag._offload(quiz_store.get, body.get("quiz_id") or "")
+    if quiz is None:
+        return JSONResponse({"success": False, "error": "Quiz expired, please start a new one."})
+    try:
+        answers = parse_answers(user_answers, len(quiz["mcqs"]))
+        results = await async_rag.grade_quiz(quiz["chapter"], quiz["mcqs"], answers)
+        return {"results": results}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
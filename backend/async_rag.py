@@ -0,0 +1,289 @@
+import asyncio
+import contextvars
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, AsyncIterator, Awaitable, Callable, Hashable
+import httpx
+from together import AsyncTogether
+import metrics
+from together_rag import (TogetherRAG, QuestionDeduper, LLM_BASE_URL, MCQ_QUESTIONS_PER_CALL, MCQ_MAX_WORKERS,
+                          MCQ_MAX_CALL_FACTOR, MCQ_SOURCES, MCQ_SOURCE, EXPLAIN_MAX_WORKERS, log_llm_call)
+
+# Pooled async HTTP client for the LLM and a bounded executor for the CPU-bound
+# embedding/FAISS work, so neither blocks the event loop
+LLM_TIMEOUT = 60.0
+LLM_CONNECT_TIMEOUT = 5.0
+LLM_MAX_CONNECTIONS = 64
+RETRIEVAL_WORKERS = 4
+
+def make_async_client(base_url: Optional[str] = LLM_BASE_URL, timeout: float = LLM_TIMEOUT,
+                      max_connections: int = LLM_MAX_CONNECTIONS) -> AsyncTogether:
+    api_key = os.getenv("TOGETHER_API")
+    if not api_key:
+        raise ValueError("TOGETHER_API key not found in environment variables.")
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=LLM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+    # Retries and backoff are done in AsyncTogetherRAG._call with the scheduler's policy
+    return AsyncTogether(api_key=api_key, base_url=base_url, timeout=timeout, http_client=http_client,
+                         max_retries=0)
+
+class AsyncSharedStream:
+    # asyncio twin of llm_scheduler.SharedStream: one upstream stream, replayed from
+    # the start to each subscriber
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def append(self, delta: str):
+        self.parts.append(delta)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def __aiter__(self):
+        i = 0
+        while True:
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class AsyncTogetherRAG:
+    # asyncio front end over a TogetherRAG: the same prompts, cache keys and MCQ bank,
+    # with LLM calls awaited on an async client and retrieval run in an executor.
+    # Identical in-flight requests are coalesced per instance, and every call takes
+    # its token from, and backs off with, the TogetherRAG's scheduler, so sync and
+    # async callers share one rate limit. Calls are not queued by priority here:
+    # the event loop has no worker pool to order.
+    def __init__(self, rag: TogetherRAG, client: Optional[Any] = None, retrieval_workers: int = RETRIEVAL_WORKERS):
+        # `client` is anything exposing an awaitable `chat.completions.create(...)`
+        self.rag = rag
+        self.client = client if client is not None else make_async_client()
+        self.executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="retrieval")
+        self._inflight: Dict[Hashable, Any] = {}  # coalescing key -> Task or AsyncSharedStream
+        self._tasks = set()  # running request tasks; the event loop only holds weak references
+
+    async def _offload(self, fn, *args):
+        # In the caller's context, so stage timings land in the current request's trace
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, *args)
+
+    async def _call(self, fn: Callable[[], Awaitable[Any]], started: Callable[[], bool] = lambda: False) -> Any:
+        # One LLM request under the shared rate limit, retried like LLMScheduler._attempt
+        scheduler = self.rag.scheduler
+        attempt = 0
+        while True:
+            delay = scheduler.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scheduler.count_call()
+            try:
+                return await fn()
+            except Exception as e:
+                delay = None if started() or attempt >= scheduler.max_retries else scheduler.backoff(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+    def _shared(self, key: Optional[Hashable], make):
+        # -> the in-flight handle for `key`, or a new one from make(); None keys are never shared
+        handle = self._inflight.get(key) if key is not None else None
+        if handle is not None:
+            metrics.inc("llm_coalesced_total")
+            return handle, False
+        handle = make()
+        if key is not None:
+            self._inflight[key] = handle
+        return handle, True
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _release(self, key: Optional[Hashable], handle):
+        if key is not None and self._inflight.get(key) is handle:
+            del self._inflight[key]
+
+    async def _complete(self, prompt: str, key: Optional[str] = None, kind: str = "completion",
+                        coalesce: bool = True, **kwargs) -> str:
+        # The response cache is SQLite on disk, so its reads and writes go through the executor
+        cache = self.rag.cache
+        if key is not None:
+            cached = await self._offload(cache.get, key)
+            if cached is not None:
+                return cached
+
+        async def request():
+            start = time.perf_counter()
+            response = await self.client.chat.completions.create(
+                model=self.rag.model,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            )
+            content = response.choices[0].message.content.strip()
+            log_llm_call(kind, prompt, content, getattr(response, "usage", None), time.perf_counter() - start)
+            if key is not None:
+                await self._offload(cache.set, key, content)
+            return content
+
+        request_key = ("complete", self.rag._request_key(prompt, kwargs)) if coalesce else None
+        task, created = self._shared(request_key, lambda: self._spawn(self._call(request)))
+        if created:
+            task.add_done_callback(lambda t: self._release(request_key, t))
+        # A cancelled caller must not cancel the request other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def _stream(self, prompt: str, key: Optional[str] = None, kind: str = "completion",
+                      **kwargs) -> AsyncIterator[str]:
+        if key is not None:
+            cached = await self._offload(self.rag.cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+        request_key = ("stream", self.rag._request_key(prompt, kwargs))
+        shared, created = self._shared(request_key, AsyncSharedStream)
+        if created:
+            async def request():
+                start = time.perf_counter()
+                stream = await self.client.chat.completions.create(
+                    model=self.rag.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    **kwargs
+                )
+                usage = None
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        shared.append(delta)
+                log_llm_call(kind, prompt, "".join(shared.parts), usage, time.perf_counter() - start)
+                if key is not None:
+                    await self._offload(self.rag.cache.set, key, "".join(shared.parts).strip())
+
+            async def produce():
+                # Runs to the end even if every subscriber disconnects, so the result is cached
+                try:
+                    await self._call(request, started=lambda: bool(shared.parts))
+                    shared.finish()
+                except Exception as e:
+                    shared.finish(e)
+                finally:
+                    self._release(request_key, shared)
+
+            self._spawn(produce())
+        async for delta in shared:
+            yield delta
+
+    async def generate_chapter_notes(self, chapter: str) -> str:
+        prompt = await self._offload(self.rag._notes_prompt, chapter)
+        return await self._complete(prompt, self.rag._completion_key(prompt, {}), kind="notes")
+
+    async def stream_chapter_notes(self, chapter: str) -> AsyncIterator[str]:
+        prompt = await self._offload(self.rag._notes_prompt, chapter)
+        async for delta in self._stream(prompt, self.rag._completion_key(prompt, {}), kind="notes"):
+            yield delta
+
+    async def generate_mcq(self, chapter: str, num_mcqs: int = 5, questions_per_call: int = MCQ_QUESTIONS_PER_CALL,
+                           max_workers: int = MCQ_MAX_WORKERS, source: str = MCQ_SOURCE) -> List[Dict]:
+        if source not in MCQ_SOURCES:
+            raise ValueError(f"Unknown MCQ source {source!r}; expected one of {MCQ_SOURCES}.")
+        mcqs = await self._offload(self.rag._index_mcqs, chapter, num_mcqs) if source == "index" else []
+        missing = num_mcqs - len(mcqs)
+        if missing > 0:
+            bank = await self._offload(self.rag.load_mcq_bank, chapter)
+            mcqs += random.sample(bank, min(missing, len(bank)))
+            if len(mcqs) < num_mcqs:
+                fresh = await self._generate_new_mcqs(chapter, num_mcqs - len(mcqs), questions_per_call,
+                                                      max_workers, existing=bank)
+                if fresh:
+                    await self._offload(self.rag._add_to_mcq_bank, chapter, fresh)
+                mcqs += fresh
+        return [dict(mcq) for mcq in mcqs]
+
+    async def _generate_new_mcqs(self, chapter: str, num_mcqs: int, questions_per_call: int,
+                                 max_workers: int, existing: List[Dict] = ()) -> List[Dict]:
+        dedupe = await self._offload(QuestionDeduper, self.rag.faiss_store.embed_chunks, existing)
+        questions_per_call = max(1, questions_per_call)
+        max_calls = -(-num_mcqs // questions_per_call) * MCQ_MAX_CALL_FACTOR
+        limit = asyncio.Semaphore(max(1, max_workers))
+        mcqs = []
+        calls = 0
+
+        async def batch(context, count):
+            async with limit:
+                content = await self._complete(self.rag._mcq_prompt(context, count), kind="mcq", coalesce=False,
+                                               max_tokens=512 * count)
+                return self.rag._parse_batch(content, count)
+
+        # Each round asks for exactly what is still missing, each call with its own
+        # context window; malformed or duplicate output is retried in the next round
+        # until the call budget runs out
+        while len(mcqs) < num_mcqs and calls < max_calls:
+            missing = num_mcqs - len(mcqs)
+            counts = [min(questions_per_call, missing - start) for start in range(0, missing, questions_per_call)]
+            counts = counts[:max_calls - calls]
+            calls += len(counts)
+            contexts = await self._offload(self.rag._mcq_windows, chapter, counts)
+            for parsed in await asyncio.gather(*(batch(ctx, count) for ctx, count in zip(contexts, counts))):
+                mcqs.extend(await self._offload(dedupe.filter, parsed))
+        return mcqs[:num_mcqs]
+
+    async def explain_answer(self, chapter: str, question: str, user_answer: str, correct_answer: str) -> str:
+        key = self.rag._explanation_key(chapter, question, user_answer, correct_answer)
+        if key is not None:
+            cached = await self._offload(self.rag.cache.get, key)
+            if cached is not None:
+                return cached
+        chunks = await self._offload(self.rag.retrieve_context, chapter, question, 5)
+        context = self.rag._explanation_context(question, correct_answer, chunks)
+        prompt = self.rag._explanation_prompt(question, user_answer, correct_answer, context)
+        return await self._complete(prompt, key, kind="explanation")
+
+    async def grade_quiz(self, chapter: str, mcqs: List[Dict], user_answers: List,
+                         max_workers: int = EXPLAIN_MAX_WORKERS) -> List[Dict]:
+        # Same grading as TogetherRAG.grade_answers: local answer keys, one batched
+        # retrieval for the uncached wrong answers, bounded concurrent explanations
+        results, wrong = await self._offload(self.rag._grade_locally, chapter, mcqs, user_answers)
+        if wrong:
+            contexts = await self._offload(self.rag.retrieve_contexts, chapter, [r["question"] for r, _ in wrong], 5)
+            limit = asyncio.Semaphore(max(1, max_workers))
+
+            async def explain(result, key, context):
+                async with limit:
+                    context = self.rag._explanation_context(result["question"], result["correct_answer"], context)
+                    prompt = self.rag._explanation_prompt(result["question"], result["user_answer"],
+                                                          result["correct_answer"], context)
+                    result["explanation"] = await self._complete(prompt, key, kind="explanation")
+
+            await asyncio.gather(*(explain(r, key, ctx) for (r, key), ctx in zip(wrong, contexts)))
+        return results
+
+    async def aclose(self):
+        self.executor.shutdown(wait=False)
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
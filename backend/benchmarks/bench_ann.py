@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from faiss_store import build_faiss_index, set_search_params, index_type_of, INDEX_TYPES
+
+# Recall@k and per-query latency of each ANN index type against exact IndexFlatL2
+# search on the same corpus, sweeping nprobe (IVF) and efSearch (HNSW).
+
+
+def synthetic_corpus(n, dim, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype('float32')
+    points = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim)).astype('float32')
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, (time.perf_counter() - start) / len(queries) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ANN index recall/latency benchmark')
+    parser.add_argument('--embeddings', help='a <unit>_embeddings.npy file; default is a synthetic corpus')
+    parser.add_argument('--num-vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--num-queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpus = np.ascontiguousarray(np.load(args.embeddings), dtype='float32')
+    else:
+        corpus = synthetic_corpus(args.num_vectors, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(corpus), args.num_queries)
+    queries = corpus[picks] + 0.05 * rng.normal(size=(args.num_queries, corpus.shape[1])).astype('float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+
+    flat = build_faiss_index(corpus, 'flat')
+    truth, flat_ms = timed_search(flat, queries, args.k)
+    print(f'{len(corpus)} vectors, dim {corpus.shape[1]}, {len(queries)} queries, recall@{args.k}')
+    print(f"{'flat':>10} {'':>14}  recall 1.000  {flat_ms:7.3f} ms/query")
+
+    sweeps = {'ivf_flat': ('nprobe', [1, 4, 8, 16, 32, 64]),
+              'ivf_pq': ('nprobe', [1, 4, 8, 16, 32, 64]),
+              'hnsw': ('efSearch', [16, 32, 64, 128, 256])}
+    for index_type in INDEX_TYPES[1:]:
+        start = time.perf_counter()
+        index = build_faiss_index(corpus, index_type, args.nlist)
+        build_s = time.perf_counter() - start
+        if index_type_of(index) != index_type:
+            print(f'{index_type:>10}: corpus too small to train, fell back to flat')
+            continue
+        param, values = sweeps[index_type]
+        print(f'{index_type:>10}: built in {build_s:.2f}s')
+        for value in values:
+            if param == 'nprobe':
+                set_search_params(index, nprobe=value)
+            else:
+                set_search_params(index, ef_search=value)
+            found, ms = timed_search(index, queries, args.k)
+            print(f"{'':>10} {param + '=' + str(value):>14}  recall {recall_at_k(found, truth):.3f}  {ms:7.3f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
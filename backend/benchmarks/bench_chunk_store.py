@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chunk_store import PackedChunkStore, load_legacy_id2chunk, write_packed_chunks, CHUNKS_SUFFIX, LEGACY_SUFFIX
+
+# Load time and resident memory of the pickled id2chunk dict vs. the packed,
+# memory-mapped chunk store. Each measurement runs in a fresh interpreter.
+
+DEFAULT_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../faiss_indexes'))
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(mode, path, lookups):
+    before = rss_kb()
+    start = time.perf_counter()
+    if mode == 'pickle':
+        store = load_legacy_id2chunk(path)
+    else:
+        store = PackedChunkStore(path)
+    load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    n = len(store)
+    for i in range(lookups):
+        store[i % n]
+    lookup_us = (time.perf_counter() - start) / max(lookups, 1) * 1e6
+    return {'mode': mode, 'chunks': n, 'load_ms': load_s * 1000, 'lookup_us': lookup_us,
+            'rss_delta_kb': rss_kb() - before}
+
+
+def synthesize(out_dir, num_chunks, words_per_chunk):
+    import pickle
+    chunks = [' '.join(f'word{(i * 7 + j) % 5000}' for j in range(words_per_chunk)) for i in range(num_chunks)]
+    pkl_path = os.path.join(out_dir, 'synthetic' + LEGACY_SUFFIX)
+    with open(pkl_path, 'wb') as f:
+        pickle.dump(dict(enumerate(chunks)), f)
+    write_packed_chunks(os.path.join(out_dir, 'synthetic' + CHUNKS_SUFFIX), chunks)
+    return 'synthetic'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pickle vs packed chunk store')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--unit', default='Full Book')
+    parser.add_argument('--synthetic', type=int, default=0, help='generate N synthetic chunks in --index-dir instead')
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.lookups)))
+        return
+    unit = synthesize(args.index_dir, args.synthetic, 500) if args.synthetic else args.unit
+    paths = {
+        'pickle': os.path.join(args.index_dir, unit + LEGACY_SUFFIX),
+        'packed': os.path.join(args.index_dir, unit + CHUNKS_SUFFIX),
+    }
+    for mode, path in paths.items():
+        out = subprocess.run([sys.executable, __file__, '--lookups', str(args.lookups), '--child', mode, path],
+                             check=True, capture_output=True, text=True).stdout
+        r = json.loads(out)
+        print(f"{mode:>7}: {r['chunks']} chunks  load {r['load_ms']:8.2f} ms  "
+              f"lookup {r['lookup_us']:6.2f} us  RSS +{r['rss_delta_kb']} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chunk_store import PackedChunkStore
+from faiss_store import get_embedding_model, EMBEDDING_MODEL_NAME
+from text_chunking import chunk_text, chunk_document, iter_sentences, tokenizer_counter, OVERLAP_TOKENS
+
+# The whitespace word splitter vs. the sentence-aware tokenizer-sized chunker:
+# chunking speed, how much of each chunk the embedding model truncates, and
+# retrieval quality when sentences of the book are used as queries (a query hits if
+# a retrieved chunk contains the sentence).
+
+DEFAULT_TEXT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../faiss_indexes/Full Book.chunks'))
+
+
+def load_text(path):
+    if path.endswith('.chunks'):
+        # Rough stand-in for the book: the packed chunks of an existing unit
+        return '\n\n'.join(PackedChunkStore(path))
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def timed(fn, repeats):
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def truncation(chunks, count_tokens, limit):
+    counts = np.array(count_tokens(chunks))
+    lost = np.maximum(counts - limit, 0)
+    return (counts > limit).mean(), lost.sum() / counts.sum(), counts.mean()
+
+
+def retrieval(model, chunks, queries, k):
+    embeddings = np.ascontiguousarray(model.encode(chunks, show_progress_bar=False, convert_to_numpy=True),
+                                      dtype='float32')
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(embeddings)
+    _, found = index.search(np.ascontiguousarray(model.encode(queries, show_progress_bar=False,
+                                                              convert_to_numpy=True), dtype='float32'), k)
+    recall, rr = 0, 0.0
+    for query, ids in zip(queries, found):
+        ranks = [rank for rank, i in enumerate(ids) if i >= 0 and query in chunks[i]]
+        if ranks:
+            recall += 1
+            rr += 1.0 / (ranks[0] + 1)
+    return recall / len(queries), rr / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='chunker speed and retrieval quality benchmark')
+    parser.add_argument('--text', default=DEFAULT_TEXT, help='UTF-8 book text (or a .chunks file)')
+    parser.add_argument('--model', default=EMBEDDING_MODEL_NAME)
+    parser.add_argument('--scale', type=int, default=1, help='repeat the text to time a larger book')
+    parser.add_argument('--num-queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    text = load_text(args.text)
+    model = get_embedding_model(args.model)
+    count_tokens = tokenizer_counter(model.tokenizer)
+    limit = model.max_seq_length - 2
+
+    big = '\n\n'.join([text] * args.scale)
+    words, words_s = timed(lambda: chunk_text(big), args.repeats)
+    (sentences, _), sentences_s = timed(lambda: chunk_document(big, limit, OVERLAP_TOKENS, count_tokens),
+                                        args.repeats)
+    mb = len(big.encode('utf-8')) / 1e6
+    print(f'{mb:.2f} MB of text, model limit {limit} tokens')
+    print(f"{'chunker':>10} {'chunks':>7} {'MB/s':>7} {'avg tok':>8} {'truncated':>10} {'tok lost':>9} "
+          f"{'recall@' + str(args.k):>9} {'MRR':>6}")
+
+    rng = np.random.default_rng(args.seed)
+    candidates = [' '.join(text[s:e].split()) for s, e, _ in iter_sentences(text)]
+    candidates = [q for q in candidates if len(q.split()) >= 8]
+    queries = [candidates[i] for i in rng.choice(len(candidates), min(args.num_queries, len(candidates)),
+                                                 replace=False)]
+    for name, chunks, seconds in (('words', words, words_s), ('sentences', sentences, sentences_s)):
+        unit_chunks = chunks[:len(chunks) // args.scale or None]
+        over, lost, avg = truncation(unit_chunks, count_tokens, limit)
+        recall, mrr = retrieval(model, unit_chunks, queries, args.k)
+        print(f'{name:>10} {len(chunks):>7} {mb / seconds:7.2f} {avg:8.1f} {over:10.1%} {lost:9.1%} '
+              f'{recall:9.3f} {mrr:6.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from faiss_store import ChapterFaissStore
+from context_budget import assemble_context, estimate_tokens, EXPLAIN_CONTEXT_TOKENS
+
+# Prompt context size before/after budgeted assembly on the labeled query set: tokens
+# of the raw "\n".join of the top-k chunks vs the packed context, duplicate sentences
+# removed, assembly time, and whether a `relevant` phrase survives the packing.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_DIR = os.path.join(HERE, '../../faiss_indexes')
+DEFAULT_QUERIES = os.path.join(HERE, 'labeled_queries.json')
+
+
+def contains(text, phrases):
+    text = text.lower()
+    return any(p.lower() in text for p in phrases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prompt context tokens before and after budgeted assembly.')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--queries', default=DEFAULT_QUERIES)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--budget', type=int, default=EXPLAIN_CONTEXT_TOKENS)
+    args = parser.parse_args()
+
+    with open(args.queries, encoding='utf-8') as f:
+        labeled = json.load(f)
+    store = ChapterFaissStore(index_dir=args.index_dir)
+    raw, packed, duplicates, ms = [], [], [], []
+    raw_hits = packed_hits = 0
+    for item in labeled:
+        chunks = [chunk for chunk, _ in store.search(item['unit'], item['query'], args.top_k)]
+        start = time.perf_counter()
+        context, stats = assemble_context(chunks, item['query'], args.budget)
+        ms.append((time.perf_counter() - start) * 1000)
+        raw.append(estimate_tokens('\n'.join(chunks)))
+        packed.append(stats['context_tokens'])
+        duplicates.append(stats['duplicates'])
+        raw_hits += contains('\n'.join(chunks), item['relevant'])
+        packed_hits += contains(context, item['relevant'])
+
+    print(f'{len(labeled)} queries, top-{args.top_k}, budget {args.budget} tokens')
+    print(f'  raw context      {np.mean(raw):8.0f} tokens (max {max(raw)})')
+    print(f'  packed context   {np.mean(packed):8.0f} tokens (max {max(packed)}), '
+          f'{1 - sum(packed) / max(1, sum(raw)):.0%} fewer')
+    print(f'  duplicates       {np.mean(duplicates):8.1f} sentences/query')
+    print(f'  assembly         {np.percentile(ms, 50):8.2f} ms p50, {np.percentile(ms, 95):.2f} ms p95')
+    print(f'  relevant kept    {packed_hits}/{raw_hits} queries')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chunk_store import PackedChunkStore, CHUNKS_SUFFIX
+from faiss_store import (get_embedding_model, EMBEDDING_MODEL_NAME, EMBEDDING_BACKENDS, EMBEDDING_THREADS,
+                         EMBEDDING_BATCH_SIZE)
+
+# Throughput (sentences/sec) of each embedding backend and its parity with the fp32
+# torch reference: cosine similarity of the embeddings, and top-k overlap when the
+# same queries are searched against the existing unit indexes. With --check the
+# script exits non-zero if a backend falls below the parity thresholds.
+
+DEFAULT_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../faiss_indexes'))
+
+
+def load_units(index_dir):
+    units = {}
+    for path in sorted(glob.glob(os.path.join(index_dir, '*' + CHUNKS_SUFFIX))):
+        unit = os.path.basename(path)[:-len(CHUNKS_SUFFIX)]
+        if os.path.exists(os.path.join(index_dir, unit + '.index')):
+            units[unit] = list(PackedChunkStore(path))
+    return units
+
+
+def make_queries(chunks, n, seed):
+    # Short query-like strings: the first dozen words of randomly picked chunks
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(chunks), size=min(n, len(chunks)), replace=False)
+    return [' '.join(chunks[i].split()[:12]) for i in picks]
+
+
+def encode(model, texts, batch_size):
+    return np.ascontiguousarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                                             convert_to_numpy=True), dtype='float32')
+
+
+def throughput(model, texts, batch_size, repeats):
+    encode(model, texts[:batch_size], batch_size)  # warm-up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encode(model, texts, batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='embedding backend throughput and parity benchmark')
+    parser.add_argument('--model', default=EMBEDDING_MODEL_NAME)
+    parser.add_argument('--backends', nargs='+', choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument('--threads', type=int, default=EMBEDDING_THREADS)
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--num-sentences', type=int, default=512, help='chunks encoded for throughput/parity')
+    parser.add_argument('--num-queries', type=int, default=200, help='queries per unit for retrieval overlap')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', action='store_true', help='fail if parity is below the thresholds')
+    parser.add_argument('--min-cosine', type=float, default=0.98, help='minimum per-sentence cosine')
+    parser.add_argument('--min-overlap', type=float, default=0.90, help='minimum mean top-k overlap')
+    args = parser.parse_args()
+
+    units = load_units(args.index_dir)
+    if not units:
+        sys.exit(f'No packed chunk stores with indexes in {args.index_dir}.')
+    corpus = [chunk for chunks in units.values() for chunk in chunks]
+    rng = np.random.default_rng(args.seed)
+    texts = [corpus[i] for i in rng.integers(0, len(corpus), args.num_sentences)]
+    queries = {unit: make_queries(chunks, args.num_queries, args.seed) for unit, chunks in units.items()}
+    indexes = {unit: faiss.read_index(os.path.join(args.index_dir, unit + '.index')) for unit in units}
+
+    print(f'{args.model}: {len(texts)} chunks, batch {args.batch_size}, threads {args.threads or "default"}, '
+          f'{sum(len(q) for q in queries.values())} queries over {len(units)} units, overlap@{args.k}')
+    reference = None
+    failed = []
+    for backend in ['torch'] + [b for b in args.backends if b != 'torch']:
+        start = time.perf_counter()
+        model = get_embedding_model(args.model, backend, args.threads)
+        load_s = time.perf_counter() - start
+        rate = throughput(model, texts, args.batch_size, args.repeats)
+        embeddings = encode(model, texts, args.batch_size)
+        hits = {}
+        for unit, unit_queries in queries.items():
+            _, hits[unit] = indexes[unit].search(encode(model, unit_queries, args.batch_size), args.k)
+        if reference is None:
+            reference = (embeddings, hits)
+            print(f'{backend:>11}  load {load_s:6.2f}s  {rate:8.1f} sentences/s  (reference)')
+            continue
+        cos = cosine(reference[0], embeddings)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for unit in hits
+                           for a, b in zip(reference[1][unit], hits[unit])])
+        print(f'{backend:>11}  load {load_s:6.2f}s  {rate:8.1f} sentences/s  '
+              f'cosine mean {cos.mean():.4f} min {cos.min():.4f}  overlap@{args.k} {overlap:.3f}')
+        if cos.min() < args.min_cosine or overlap < args.min_overlap:
+            failed.append(backend)
+    if args.check and failed:
+        sys.exit(f'Parity below thresholds for: {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+    main()
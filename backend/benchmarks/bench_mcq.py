@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_llm import FakeLLMClient
+from together_rag import TogetherRAG
+
+# Wall-clock time of TogetherRAG.generate_mcq against the fake LLM:
+# the old one-question-per-call sequential loop vs. batched concurrent calls.
+
+
+class StaticStore:
+    # Retrieval is not what we measure here, so hand back a fixed context
+    def search_many(self, unit, queries, top_k=3):
+        return [[(f"Context chunk {i} about {unit}.", float(i)) for i in range(top_k)] for _ in queries]
+
+    def diverse_chunks(self, unit, count=64):
+        return [f"Context chunk {i} about {unit}." for i in range(count)]
+
+    def embed_chunks(self, texts):
+        # Unrelated random vectors: only verbatim repeats count as duplicates
+        return np.array([np.random.default_rng(zlib.crc32(t.encode())).normal(size=64) for t in texts])
+
+
+def run(num_mcqs, latency, malformed_rate, questions_per_call, max_workers, seed):
+    client = FakeLLMClient(latency=latency, malformed_rate=malformed_rate, seed=seed)
+    rag = TogetherRAG(StaticStore(), client=client, hybrid=False)
+    start = time.perf_counter()
+    mcqs = rag.generate_mcq("UNIT 1", num_mcqs=num_mcqs,
+                            questions_per_call=questions_per_call, max_workers=max_workers)
+    return time.perf_counter() - start, len(mcqs), client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sequential vs. batched concurrent MCQ generation')
+    parser.add_argument("--num-mcqs", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--malformed-rate", type=float, default=0.1)
+    parser.add_argument("--questions-per-call", type=int, default=5)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    modes = [
+        ("sequential", 1, 1),
+        ("batched+concurrent", args.questions_per_call, args.max_workers),
+    ]
+    for name, per_call, workers in modes:
+        elapsed, got, calls = run(args.num_mcqs, args.latency, args.malformed_rate, per_call, workers, args.seed)
+        print(f"{name:>20}: {elapsed:7.2f}s  {got}/{args.num_mcqs} MCQs  {calls} LLM calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from faiss_store import ChapterFaissStore
+from fake_llm import FakeLLMClient
+from together_rag import TogetherRAG, QuestionDeduper
+
+# How many LLM calls it takes to collect N distinct MCQs for a unit, and how many
+# of the questions are near-duplicates, with the old fixed context (top 3 chunks for
+# the query "mcq", cut to 2000 characters, for every call) vs. per-call windows of
+# the coverage-ordered chunks. The fake LLM bases each question on the passage it
+# was given, so repeated contexts give repeated questions as they do in practice.
+
+DEFAULT_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../faiss_indexes'))
+
+
+def fixed_context(rag, unit):
+    context = "\n".join(rag.retrieve_context(unit, "mcq", top_k=3))
+    return context[:2000]
+
+
+def run(store, unit, num_mcqs, windows, seed):
+    client = FakeLLMClient(latency=0.0, seed=seed)
+    rag = TogetherRAG(store, client=client)
+    if not windows:
+        context = fixed_context(rag, unit)
+        rag._mcq_windows = lambda chapter, counts: [context] * len(counts)
+    start = time.perf_counter()
+    mcqs = rag.generate_mcq(unit, num_mcqs=num_mcqs, use_bank=False)
+    elapsed = time.perf_counter() - start
+    covered = len({mcq["question"] for mcq in mcqs})
+    return len(mcqs), client.calls, covered, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MCQ context diversity benchmark')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--unit', default='Full Book')
+    parser.add_argument('--num-mcqs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    store = ChapterFaissStore(index_dir=args.index_dir)
+    print(f'{args.unit}: {args.num_mcqs} MCQs requested')
+    for name, windows in (('fixed "mcq" context', False), ('coverage windows', True)):
+        got, calls, distinct, elapsed = run(store, args.unit, args.num_mcqs, windows, args.seed)
+        print(f'{name:>20}: {got:3d} MCQs ({distinct} distinct) from {calls:3d} LLM calls  {elapsed:6.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from faiss_store import ChapterFaissStore
+from fake_llm import FakeLLMClient
+from sentence_index import SentenceIndex
+from together_rag import TogetherRAG
+
+# Quiz MCQs generated by the LLM vs. assembled from the sentence side index built at
+# index time (MCQ_SOURCE=index): build time of the side index for the unit, then per
+# quiz the latency and LLM calls of each source against the fake LLM. Index questions
+# only fall back to the LLM when the unit has too few usable facts.
+
+DEFAULT_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../faiss_indexes'))
+
+
+def run(store, unit, source, num_mcqs, quizzes, latency, seed):
+    client = FakeLLMClient(latency=latency, seed=seed)
+    rag = TogetherRAG(store, client=client, cache=None)
+    times, got = [], 0
+    for _ in range(quizzes):
+        start = time.perf_counter()
+        got += len(rag.generate_mcq(unit, num_mcqs=num_mcqs, use_bank=False, source=source))
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2], got, client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM vs. index-time precomputed MCQs')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--unit', default='Full Book')
+    parser.add_argument('--num-mcqs', type=int, default=10)
+    parser.add_argument('--quizzes', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.5, help='fake LLM seconds per call')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the sentence index even if it exists')
+    args = parser.parse_args()
+
+    store = ChapterFaissStore(index_dir=args.index_dir)
+    name = store._resolve(args.unit)[0]
+    if args.rebuild or not SentenceIndex.exists(store._path(name, '')):
+        start = time.perf_counter()
+        stats = store.update_sentences(name)
+        print(f'{name}: sentence index of {stats["sentences"]} sentences ({stats["facts"]} with a key term, '
+              f'{stats["embedded"]} embedded) built in {time.perf_counter() - start:.2f}s')
+    print(f'{args.unit}: {args.quizzes} quizzes of {args.num_mcqs} MCQs, fake LLM latency {args.latency}s')
+    for source in ('llm', 'index'):
+        median, got, calls = run(store, args.unit, source, args.num_mcqs, args.quizzes, args.latency, args.seed)
+        print(f'{source:>6}: median {median * 1000:8.1f} ms/quiz  {got} MCQs  {calls} LLM calls')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import metrics
+
+# Cost of the instrumentation itself: a `with stage(...)` block and a counter
+# increment, with metrics disabled (the default) and enabled.
+
+
+def per_call_ns(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def with_stage():
+    with metrics.stage("bench"):
+        pass
+
+
+def with_inc():
+    metrics.inc("bench_total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Instrumentation overhead per call.')
+    parser.add_argument('-n', type=int, default=200000)
+    args = parser.parse_args()
+    baseline = per_call_ns(lambda: None, args.n)
+    for enabled in (False, True):
+        metrics.enable(enabled)
+        stage_ns = per_call_ns(with_stage, args.n) - baseline
+        inc_ns = per_call_ns(with_inc, args.n) - baseline
+        print(f"metrics {'on ' if enabled else 'off'}: stage {stage_ns:7.0f} ns, inc {inc_ns:7.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ocr_pipeline import (pdf_to_images, ocr_images, ocr_pdf_streaming, ocr_pdf_adaptive, open_ocr_cache,
+                          new_ocr_report, summarize_ocr_report, OCR_METHODS, REGION_MIN_CONFIDENCE,
+                          PAGE_FALLBACK_FRACTION)
+
+# Pages/sec and peak RSS of the original render-everything-then-OCR path vs.
+# the streaming process-pool pipeline, on the bundled physics PDF by default.
+#
+# --mode compare is the throughput/accuracy trade-off of adaptive OCR on the first
+# --pages pages: tesseract as before, tesseract on preprocessed pages, adaptive
+# (tesseract, then Paddle for low-confidence regions) and Paddle on every page. Word
+# accuracy is 1 - word error rate against --reference (a text file with pages split
+# by form feeds, e.g. a hand-corrected transcript) or, without one, against Paddle.
+# Several --min-confidence / --page-fraction values run adaptive once per pair, to
+# tune REGION_MIN_CONFIDENCE and PAGE_FALLBACK_FRACTION; --out saves the table as JSON.
+
+DEFAULT_PDF = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Data/Physics Grade 11-1-20.pdf'))
+
+
+def peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def bench_original(pdf_path, method, cache=None):
+    out_dir = tempfile.mkdtemp(prefix="ocr_bench_")
+    try:
+        start = time.perf_counter()
+        texts = ocr_images(pdf_to_images(pdf_path, output_folder=out_dir), method=method, cache=cache)
+        return len(texts), time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def bench_streaming(pdf_path, method, workers, batch_pages, cache=None, report=None):
+    start = time.perf_counter()
+    pages = sum(1 for _ in ocr_pdf_streaming(pdf_path, method=method, workers=workers,
+                                             batch_pages=batch_pages, cache=cache, report=report))
+    return pages, time.perf_counter() - start
+
+
+def word_errors(reference, hypothesis):
+    # Word-level edit distance
+    ref, hyp = reference.split(), hypothesis.split()
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        current = [i]
+        for j, other in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def bench_compare(args):
+    pdf, workers, pages = args.pdf, args.workers, args.pages
+    runs = [
+        ("tesseract", lambda report: ocr_pdf_streaming(pdf, "pytesseract", workers, max_pages=pages)),
+        ("tesseract+prep", lambda report: ocr_pdf_adaptive(pdf, workers, report=report, min_confidence=0,
+                                                           max_pages=pages)),
+    ]
+    for conf in args.min_confidence:
+        for fraction in args.page_fraction:
+            runs.append((f"adaptive@{conf:g}/{fraction:g}",
+                         lambda report, conf=conf, fraction=fraction: ocr_pdf_adaptive(
+                             pdf, workers, report=report, min_confidence=conf, page_fraction=fraction,
+                             max_pages=pages)))
+    runs.append(("paddle", lambda report: ocr_pdf_streaming(pdf, "paddle", workers, max_pages=pages)))
+    outputs, rates, summaries = {}, {}, {}
+    for name, run in runs:
+        report = new_ocr_report()
+        start = time.perf_counter()
+        outputs[name] = list(run(report))
+        elapsed = time.perf_counter() - start
+        rates[name] = len(outputs[name]) / elapsed
+        if report["pages"]:
+            summaries[name] = summarize_ocr_report(report)
+            print(f"  {name}: {summaries[name]}")
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference = f.read().split("\f")[:args.pages]
+        reference_name = args.reference
+    else:
+        reference, reference_name = outputs["paddle"], "paddle"
+    print(f"first {args.pages} pages of {os.path.basename(args.pdf)}, word accuracy vs {reference_name}:")
+    rows = []
+    for name, _ in runs:
+        errors = words = 0
+        for ref, hyp in zip(reference, outputs[name]):
+            e, n = word_errors(ref, hyp)
+            errors, words = errors + e, words + n
+        accuracy = 1 - errors / words if words else 0.0
+        rows.append({"run": name, "pages_per_sec": rates[name], "word_accuracy": accuracy,
+                     "report": summaries.get(name)})
+        print(f"  {name:>20}: {rates[name]:6.2f} pages/sec  word accuracy {accuracy:6.1%}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"pdf": args.pdf, "pages": args.pages, "reference": reference_name, "runs": rows}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR ingestion benchmark")
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--method", choices=OCR_METHODS, default="pytesseract")
+    parser.add_argument("--mode", choices=["original", "streaming", "compare"], required=True,
+                        help="run one mode per process so peak RSS is not shared")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-pages", type=int, default=4)
+    parser.add_argument("--cache", help="OCR cache file; run twice to see the warm-cache rebuild")
+    parser.add_argument("--pages", type=int, default=20, help="pages compared in --mode compare")
+    parser.add_argument("--reference", help="ground-truth text for --mode compare, pages split by form feeds")
+    parser.add_argument("--min-confidence", type=float, nargs="+", default=[REGION_MIN_CONFIDENCE],
+                        help="adaptive region confidence thresholds to compare")
+    parser.add_argument("--page-fraction", type=float, nargs="+", default=[PAGE_FALLBACK_FRACTION],
+                        help="adaptive whole-page fallback fractions to compare")
+    parser.add_argument("--out", help="write the --mode compare table here as JSON")
+    args = parser.parse_args()
+
+    if args.mode == "compare":
+        bench_compare(args)
+        return
+    cache = open_ocr_cache(args.cache) if args.cache else None
+    report = new_ocr_report()
+    if args.mode == "original":
+        pages, elapsed = bench_original(args.pdf, args.method, cache)
+    else:
+        pages, elapsed = bench_streaming(args.pdf, args.method, args.workers, args.batch_pages, cache, report)
+    own_mb, children_mb = peak_rss_mb()
+    print(f"{args.mode} ({args.method}): {pages} pages in {elapsed:.1f}s = {pages / elapsed:.2f} pages/sec, "
+          f"peak RSS {own_mb:.0f} MB (largest child {children_mb:.0f} MB)")
+    if report["pages"]:
+        print(f"adaptive: {summarize_ocr_report(report)}")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"OCR cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from faiss_store import ChapterFaissStore
+
+# Recall@k, MRR and per-query latency of dense, BM25, hybrid (RRF) and hybrid +
+# cross-encoder retrieval on a small labeled query set. A query's relevant chunks
+# are those containing one of its `relevant` phrases, so labels survive re-chunking.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_DIR = os.path.join(HERE, '../../faiss_indexes')
+DEFAULT_QUERIES = os.path.join(HERE, 'labeled_queries.json')
+
+
+def bm25_only(store, unit, query, k):
+    name, _ = store._resolve(unit)
+    _, id2chunk = store._get_loaded(name)
+    ids, scores = store._get_bm25(name, id2chunk).search(query, k)
+    return [(id2chunk[int(i)], float(s)) for i, s in zip(ids, scores)]
+
+
+def evaluate(search, labeled, k):
+    hits, rr, latencies = 0, 0.0, []
+    for item in labeled:
+        start = time.perf_counter()
+        results = search(item['unit'], item['query'], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        phrases = [p.lower() for p in item['relevant']]
+        ranks = [rank for rank, (chunk, _) in enumerate(results) if any(p in chunk.lower() for p in phrases)]
+        if ranks:
+            hits += 1
+            rr += 1.0 / (ranks[0] + 1)
+    return hits / len(labeled), rr / len(labeled), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dense vs BM25 vs hybrid retrieval benchmark')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--queries', default=DEFAULT_QUERIES)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--rerank-model', default=None, help='cross-encoder for the re-ranked run')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='hybrid latency budget per query')
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        labeled = json.load(f)
+    store = ChapterFaissStore(index_dir=args.index_dir, rerank_model=None, hybrid_budget_ms=args.budget_ms)
+    # Warm up model, indexes and BM25 so latencies are steady-state
+    for unit in {item['unit'] for item in labeled}:
+        store.hybrid_search(unit, 'warm up', args.k)
+
+    modes = [('dense', store.search),
+             ('bm25', lambda unit, query, k: bm25_only(store, unit, query, k)),
+             ('hybrid', store.hybrid_search)]
+    if args.rerank_model:
+        reranked = ChapterFaissStore(index_dir=args.index_dir, rerank_model=args.rerank_model,
+                                     hybrid_budget_ms=args.budget_ms)
+        reranked.hybrid_search(labeled[0]['unit'], 'warm up', args.k)
+        modes.append(('hybrid+rerank', reranked.hybrid_search))
+
+    print(f'{len(labeled)} labeled queries, k={args.k}')
+    print(f"{'mode':>14} {'recall@' + str(args.k):>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, search in modes:
+        recall, mrr, p50, p95 = evaluate(search, labeled, args.k)
+        print(f'{name:>14} {recall:9.3f} {mrr:6.3f} {p50:8.2f} {p95:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_llm import FakeLLMClient
+from llm_scheduler import LLMScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from together_rag import TogetherRAG
+
+# LLMScheduler against the fake LLM:
+#   coalesce  N users click "Generate Notes" for the same chapter at once -> upstream calls
+#   429       N distinct calls against a fake that rate-limits, with and without the
+#             client-side token bucket -> 429s seen, retries, wall time
+#   priority  an explanation submitted behind a queue of bulk MCQ calls -> its wait
+# Point --fake-url at `python fake_llm.py --rate-limit 5` to go over HTTP instead.
+
+
+class StaticStore:
+    def search_many(self, unit, queries, top_k=3):
+        return [[(f"Context chunk {i} about {unit}.", float(i)) for i in range(top_k)] for _ in queries]
+
+
+def concurrently(fns):
+    results = [None] * len(fns)
+
+    def run(i):
+        results[i] = fns[i]()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(fns))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def make_client(args, **kwargs):
+    if args.fake_url:
+        from together import Together
+        return Together(api_key='fake', base_url=args.fake_url, max_retries=0)
+    return FakeLLMClient(latency=args.latency, seed=args.seed, **kwargs)
+
+
+def bench_coalesce(args):
+    client = make_client(args)
+    rag = TogetherRAG(StaticStore(), client=client, cache=None, hybrid=False, scheduler=LLMScheduler())
+    start = time.perf_counter()
+    notes = concurrently([lambda: rag.generate_chapter_notes('UNIT 1')] * args.users)
+    elapsed = time.perf_counter() - start
+    print(f"coalesce: {args.users} identical notes requests -> {rag.scheduler.stats()['calls']} upstream call(s), "
+          f"{len(set(notes))} distinct result(s), {elapsed:.2f}s")
+
+
+def bench_rate_limit(args):
+    for rate_per_minute in (0, args.rate * 60 * 0.9):
+        client = make_client(args, rate_limit=args.rate, rate_limit_burst=args.burst)
+        scheduler = LLMScheduler(rate_per_minute=rate_per_minute, burst=args.burst, seed=args.seed,
+                                 max_retries=args.calls, base_delay=args.base_delay)
+        rag = TogetherRAG(StaticStore(), client=client, cache=None, hybrid=False, scheduler=scheduler)
+        start = time.perf_counter()
+        concurrently([lambda i=i: rag._complete(f"Prompt {i}", use_cache=False) for i in range(args.calls)])
+        stats = scheduler.stats()
+        label = f"bucket {rate_per_minute:.0f}/min" if rate_per_minute else "no bucket"
+        print(f"429 ({label}): {args.calls} calls at {args.rate:g} req/s allowed -> "
+              f"{stats['rate_limited']} rate-limited, {stats['retries']} retries, "
+              f"{time.perf_counter() - start:.2f}s")
+
+
+def bench_priority(args):
+    client = make_client(args)
+    rag = TogetherRAG(StaticStore(), client=client, cache=None, hybrid=False,
+                      scheduler=LLMScheduler(max_concurrency=2))
+    waits = {}
+
+    def call(name, priority, delay=0.0):
+        time.sleep(delay)
+        start = time.perf_counter()
+        rag._complete(name, use_cache=False, priority=priority, coalesce=False)
+        waits[name] = time.perf_counter() - start
+    bulk = [lambda i=i: call(f"bulk {i}", PRIORITY_BULK) for i in range(args.calls)]
+    concurrently(bulk + [lambda: call('explanation', PRIORITY_INTERACTIVE, delay=args.latency / 2)])
+    print(f"priority: explanation behind {args.calls} bulk calls (2 workers) took {waits['explanation']:.2f}s, "
+          f"last bulk call {max(v for k, v in waits.items() if k != 'explanation'):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM scheduler: coalescing, 429 recovery and priorities.')
+    parser.add_argument('--users', type=int, default=30)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.2, help='fake LLM seconds per call')
+    parser.add_argument('--rate', type=float, default=5.0, help='requests/sec the fake allows')
+    parser.add_argument('--burst', type=int, default=2)
+    parser.add_argument('--base-delay', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fake-url', help='e.g. http://127.0.0.1:8901/v1 (rate limit set on the server)')
+    args = parser.parse_args()
+    bench_coalesce(args)
+    bench_rate_limit(args)
+    bench_priority(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Import time, worker cold start and first-search latency, each in a fresh interpreter:
+# the in-process store (model loaded lazily on first search), the same with the unit
+# prewarmed by the chapter registry before the first user arrives, and
+# RemoteFaissStore talking to a running embedding_server.py.
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import faiss_store
+t1 = time.perf_counter()
+import flask_rag_custom
+t2 = time.perf_counter()
+if flask_rag_custom.registry._thread is not None:
+    flask_rag_custom.registry._thread.join()
+t2b = time.perf_counter()
+flask_rag_custom.faiss_store.search(sys.argv[1], "summary", 3)
+t3 = time.perf_counter()
+flask_rag_custom.faiss_store.search(sys.argv[1], "velocity", 3)
+t4 = time.perf_counter()
+print(json.dumps({"import_faiss_store": t1 - t0, "worker_start": t2 - t0, "prewarm": t2b - t2,
+                  "first_search": t3 - t2b, "warm_search": t4 - t3}))
+'''
+
+
+def measure(env, unit):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, unit], cwd=BACKEND_DIR, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_total"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="worker startup benchmark")
+    parser.add_argument("--unit", default="UNIT 1")
+    parser.add_argument("--socket", default=None, help="also measure against embedding_server.py on this socket")
+    args = parser.parse_args()
+
+    env = dict(os.environ, TOGETHER_API=os.environ.get("TOGETHER_API", "fake"), RESPONSE_CACHE="0")
+    env.pop("EMBEDDING_SERVER_SOCKET", None)
+    modes = [("in-process", dict(env, PREWARM_UNITS="")), ("prewarmed", dict(env, PREWARM_UNITS=args.unit))]
+    if args.socket:
+        modes.append(("remote", dict(env, EMBEDDING_SERVER_SOCKET=args.socket)))
+    for name, mode_env in modes:
+        r = measure(mode_env, args.unit)
+        print(f"{name:>10}: import faiss_store {r['import_faiss_store']:6.2f}s  worker start {r['worker_start']:6.2f}s  "
+              f"prewarm {r['prewarm']:6.2f}s  first search {r['first_search']:6.2f}s  warm search {r['warm_search'] * 1000:7.1f} ms  "
+              f"(process {r['process_total']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_llm import FakeLLMClient
+from together_rag import TogetherRAG
+
+# Time to first byte of notes: blocking generate_chapter_notes vs. stream_chapter_notes,
+# both directly and through the Flask SSE endpoint, against the fake LLM.
+
+
+class StaticStore:
+    def search_many(self, unit, queries, top_k=3):
+        return [[(f"Context chunk {i} about {unit}.", float(i)) for i in range(top_k)] for _ in queries]
+
+
+def make_rag(args):
+    client = FakeLLMClient(latency=args.first_token, token_latency=args.token_latency,
+                           completion_words=args.words)
+    return TogetherRAG(StaticStore(), client=client, hybrid=False)
+
+
+def bench_direct(rag):
+    start = time.perf_counter()
+    rag.generate_chapter_notes("UNIT 1")
+    blocking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = None
+    for _ in rag.stream_chapter_notes("UNIT 1"):
+        if first is None:
+            first = time.perf_counter() - start
+    return blocking, first, time.perf_counter() - start
+
+
+def bench_sse(rag):
+    # The Flask test client reads the streamed body incrementally, like a browser would
+    import flask_rag_custom
+    flask_rag_custom.rag = rag
+    client = flask_rag_custom.app.test_client()
+    start = time.perf_counter()
+    response = client.get("/stream_notes?chapter=UNIT%201", buffered=False)
+    first = None
+    for _ in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="notes time-to-first-byte benchmark")
+    parser.add_argument("--first-token", type=float, default=0.3, help="fake LLM seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--sse", action="store_true", help="also go through flask_rag_custom (loads its models)")
+    args = parser.parse_args()
+
+    blocking, first, total = bench_direct(make_rag(args))
+    print(f"blocking notes : first byte {blocking:6.2f}s  total {blocking:6.2f}s")
+    print(f"streamed notes : first byte {first:6.2f}s  total {total:6.2f}s")
+    if args.sse:
+        first, total = bench_sse(make_rag(args))
+        print(f"SSE /stream_notes: first byte {first:6.2f}s  total {total:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
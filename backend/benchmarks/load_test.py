@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Load test of the Flask app vs. the ASGI app, both talking to a local fake LLM server
+# (fake_llm.py) with a fixed per-call latency. Reports requests/sec and latency
+# percentiles for the same request mix at a given client concurrency.
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=120.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=2.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start(cmd, env):
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def server_command(kind, port, workers):
+    if kind == "asgi":
+        return [sys.executable, "-m", "uvicorn", "asgi_app:app", "--port", str(port), "--log-level", "warning"]
+    try:
+        import gunicorn  # noqa: F401
+        return [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "flask_rag_custom:app"]
+    except ImportError:
+        # Werkzeug's threaded dev server: one thread per request, no worker cap
+        return [sys.executable, "-c", f"from flask_rag_custom import app; app.run(port={port}, threaded=True)"]
+
+
+async def run_load(base_url, requests, concurrency, chapter):
+    latencies = []
+    errors = 0
+    limit = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one():
+            nonlocal errors
+            async with limit:
+                start = time.perf_counter()
+                response = await client.post("/generate_notes", json={"chapter": chapter})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200 or not response.json().get("success"):
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    return {"rps": requests / elapsed, "p50": pct(0.50), "p95": pct(0.95), "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask vs ASGI load test against a fake LLM")
+    parser.add_argument("--targets", nargs="+", choices=["flask", "asgi"], default=["flask", "asgi"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--flask-workers", type=int, default=4, help="gunicorn sync workers, if installed")
+    parser.add_argument("--chapter", default="UNIT 1")
+    args = parser.parse_args()
+
+    llm_port = free_port()
+    env = dict(os.environ, TOGETHER_API=os.environ.get("TOGETHER_API", "fake"),
+               TOGETHER_BASE_URL=f"http://127.0.0.1:{llm_port}/v1", RESPONSE_CACHE="0")
+    llm = start([sys.executable, "fake_llm.py", "--port", str(llm_port), "--latency", str(args.llm_latency)], env)
+    try:
+        wait_for(f"http://127.0.0.1:{llm_port}/docs")
+        for kind in args.targets:
+            port = free_port()
+            server = start(server_command(kind, port, args.flask_workers), env)
+            try:
+                wait_for(f"http://127.0.0.1:{port}/")
+                r = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.chapter))
+                print(f"{kind:>5}: {r['rps']:7.2f} req/s  p50 {r['p50']:6.2f}s  p95 {r['p95']:6.2f}s  "
+                      f"errors {r['errors']}  ({args.requests} requests, concurrency {args.concurrency}, "
+                      f"LLM latency {args.llm_latency}s)")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        llm.terminate()
+        llm.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from faiss_store import ChapterFaissStore, FULL_BOOK
+from text_chunking import iter_chunks, chunk_document, count_words, tokenizer_counter
+from fake_llm import FakeLLMClient
+from together_rag import TogetherRAG
+from bench_embedding import make_queries
+from bench_chunk_store import rss_kb
+
+# One reproducible run over the retrieval and generation paths, written as JSON so
+# runs can be compared across commits:
+#
+#   python benchmarks/suite.py --out before.json
+#   git checkout <change> && python benchmarks/suite.py --out after.json --baseline before.json
+#
+# Runs offline against a unit of faiss_indexes/ or, with --synthetic N, a generated
+# N-chunk corpus indexed into a temp dir; generation uses the seeded fake LLM with a
+# fixed latency and no response cache. With --baseline, metrics listed in
+# thresholds.json that got worse by more than their tolerance are reported and the
+# exit status is 1. The bench_*.py scripts stay for the side-by-side comparisons
+# (backends, index types, chunkers...) this suite does not repeat.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_DIR = os.path.join(HERE, '../../faiss_indexes')
+DEFAULT_THRESHOLDS = os.path.join(HERE, 'thresholds.json')
+DEFAULT_PDF = os.path.join(HERE, '../../Data/Physics Grade 11-1-20.pdf')
+CASES = ('embedding', 'search', 'index_load', 'chunking', 'ocr', 'e2e')
+SYNTHETIC_UNIT = 'synthetic'
+# Vocabulary of the synthetic corpus; sentences are random draws, so BM25 and dense
+# search both have something to match
+SYNTHETIC_WORDS = ('cell membrane protein enzyme energy force motion wave heart blood '
+                   'pressure nerve muscle tissue organ acid base reaction charge field '
+                   'current voltage mass velocity heat light lens image gene virus').split()
+
+
+def percentiles(values_ms):
+    return float(np.percentile(values_ms, 50)), float(np.percentile(values_ms, 95))
+
+
+def synthetic_text(num_chunks, seed, sentences_per_chunk=12):
+    rng = np.random.default_rng(seed)
+    paragraphs = []
+    for _ in range(num_chunks):
+        sentences = []
+        for _ in range(sentences_per_chunk):
+            words = rng.choice(SYNTHETIC_WORDS, size=int(rng.integers(8, 20)))
+            sentences.append(' '.join(words).capitalize() + '.')
+        paragraphs.append(' '.join(sentences))
+    return '\n\n'.join(paragraphs)
+
+
+def prepare(args):
+    # -> (store, unit, chunks, text, temp dir to clean up or None)
+    if args.synthetic:
+        tmp = tempfile.mkdtemp(prefix='bench_suite_')
+        text = synthetic_text(args.synthetic, args.seed)
+        store = ChapterFaissStore(index_dir=tmp)
+        chunks, provenance = chunk_document(text, count_tokens=count_words)
+        store.store_chapter(SYNTHETIC_UNIT, chunks, provenance=provenance)
+        return ChapterFaissStore(index_dir=tmp), SYNTHETIC_UNIT, chunks, text, tmp
+    store = ChapterFaissStore(index_dir=args.index_dir)
+    _, id2chunk = store._get_loaded(store._resolve(args.unit)[0])
+    chunks = list(id2chunk)
+    return store, args.unit, chunks, '\n\n'.join(chunks), None
+
+
+def bench_embedding(ctx, args):
+    store, chunks = ctx['store'], ctx['chunks']
+    start = time.perf_counter()
+    store.embed_chunks(['warm up'])
+    model_load_s = time.perf_counter() - start
+    texts = (chunks * (-(-args.embed_chunks // len(chunks))))[:args.embed_chunks]
+    best = None
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        store.embed_chunks(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'model_load_s': model_load_s, 'chunks_per_s': len(texts) / best}
+
+
+def bench_search(ctx, args):
+    store, unit = ctx['store'], ctx['unit']
+    queries = make_queries(ctx['chunks'], args.queries, args.seed)
+    result = {'queries': len(queries)}
+    for name, search in (('dense', store.search), ('hybrid', store.hybrid_search)):
+        store.query_cache.clear()
+        search(unit, 'warm up')
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            search(unit, query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        result[f'{name}_p50_ms'], result[f'{name}_p95_ms'] = percentiles(latencies)
+    store.query_cache.clear()
+    batch = queries[:args.batch]
+    start = time.perf_counter()
+    store.search_many(unit, batch)
+    result['batched_ms_per_query'] = (time.perf_counter() - start) * 1000 / len(batch)
+    return result
+
+
+def bench_index_load(ctx, args):
+    times, rss, loaded = [], [], 0
+    for _ in range(args.repeats):
+        store = ChapterFaissStore(index_dir=ctx['store'].index_dir)
+        before = rss_kb()
+        start = time.perf_counter()
+        store.load_chapter(ctx['unit'])
+        times.append((time.perf_counter() - start) * 1000)
+        rss.append((rss_kb() - before) / 1024)
+        loaded = store.loaded_bytes()
+    return {'load_ms': min(times), 'rss_delta_mb': max(rss), 'loaded_mb': loaded / 2 ** 20}
+
+
+def bench_chunking(ctx, args):
+    text = ctx['text']
+    mb = len(text.encode('utf-8')) / 2 ** 20
+    result = {'text_mb': mb}
+    counters = [('words', count_words)]
+    tokenizer = getattr(ctx['store'].model, 'tokenizer', None)
+    if tokenizer is not None:
+        counters.append(('tokens', tokenizer_counter(tokenizer)))
+    for name, count_tokens in counters:
+        best = None
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            n = sum(1 for _ in iter_chunks(text, count_tokens=count_tokens))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        result[f'{name}_mb_per_s'] = mb / best
+        result[f'{name}_chunks'] = n
+    return result
+
+
+def bench_ocr(ctx, args):
+    if not shutil.which('tesseract') or not shutil.which('pdftoppm'):
+        return {'skipped': 'tesseract or poppler (pdftoppm) not installed'}
+    if not os.path.exists(args.pdf):
+        return {'skipped': f'{args.pdf} not found'}
+    from ocr_pipeline import ocr_pdf_streaming
+    start = time.perf_counter()
+    pages = sum(1 for _ in ocr_pdf_streaming(args.pdf, workers=args.ocr_workers, max_pages=args.ocr_pages))
+    return {'pages': pages, 'pages_per_s': pages / (time.perf_counter() - start)}
+
+
+def bench_e2e(ctx, args):
+    client = FakeLLMClient(latency=args.llm_latency, seed=args.seed)
+    rag = TogetherRAG(ctx['store'], client=client, cache=None)
+    unit = ctx['unit']
+    notes, mcq, grade = [], [], []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        rag.generate_chapter_notes(unit)
+        notes.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        mcqs = rag.generate_mcq(unit, num_mcqs=args.mcqs, use_bank=False)
+        mcq.append((time.perf_counter() - start) * 1000)
+        # Every answer wrong, so each question needs retrieval and an explanation
+        wrong = [next(i for i, option in enumerate(m['options']) if option != m['correct']) for m in mcqs]
+        start = time.perf_counter()
+        rag.grade_quiz(unit, mcqs, wrong)
+        grade.append((time.perf_counter() - start) * 1000)
+    return {'llm_latency_ms': args.llm_latency * 1000, 'notes_ms': float(np.median(notes)),
+            'mcq_ms': float(np.median(mcq)), 'mcqs': len(mcqs), 'grade_ms': float(np.median(grade)),
+            'llm_calls': client.calls}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, thresholds):
+    # -> [(metric, old, new, change, regressed)] for the thresholded metrics in both runs
+    rows = []
+    for metric, rule in sorted(thresholds.items()):
+        case, name = metric.split('.', 1)
+        old = baseline.get('results', {}).get(case, {}).get(name)
+        new = results.get(case, {}).get(name)
+        if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if rule.get('higher_is_better') else change
+        rows.append((metric, old, new, change, worse > rule['tolerance']))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite with JSON output and regression checks.')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--unit', default=FULL_BOOK)
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N', help='use a generated N-chunk corpus')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=list(CASES))
+    parser.add_argument('--out', help='write the results JSON here')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--embed-chunks', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='fake LLM seconds per call')
+    parser.add_argument('--mcqs', type=int, default=10)
+    parser.add_argument('--pdf', default=DEFAULT_PDF)
+    parser.add_argument('--ocr-pages', type=int, default=4)
+    parser.add_argument('--ocr-workers', type=int, default=None)
+    args = parser.parse_args()
+
+    store, unit, chunks, text, tmp = prepare(args)
+    ctx = {'store': store, 'unit': unit, 'chunks': chunks, 'text': text}
+    benches = {'embedding': bench_embedding, 'search': bench_search, 'index_load': bench_index_load,
+               'chunking': bench_chunking, 'ocr': bench_ocr, 'e2e': bench_e2e}
+    results = {}
+    try:
+        for case in args.cases:
+            results[case] = benches[case](ctx, args)
+            print(f'{case:>10}: ' + '  '.join(f'{k} {v:.4g}' if isinstance(v, float) else f'{k} {v}'
+                                              for k, v in results[case].items()))
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    run = {
+        'meta': {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'python': platform.python_version(), 'platform': platform.platform(),
+                 'cpus': os.cpu_count(), 'corpus': f'synthetic:{args.synthetic}' if args.synthetic else unit,
+                 'chunks': len(chunks), 'args': vars(args)},
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.thresholds, encoding='utf-8') as f:
+            thresholds = json.load(f)
+        if baseline.get('meta', {}).get('corpus') != run['meta']['corpus']:
+            print(f"warning: baseline corpus {baseline.get('meta', {}).get('corpus')!r} differs from this run's")
+        rows = compare(results, baseline, thresholds)
+        print(f"\nvs {args.baseline} ({baseline.get('meta', {}).get('commit')}):")
+        for metric, old, new, change, regressed in rows:
+            print(f"  {metric:<32} {old:10.4g} -> {new:10.4g}  {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+import numpy as np
+
+# Compact lexical index stored next to each FAISS index as <unit>.bm25.npz. Postings
+# are CSR arrays (term -> slice of doc_ids) whose weights are the precomputed BM25
+# contribution of that term to that chunk, so a query is a few slices and one
+# np.bincount over the unit's chunks.
+
+BM25_SUFFIX = '.bm25.npz'
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Words and numbers, keeping unit/formula tokens like "9.8", "m/s" and "v^2" whole
+TOKEN = re.compile(r'\w+(?:[./^]\w+)*')
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+class BM25Index:
+    def __init__(self, vocab: List[str], offsets: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray,
+                 n_docs: int):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+        self._term_ids = {term: i for i, term in enumerate(vocab)}
+
+    @classmethod
+    def build(cls, chunks: List[str], k1: float = BM25_K1, b: float = BM25_B) -> 'BM25Index':
+        vocab = {}
+        terms, docs, tfs = [], [], []
+        lengths = np.zeros(len(chunks), dtype='float32')
+        for doc_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                terms.append(vocab.setdefault(term, len(vocab)))
+                docs.append(doc_id)
+                tfs.append(tf)
+        terms = np.array(terms, dtype='int64')
+        docs = np.array(docs, dtype='int32')
+        tfs = np.array(tfs, dtype='float32')
+        # Group postings by term
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        df = np.bincount(terms, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype='int64')
+        np.cumsum(df, out=offsets[1:])
+        idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5)).astype('float32')
+        avgdl = max(float(lengths.mean()) if len(chunks) else 0.0, 1.0)
+        norm = k1 * (1 - b + b * lengths[docs] / avgdl)
+        weights = (idf[terms] * tfs * (k1 + 1) / (tfs + norm)).astype('float32')
+        return cls(list(vocab), offsets, docs, weights, len(chunks))
+
+    def save(self, path: str):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            # Vocabulary as one newline-joined UTF-8 blob (tokens never contain whitespace)
+            vocab = np.frombuffer('\n'.join(self.vocab).encode('utf-8'), dtype='uint8')
+            np.savez(f, vocab=vocab, offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights,
+                     n_docs=np.array(self.n_docs))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with np.load(path) as data:
+            vocab = data['vocab'].tobytes().decode('utf-8').split('\n') if data['vocab'].size else []
+            return cls(vocab, data['offsets'], data['doc_ids'], data['weights'], int(data['n_docs']))
+
+    def search(self, query: str, top_k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Top chunk ids and BM25 scores; `allowed` is an optional boolean mask over ids
+        term_ids = [self._term_ids[t] for t in dict.fromkeys(tokenize(query)) if t in self._term_ids]
+        if not term_ids:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+        postings = np.concatenate([np.arange(self.offsets[t], self.offsets[t + 1]) for t in term_ids])
+        scores = np.bincount(self.doc_ids[postings], weights=self.weights[postings], minlength=self.n_docs)
+        if allowed is not None:
+            scores[~allowed] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        return hits, scores[hits]
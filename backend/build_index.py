@@ -0,0 +1,176 @@
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from faiss_store import ChapterFaissStore, INDEX_TYPES, FULL_BOOK, EMBEDDING_BACKENDS, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE
+from text_chunking import (chapter_spans, chunk_text, chunk_document, tokenizer_counter, count_words,
+                           OVERLAP_TOKENS, PAGE_BREAK)
+
+# PDF -> OCR text -> chapters -> chunks -> FAISS, re-embedding only chunks whose
+# content hash changed since the last build of each unit. Each index also gets a
+# sentence side index with precomputed quiz facts and distractors (sentence_index).
+
+FULL_BOOK_UNIT = FULL_BOOK
+FRONT_MATTER_UNIT = "Front Matter"
+DEFAULT_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../faiss_indexes'))
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self) -> str:
+        total = sum(self.timings.values())
+        lines = [f"  {name:<12} {seconds:8.2f}s" for name, seconds in self.timings.items()]
+        lines.append(f"  {'total':<12} {total:8.2f}s")
+        return "\n".join(lines)
+
+
+def extract_text(pdf_path: str, method: str, workers: Optional[int], ocr_cache_path: Optional[str]) -> str:
+    from ocr_pipeline import ocr_pdf_streaming, open_ocr_cache, new_ocr_report, summarize_ocr_report
+    cache = open_ocr_cache(ocr_cache_path) if ocr_cache_path else None
+    report = new_ocr_report()
+    try:
+        # Pages are separated by form feeds, which the chunker counts for page provenance
+        return PAGE_BREAK.join(ocr_pdf_streaming(pdf_path, method=method, workers=workers, cache=cache,
+                                                 report=report))
+    finally:
+        if method == "adaptive":
+            print(f"OCR: {summarize_ocr_report(report)}")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"OCR cache: {stats['hits']} hits, {stats['misses']} misses")
+            cache.close()
+
+
+# unit text span -> (chunks, per-chunk provenance or None)
+Chunker = Callable[[str, int, int], Tuple[List[str], Optional[List[Dict]]]]
+
+
+def word_chunker(max_tokens: int, overlap: int) -> Chunker:
+    # The original whitespace splitter; no provenance
+    def chunk(full_text, start, end):
+        return chunk_text(full_text[start:end].strip(), max_tokens=max_tokens, overlap=overlap), None
+    return chunk
+
+
+def sentence_chunker(max_tokens: int, overlap: int, count_tokens=count_words) -> Chunker:
+    def chunk(full_text, start, end):
+        return chunk_document(full_text, max_tokens, overlap, count_tokens, start, end)
+    return chunk
+
+
+def build_units(full_text: str, chunker: Chunker, full_book: bool = True,
+                only: Optional[List[str]] = None) -> Dict[str, Tuple[List[str], Optional[List[Dict]]]]:
+    spans = {}
+    if full_book:
+        spans[FULL_BOOK_UNIT] = (0, len(full_text))
+    spans.update(chapter_spans(full_text))
+    if only:
+        spans = {unit: span for unit, span in spans.items() if unit in only}
+    return {unit: chunker(full_text, start, end) for unit, (start, end) in spans.items()}
+
+
+def build_shared_units(full_text: str, chunker: Chunker) -> Dict[str, Tuple[List[str], Optional[List[Dict]]]]:
+    # Units for a shared index: text before the first chapter plus every chapter,
+    # so together they cover the whole book once
+    chapters = chapter_spans(full_text)
+    first = min((start for start, _ in chapters.values()), default=len(full_text))
+    spans = {}
+    if full_text[:first].strip():
+        spans[FRONT_MATTER_UNIT] = (0, first)
+    spans.update(chapters)
+    return {unit: chunker(full_text, start, end) for unit, (start, end) in spans.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or incrementally update the chapter FAISS indexes.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pdf", help="textbook PDF to OCR")
+    source.add_argument("--text", help="already extracted UTF-8 text file (skips OCR)")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--method", choices=["pytesseract", "paddle", "adaptive"], default="pytesseract",
+                        help="adaptive: tesseract first, PaddleOCR for low-confidence regions")
+    parser.add_argument("--workers", type=int, default=None, help="OCR worker processes")
+    parser.add_argument("--ocr-cache", default=None, help="OCR cache file (see ocr_pipeline.open_ocr_cache)")
+    parser.add_argument("--chunker", choices=["sentences", "words"], default="sentences",
+                        help="sentence-aware chunks sized with the model tokenizer, or the old word splitter")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="chunk size (default: the model's sequence limit for sentences, 500 words)")
+    parser.add_argument("--overlap", type=int, default=None,
+                        help=f"overlap (default: {OVERLAP_TOKENS} tokens for sentences, 50 words)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF centroids (default ~4*sqrt(chunks))")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="embedding batch size")
+    parser.add_argument("--units", nargs="*", help="only rebuild these units")
+    parser.add_argument("--no-full-book", action="store_true", help=f"skip the '{FULL_BOOK_UNIT}' unit")
+    parser.add_argument("--shared", metavar="NAME", default=None,
+                        help="build one shared multi-unit index NAME instead of one index per unit")
+    parser.add_argument("--no-sentences", action="store_true",
+                        help="skip the sentence side indexes used by MCQ_SOURCE=index quizzes")
+    args = parser.parse_args()
+
+    timer = StageTimer()
+    with timer.stage("ocr"):
+        if args.pdf:
+            full_text = extract_text(args.pdf, args.method, args.workers, args.ocr_cache)
+        else:
+            with open(args.text, encoding="utf-8") as f:
+                full_text = f.read()
+    with timer.stage("model load"):
+        store = ChapterFaissStore(index_dir=args.index_dir, embedding_backend=args.embedding_backend,
+                                  batch_size=args.batch_size)
+        store.model  # loaded lazily; force it here so the stage timing stays meaningful
+    with timer.stage("chunking"):
+        if args.chunker == "words":
+            chunker = word_chunker(args.max_tokens or 500, 50 if args.overlap is None else args.overlap)
+        else:
+            # Size chunks in the embedding model's own tokens so nothing is truncated at
+            # embedding time; its limit includes the [CLS]/[SEP] pair
+            limit = store.model.max_seq_length - 2
+            chunker = sentence_chunker(min(args.max_tokens or limit, limit),
+                                       OVERLAP_TOKENS if args.overlap is None else args.overlap,
+                                       tokenizer_counter(store.model.tokenizer))
+        if args.shared:
+            units = build_shared_units(full_text, chunker)
+        else:
+            units = build_units(full_text, chunker, not args.no_full_book, args.units)
+    with timer.stage("embed+index"):
+        if args.shared:
+            provenance = None
+            if args.chunker == "sentences":
+                provenance = {unit: sources for unit, (_, sources) in units.items()}
+            stats = store.update_shared(args.shared, {unit: chunks for unit, (chunks, _) in units.items()},
+                                        args.index_type, args.nlist, provenance)
+            print(f"{args.shared}: {len(units)} units, {stats['chunks']} chunks, "
+                  f"{stats['embedded']} embedded, {stats['reused']} reused")
+        else:
+            for unit, (chunks, sources) in units.items():
+                stats = store.update_chapter(unit, chunks, args.index_type, args.nlist, sources)
+                print(f"{unit}: {stats['chunks']} chunks, {stats['embedded']} embedded, {stats['reused']} reused")
+    if not args.no_sentences:
+        with timer.stage("sentences"):
+            if args.shared:
+                indexes = {args.shared: [chunk for chunks, _ in units.values() for chunk in chunks]}
+            else:
+                indexes = {unit: chunks for unit, (chunks, _) in units.items() if chunks}
+            for name, chunks in indexes.items():
+                stats = store.update_sentences(name, chunks)
+                print(f"{name}: {stats['sentences']} sentences, {stats['facts']} with a key term, "
+                      f"{stats['embedded']} embedded")
+    print("Stage timings:")
+    print(timer.report())
+
+
+if __name__ == "__main__":
+    main()
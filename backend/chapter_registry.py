@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+from chunk_store import HEADER as CHUNKS_HEADER, MAGIC as CHUNKS_MAGIC, CHUNKS_SUFFIX, LEGACY_SUFFIX
+from faiss_store import FULL_BOOK, UNITS_SUFFIX
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# The chapters every entry point offers, discovered from the index directory instead
+# of a hardcoded list:
+#   registry = ChapterRegistry(faiss_store, FAISS_INDEX_DIR)
+#   registry.prewarm()          # PREWARM_UNITS loaded in a background thread
+#   registry.chapters()         # names for the chapter picker
+#   registry.info()             # + chunks, dim, index type, build time, size, warm/cold
+# Units not prewarmed stay cold until their first search loads them (and the store's
+# LRU may evict them again). Prewarming stops at the store's max_loaded_bytes, so
+# hot units are never loaded only to evict each other.
+
+# Comma-separated units to load at startup; "*" for all of them, "" for none
+PREWARM_UNITS = os.getenv("PREWARM_UNITS", FULL_BOOK)
+# Rescan the directory at most this often when the chapter list is asked for
+REFRESH_SECONDS = float(os.getenv("CHAPTER_REFRESH_SECONDS", "30"))
+# Every FAISS index file starts with a fourcc, int32 dimension and int64 vector count
+FAISS_HEADER = struct.Struct('<4siq')
+# Index types (as in faiss_store.INDEX_TYPES) by fourcc, for units built without a manifest
+FAISS_FOURCC = {'IxF2': 'flat', 'IxFI': 'flat', 'IHNf': 'hnsw', 'IwFl': 'ivf_flat', 'IwPQ': 'ivf_pq'}
+INDEX_SUFFIX = '.index'
+
+def _natural_key(name: str):
+    # "UNIT 2" before "UNIT 10"
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def read_index_header(path: str) -> Dict:
+    with open(path, 'rb') as f:
+        fourcc, dim, ntotal = FAISS_HEADER.unpack(f.read(FAISS_HEADER.size))
+    return {'fourcc': fourcc.decode('ascii', 'replace'), 'dim': dim, 'vectors': ntotal}
+
+def count_chunks(index_dir: str, name: str) -> Optional[int]:
+    # From the packed chunk file's header; None for legacy pickles (unpickling to
+    # count them would cost as much as loading the unit)
+    path = os.path.join(index_dir, name + CHUNKS_SUFFIX)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        magic, count = CHUNKS_HEADER.unpack(f.read(CHUNKS_HEADER.size))
+    return count if magic == CHUNKS_MAGIC else None
+
+def discover_units(index_dir: str, shared_index: Optional[str] = None) -> Dict[str, Dict]:
+    # Unit name -> metadata, for every searchable unit in `index_dir`. Units inside
+    # the shared index are listed one by one and the shared index itself as FULL_BOOK.
+    units = {}
+    try:
+        names = os.listdir(index_dir)
+    except FileNotFoundError:
+        return units
+    for filename in names:
+        if not filename.endswith(INDEX_SUFFIX):
+            continue
+        name = filename[:-len(INDEX_SUFFIX)]
+        has_chunks = any(os.path.exists(os.path.join(index_dir, name + suffix))
+                         for suffix in (CHUNKS_SUFFIX, LEGACY_SUFFIX))
+        if not has_chunks:
+            continue
+        path = os.path.join(index_dir, filename)
+        try:
+            header = read_index_header(path)
+        except (OSError, struct.error):
+            logger.warning("skipping unreadable index %s", path)
+            continue
+        manifest = {}
+        manifest_path = os.path.join(index_dir, name + '_manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        chunks = count_chunks(index_dir, name)
+        units[name] = {
+            'name': name,
+            'chunks': chunks if chunks is not None else header['vectors'],
+            'dim': header['dim'],
+            'index_type': manifest.get('index_type') or FAISS_FOURCC.get(header['fourcc'], header['fourcc']),
+            'model': manifest.get('model'),
+            'built': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(os.path.getmtime(path))),
+            'bytes': os.path.getsize(path),
+            'index': name,
+        }
+    if shared_index is not None and shared_index in units:
+        units_path = os.path.join(index_dir, shared_index + UNITS_SUFFIX)
+        if os.path.exists(units_path):
+            with open(units_path) as f:
+                ranges = json.load(f)['units']
+            shared = units.pop(shared_index)
+            for unit, (first, end) in ranges.items():
+                units.setdefault(unit, {**shared, 'name': unit, 'chunks': end - first})
+            units[FULL_BOOK] = {**shared, 'name': FULL_BOOK}
+    return units
+
+class ChapterRegistry:
+    def __init__(self, store, index_dir: str, prewarm_units: str = PREWARM_UNITS,
+                 refresh_seconds: float = REFRESH_SECONDS):
+        # `store` is a ChapterFaissStore or RemoteFaissStore; `index_dir` is read
+        # directly, so with a remote store it must be the server's directory
+        self.store = store
+        self.index_dir = index_dir
+        self.prewarm_units = prewarm_units
+        self.refresh_seconds = refresh_seconds
+        self.prewarm_seconds = None
+        self.skipped = []  # hot units left cold because the memory budget was spent
+        self._units = {}
+        self._scanned = 0.0
+        self._warming = set()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _shared_index(self) -> Optional[str]:
+        try:
+            return self.store.shared_index
+        except Exception as e:  # a remote store whose server is down
+            logger.warning("could not read the shared index name: %s", e)
+            return None
+
+    def refresh(self) -> Dict[str, Dict]:
+        units = discover_units(self.index_dir, self._shared_index())
+        ordered = sorted(units, key=lambda name: (name != FULL_BOOK, _natural_key(name)))
+        with self._lock:
+            self._units = {name: units[name] for name in ordered}
+            self._scanned = time.monotonic()
+        return self._units
+
+    def _current(self) -> Dict[str, Dict]:
+        with self._lock:
+            stale = time.monotonic() - self._scanned > self.refresh_seconds
+            units = self._units
+        return self.refresh() if stale else units
+
+    def chapters(self) -> List[str]:
+        return list(self._current())
+
+    def __contains__(self, unit: str) -> bool:
+        return unit in self._current()
+
+    def _loaded(self) -> Dict[str, int]:
+        try:
+            return self.store.loaded_units()
+        except Exception as e:  # a remote store whose server is down
+            logger.warning("could not read loaded units: %s", e)
+            return {}
+
+    def _budget(self) -> Optional[int]:
+        if hasattr(self.store, 'max_loaded_bytes'):
+            return self.store.max_loaded_bytes
+        try:
+            return self.store.stats().get('max_loaded_bytes')
+        except Exception:
+            return None
+
+    def info(self) -> List[Dict]:
+        loaded = self._loaded()
+        with self._lock:
+            warming = set(self._warming)
+        rows = []
+        for name, meta in self._current().items():
+            state = 'warm' if meta['index'] in loaded else 'warming' if name in warming else 'cold'
+            rows.append({**meta, 'state': state})
+        return rows
+
+    def hot_units(self) -> List[str]:
+        units = self._current()
+        if self.prewarm_units.strip() == '*':
+            return list(units)
+        wanted = [name.strip() for name in self.prewarm_units.split(',') if name.strip()]
+        missing = [name for name in wanted if name not in units]
+        if missing:
+            logger.warning("PREWARM_UNITS not found in %s: %s", self.index_dir, missing)
+        return [name for name in wanted if name in units]
+
+    def prewarm(self, units: Optional[List[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+        # Load the embedding model and the hot units; idempotent while a prewarm runs
+        units = self.hot_units() if units is None else units
+        if not units:
+            return None
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._thread
+            self._warming = set(units)
+            thread = threading.Thread(target=self._prewarm, args=(units,), name="prewarm", daemon=True)
+            self._thread = thread
+        if not background:
+            thread.run()
+            return None
+        thread.start()
+        return thread
+
+    def _prewarm(self, units: List[str]):
+        start = time.perf_counter()
+        try:
+            self.store.embed_queries(["warm up"])
+            budget = self._budget()
+            meta = self._current()
+            # Several units may share one index; count it once
+            spent = dict(self._loaded())
+            for unit in units:
+                index = meta[unit]['index'] if unit in meta else unit
+                size = meta.get(unit, {}).get('bytes', 0)
+                if index not in spent and budget is not None and sum(spent.values()) + size > budget:
+                    self.skipped.append(unit)
+                    logger.warning("not prewarming %s: %d bytes over the %d byte budget", unit, size, budget)
+                    continue
+                with metrics.stage("prewarm"):
+                    spent[index] = self.store.warm(unit)
+                with self._lock:
+                    self._warming.discard(unit)
+        except Exception as e:
+            logger.warning("prewarm failed: %s", e)
+        finally:
+            with self._lock:
+                self._warming.clear()
+            self.prewarm_seconds = time.perf_counter() - start
+            logger.info("prewarmed %s in %.2fs", units, self.prewarm_seconds)
+
+    def stats(self) -> Dict:
+        loaded = self._loaded()
+        with self._lock:
+            warming = len(self._warming)
+        return {"units": len(self._current()), "loaded_indexes": len(loaded), "loaded_bytes": sum(loaded.values()),
+                "warming": warming, "prewarm_seconds": self.prewarm_seconds or 0.0,
+                "prewarm_skipped": len(self.skipped)}
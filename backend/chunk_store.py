@@ -0,0 +1,95 @@
+import argparse
+import glob
+import mmap
+import os
+import pickle
+import struct
+import numpy as np
+from typing import Dict, Iterator, List
+
+# Packed chunk-store format, replacing the pickled {id: chunk} dicts:
+#   8-byte magic | uint64 count | uint64 offsets[count + 1] | UTF-8 blob
+# Chunk i is blob[offsets[i]:offsets[i + 1]]. Files are memory-mapped read-only, so
+# processes serving the same unit share pages through the OS cache, and nothing in
+# the file is ever unpickled.
+
+MAGIC = b'LMCHUNK1'
+HEADER = struct.Struct('<8sQ')
+CHUNKS_SUFFIX = '.chunks'
+LEGACY_SUFFIX = '_id2chunk.pkl'
+
+def write_packed_chunks(path: str, chunks: List[str]):
+    encoded = [chunk.encode('utf-8') for chunk in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum(np.array([len(data) for data in encoded], dtype='<u8'), out=offsets[1:])
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(encoded)))
+        f.write(offsets.tobytes())
+        for data in encoded:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+class PackedChunkStore:
+    # Read-only, memory-mapped view of a packed chunk file with O(1) lookup by id.
+    # Supports the `store[i]` / `len()` / iteration use of the old id2chunk dict.
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f'{path} is not a packed chunk store.')
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a packed chunk store.')
+        self._count = count
+        self._offsets = np.frombuffer(self._mm, dtype='<u8', count=count + 1, offset=HEADER.size)
+        self._base = HEADER.size + self._offsets.nbytes
+        if count and self._base + int(self._offsets[-1]) > size:
+            raise ValueError(f'{path} is truncated.')
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx) -> str:
+        idx = int(idx)
+        if idx < 0 or idx >= self._count:
+            raise KeyError(idx)
+        start = self._base + int(self._offsets[idx])
+        end = self._base + int(self._offsets[idx + 1])
+        return self._mm[start:end].decode('utf-8')
+
+    def get(self, idx, default=None):
+        try:
+            return self[idx]
+        except KeyError:
+            return default
+
+    def __iter__(self) -> Iterator[str]:
+        for idx in range(self._count):
+            yield self[idx]
+
+    def close(self):
+        self._offsets = None
+        self._mm.close()
+
+def load_legacy_id2chunk(path: str) -> Dict[int, str]:
+    # Only for trusted, pre-existing files: unpickling can execute arbitrary code
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def convert_legacy(pkl_path: str) -> str:
+    id2chunk = load_legacy_id2chunk(pkl_path)
+    chunks = [id2chunk[i] for i in range(len(id2chunk))]
+    out_path = pkl_path[:-len(LEGACY_SUFFIX)] + CHUNKS_SUFFIX
+    write_packed_chunks(out_path, chunks)
+    return out_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert <unit>_id2chunk.pkl files to packed <unit>.chunks files.')
+    parser.add_argument('index_dir', nargs='?', default=os.path.join(os.path.dirname(__file__), '../faiss_indexes'))
+    args = parser.parse_args()
+    for pkl_path in sorted(glob.glob(os.path.join(args.index_dir, '*' + LEGACY_SUFFIX))):
+        out_path = convert_legacy(pkl_path)
+        print(f'{pkl_path} -> {out_path} ({len(PackedChunkStore(out_path))} chunks)')
@@ -0,0 +1,93 @@
+import math
+import re
+from typing import List, Dict, Tuple
+from bm25_index import tokenize
+from text_chunking import iter_sentences
+
+# Context assembly for LLM prompts: retrieved chunks are split into sentences,
+# sentences repeated by chunk overlap are dropped, and the best ones are packed into
+# a token budget, then put back in reading order.
+
+# Context token budgets per prompt type (MCQ is per question asked)
+NOTES_CONTEXT_TOKENS = 1500
+EXPLAIN_CONTEXT_TOKENS = 700
+MCQ_CONTEXT_TOKENS = 350
+# Weight of a chunk's retrieval rank against query-term overlap when scoring sentences
+RANK_WEIGHT = 0.5
+# Shortest chunk-edge fragment dropped as part of an earlier sentence; shorter ones may
+# just as well be a heading or formula that happens to recur
+MIN_FRAGMENT_TOKENS = 4
+
+PIECE = re.compile(r'\w+|[^\w\s]')
+
+def estimate_tokens(text: str) -> int:
+    # LLM tokenizer stand-in (no Llama tokenizer locally): one token per word or
+    # punctuation mark, long words split every 6 characters. Within ~15% of the
+    # Llama 3 count on English prose.
+    return sum(math.ceil(len(piece) / 6) for piece in PIECE.findall(text))
+
+def _normalize(sentence: str) -> str:
+    return ' '.join(tokenize(sentence))
+
+def _is_fragment(norm: str, seen: Dict[str, None]) -> bool:
+    # A sentence cut by a word-window chunk boundary: the start or end of an earlier
+    # sentence, on token boundaries
+    if len(norm.split()) < MIN_FRAGMENT_TOKENS:
+        return False
+    return any(other.startswith(norm + ' ') or other.endswith(' ' + norm) for other in seen)
+
+def assemble_context(chunks: List[str], query: str = '', budget: int = NOTES_CONTEXT_TOKENS) -> Tuple[str, Dict[str, int]]:
+    # Returns the packed context and counts for logging. Without a query, sentences are
+    # taken breadth-first (every chunk's first sentence, then every second one...) so
+    # each chunk is represented; with one, by query-term overlap plus chunk rank.
+    sentences = []  # (chunk rank, position, text, normalized)
+    seen = {}  # normalized sentences kept so far, in order
+    duplicates = 0
+    for rank, chunk in enumerate(chunks):
+        spans = list(iter_sentences(chunk))
+        position = 0
+        for i, (s, e, _) in enumerate(spans):
+            text = chunk[s:e]
+            norm = _normalize(text)
+            if not norm:
+                continue
+            # Overlapping chunks repeat whole sentences, or a fragment of one at the cut
+            edge = i == 0 or i == len(spans) - 1
+            if norm in seen or (edge and _is_fragment(norm, seen)):
+                duplicates += 1
+                continue
+            seen[norm] = None
+            sentences.append((rank, position, text, norm))
+            position += 1
+
+    terms = set(tokenize(query))
+
+    def score(item):
+        rank, position, _, norm = item
+        if not terms:
+            return (-position, -rank)
+        words = norm.split()
+        overlap = sum(1 for w in words if w in terms) / math.sqrt(len(words))
+        return (overlap + RANK_WEIGHT / (1 + rank), -position)
+
+    chosen = []
+    used = 0
+    for item in sorted(sentences, key=score, reverse=True):
+        cost = estimate_tokens(item[2])
+        if used + cost > budget:
+            continue
+        chosen.append(item)
+        used += cost
+    chosen.sort(key=lambda item: (item[0], item[1]))
+    parts = []
+    for rank in dict.fromkeys(item[0] for item in chosen):
+        parts.append(' '.join(item[2] for item in chosen if item[0] == rank))
+    stats = {
+        'chunks': len(chunks),
+        'sentences': len(sentences),
+        'duplicates': duplicates,
+        'kept': len(chosen),
+        'input_tokens': sum(estimate_tokens(chunk) for chunk in chunks),
+        'context_tokens': used,
+    }
+    return '\n\n'.join(parts), stats
@@ -0,0 +1,209 @@
+import argparse
+import base64
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import numpy as np
+from typing import List, Tuple, Dict, Optional
+from faiss_store import ChapterFaissStore, DIVERSE_MAX, SHARED_INDEX
+from metrics import stage
+
+# Optional shared embedding/search process. One server holds the model and the loaded
+# indexes; web workers talk to it over a UNIX socket through RemoteFaissStore, so they
+# start in well under a second and the model exists once in memory.
+#
+#   python embedding_server.py --socket /tmp/learn_medico_embed.sock
+#   EMBEDDING_SERVER_SOCKET=/tmp/learn_medico_embed.sock gunicorn -w 4 flask_rag_custom:app
+#
+# SHARED_INDEX=<name> selects a shared multi-unit index for the server and for
+# in-process stores alike; remote workers read it from the server.
+#
+# Wire format: 4-byte big-endian length + UTF-8 JSON, one request/response per frame.
+
+DEFAULT_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET")
+FRAME = struct.Struct('>I')
+# Error types re-raised as themselves on the client side
+_ERRORS = {"FileNotFoundError": FileNotFoundError, "ValueError": ValueError, "KeyError": KeyError}
+
+def _send(sock: socket.socket, payload: Dict):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(FRAME.pack(len(data)) + data)
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(n - len(buf))
+        if not part:
+            raise ConnectionError("embedding server connection closed")
+        buf.extend(part)
+    return bytes(buf)
+
+def _recv(sock: socket.socket) -> Dict:
+    (length,) = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    return json.loads(_recv_exact(sock, length).decode('utf-8'))
+
+def _encode_array(arr: np.ndarray) -> Dict:
+    arr = np.ascontiguousarray(arr, dtype='float32')
+    return {"shape": list(arr.shape), "data": base64.b64encode(arr.tobytes()).decode('ascii')}
+
+def _decode_array(payload: Dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype='float32').reshape(payload["shape"])
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                request = _recv(self.request)
+            except ConnectionError:
+                return
+            try:
+                op = request["op"]
+                if op == "search_many":
+                    results = store.search_many(request["unit"], request["queries"], request.get("top_k", 3))
+                    response = {"results": results}
+                elif op == "hybrid_search_many":
+                    results = store.hybrid_search_many(request["unit"], request["queries"], request.get("top_k", 3))
+                    response = {"results": results}
+                elif op == "diverse_chunks":
+                    response = {"chunks": store.diverse_chunks(request["unit"], request["count"])}
+                elif op == "candidate_facts":
+                    response = {"facts": store.candidate_facts(request["unit"], request["count"], request["start"],
+                                                               request["num_distractors"])}
+                elif op == "embed_chunks":
+                    response = {"embeddings": _encode_array(store.embed_chunks(request["texts"]))}
+                elif op == "embed_queries":
+                    response = {"embeddings": _encode_array(store.embed_queries(request["texts"]))}
+                elif op == "warm":
+                    response = {"bytes": store.warm(request["unit"])}
+                elif op == "shared_units":
+                    response = {"shared_index": store.shared_index, "units": store.shared_units()}
+                elif op == "stats":
+                    response = {"query_cache": store.query_cache.stats(), "loaded": list(store.indexes),
+                                "loaded_bytes": store.loaded_bytes(), "loaded_units": store.loaded_units(),
+                                "max_loaded_bytes": store.max_loaded_bytes}
+                else:
+                    raise ValueError(f"Unknown op {op!r}")
+            except Exception as e:
+                response = {"error": str(e), "type": type(e).__name__}
+            _send(self.request, response)
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, store: ChapterFaissStore):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.store = store
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+class RemoteFaissStore:
+    # Client with the retrieval half of the ChapterFaissStore interface; one persistent
+    # connection per calling thread
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 60.0):
+        if not socket_path:
+            raise ValueError("No embedding server socket configured.")
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._shared_index = None
+
+    def _call(self, payload: Dict) -> Dict:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        try:
+            with stage("embedding_server", op=payload["op"]):
+                _send(sock, payload)
+                response = _recv(sock)
+        except (OSError, ConnectionError):
+            sock.close()
+            self._local.sock = None
+            raise
+        if "error" in response:
+            raise _ERRORS.get(response.get("type"), RuntimeError)(response["error"])
+        return response
+
+    def search(self, unit, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        return self.search_many(unit, [query], top_k)[0]
+
+    def search_many(self, unit, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        if not queries:
+            return []
+        results = self._call({"op": "search_many", "unit": unit, "queries": queries, "top_k": top_k})["results"]
+        return [[(chunk, distance) for chunk, distance in hits] for hits in results]
+
+    def hybrid_search(self, unit, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        return self.hybrid_search_many(unit, [query], top_k)[0]
+
+    def hybrid_search_many(self, unit, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        if not queries:
+            return []
+        results = self._call({"op": "hybrid_search_many", "unit": unit, "queries": queries, "top_k": top_k})["results"]
+        return [[(chunk, score) for chunk, score in hits] for hits in results]
+
+    def diverse_chunks(self, unit, count: int = DIVERSE_MAX) -> List[str]:
+        return self._call({"op": "diverse_chunks", "unit": unit, "count": count})["chunks"]
+
+    def candidate_facts(self, unit, count: int, start: int = 0, num_distractors: int = 3) -> List[Dict]:
+        return self._call({"op": "candidate_facts", "unit": unit, "count": count, "start": start,
+                           "num_distractors": num_distractors})["facts"]
+
+    def embed_chunks(self, chunks: List[str]) -> np.ndarray:
+        return _decode_array(self._call({"op": "embed_chunks", "texts": chunks})["embeddings"])
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        return _decode_array(self._call({"op": "embed_queries", "texts": queries})["embeddings"])
+
+    def warm(self, unit) -> int:
+        return self._call({"op": "warm", "unit": unit})["bytes"]
+
+    @property
+    def shared_index(self) -> Optional[str]:
+        # The server's shared index name; fixed for its lifetime, so asked for once
+        if self._shared_index is None:
+            self._shared_index = self._call({"op": "shared_units"})["shared_index"] or ''
+        return self._shared_index or None
+
+    def shared_units(self) -> Dict[str, List[int]]:
+        return self._call({"op": "shared_units"})["units"]
+
+    def loaded_units(self) -> Dict[str, int]:
+        return self.stats()["loaded_units"]
+
+    def stats(self) -> Dict:
+        return self._call({"op": "stats"})
+
+def make_faiss_store(index_dir: str, socket_path: Optional[str] = DEFAULT_SOCKET,
+                     shared_index: Optional[str] = SHARED_INDEX):
+    # Entry points call this: a RemoteFaissStore when EMBEDDING_SERVER_SOCKET is set
+    # (the server's own SHARED_INDEX applies), otherwise an in-process
+    # ChapterFaissStore (which loads its model lazily)
+    if socket_path:
+        return RemoteFaissStore(socket_path)
+    return ChapterFaissStore(index_dir=index_dir, shared_index=shared_index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared embedding/search server over a UNIX socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET or "/tmp/learn_medico_embed.sock")
+    parser.add_argument("--index-dir", default=os.path.abspath(os.path.join(os.path.dirname(__file__), '../faiss_indexes')))
+    parser.add_argument("--shared-index", default=SHARED_INDEX)
+    args = parser.parse_args()
+    store = ChapterFaissStore(index_dir=args.index_dir, shared_index=args.shared_index)
+    store.embed_queries(["warm up"])  # load the model before accepting connections
+    from chapter_registry import ChapterRegistry
+    ChapterRegistry(store, args.index_dir).prewarm()  # and the hot units soon after
+    server = EmbeddingServer(args.socket, store)
+    print(f"Embedding server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
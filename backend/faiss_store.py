@@ -1,56 +1,697 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
-from typing import List, Dict, Tuple
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional
 import os
-import pickle
+import json
+import hashlib
+import threading
+import time
+from bm25_index import BM25Index, BM25_SUFFIX
+from chunk_store import PackedChunkStore, write_packed_chunks, load_legacy_id2chunk, CHUNKS_SUFFIX, LEGACY_SUFFIX
+from sentence_index import SentenceIndex
+from metrics import stage
 
-EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+QUERY_CACHE_SIZE = 1024
 
-class ChapterFaissStore:
-    def __init__(self, index_dir: str = 'faiss_indexes'):
+# Embedding backends, all producing the same 384-dim MiniLM vectors:
+#   torch       fp32 SentenceTransformer (reference)
+#   torch_int8  the same model with its Linear layers dynamically quantized to int8
+#   onnx        ONNX Runtime export of the model
+#   onnx_int8   dynamically int8-quantized ONNX export
+# ONNX exports are written once under EMBEDDING_EXPORT_DIR and reused.
+EMBEDDING_BACKENDS = ('torch', 'torch_int8', 'onnx', 'onnx_int8')
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))  # 0 keeps the runtime default
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+EMBEDDING_EXPORT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../models'))
+ONNX_INT8_CONFIG = 'avx2'
+ONNX_INT8_FILE = 'onnx/model_quint8_avx2.onnx'  # file name the 'avx2' config writes
+
+# One embedding model per (name, backend) per process, loaded on first use: importing
+# this module and constructing stores stays cheap, and stores share the model
+_models = {}
+_models_lock = threading.Lock()
+
+def _onnx_export_dir(name: str, quantized: bool) -> str:
+    # Imported here because sentence_transformers pulls in torch, which takes seconds
+    from sentence_transformers import SentenceTransformer
+    export_dir = os.path.join(EMBEDDING_EXPORT_DIR, name.replace('/', '__') + '-onnx')
+    if not os.path.exists(os.path.join(export_dir, 'onnx', 'model.onnx')):
+        SentenceTransformer(name, device='cpu', backend='onnx').save_pretrained(export_dir)
+    if quantized and not os.path.exists(os.path.join(export_dir, ONNX_INT8_FILE)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        model = SentenceTransformer(export_dir, device='cpu', backend='onnx')
+        export_dynamic_quantized_onnx_model(model, ONNX_INT8_CONFIG, export_dir)
+    return export_dir
+
+def _load_embedding_model(name: str, backend: str, threads: int):
+    from sentence_transformers import SentenceTransformer
+    if backend in ('torch', 'torch_int8'):
+        import torch
+        if threads:
+            torch.set_num_threads(threads)  # process-wide in torch
         # Force CPU usage to avoid CUDA errors
-        self.model = SentenceTransformer(EMBEDDING_MODEL_NAME, device='cpu')
+        model = SentenceTransformer(name, device='cpu')
+        if backend == 'torch_int8':
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    quantized = backend == 'onnx_int8'
+    return SentenceTransformer(_onnx_export_dir(name, quantized), device='cpu', backend='onnx',
+                               model_kwargs={'file_name': ONNX_INT8_FILE if quantized else 'onnx/model.onnx',
+                                             'session_options': options})
+
+def get_embedding_model(name: str = EMBEDDING_MODEL_NAME, backend: str = EMBEDDING_BACKEND,
+                        threads: int = EMBEDDING_THREADS):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f'Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}.')
+    with _models_lock:
+        model = _models.get((name, backend))
+        if model is None:
+            model = _load_embedding_model(name, backend, threads)
+            _models[(name, backend)] = model
+        return model
+
+# Index types for store_chapter. IVF variants need enough training vectors
+# (faiss wants ~39 per centroid); smaller units fall back to a flat index.
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+DEFAULT_NPROBE = 8
+DEFAULT_EF_SEARCH = 64
+HNSW_M = 32
+PQ_M = 16  # sub-quantizers; must divide the embedding dimension (384 for MiniLM)
+PQ_NBITS = 8
+MIN_POINTS_PER_CENTROID = 39
+
+# Loaded indexes are kept in an LRU bounded by their on-disk size
+MAX_LOADED_BYTES = 1024 * 1024 * 1024
+FULL_BOOK = 'Full Book'
+UNITS_SUFFIX = '_units.json'
+# Name of the shared multi-unit index (build_index.py --shared NAME) the entry points
+# search instead of per-unit indexes; unset to use one index per unit
+SHARED_INDEX = os.getenv('SHARED_INDEX') or None
+
+# Hybrid retrieval: dense and BM25 candidate lists fused with reciprocal rank fusion,
+# then optionally re-ranked by a CPU cross-encoder (RERANK_MODEL, e.g.
+# cross-encoder/ms-marco-MiniLM-L-6-v2) as far as the per-query latency budget allows
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+RERANK_MODEL = os.getenv('RERANK_MODEL')
+RERANK_TOP_N = 10
+HYBRID_BUDGET_MS = float(os.getenv('HYBRID_BUDGET_MS', '50'))
+
+# Coverage-ordered chunks for MCQ contexts (see diverse_chunks): how many to order per
+# unit and the MMR trade-off between representativeness (0) and novelty (1)
+DIVERSE_MAX = 64
+MMR_DIVERSITY = 0.5
+
+_rerankers = {}
+
+def get_reranker(name: str):
+    with _models_lock:
+        model = _rerankers.get(name)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(name, device='cpu')
+            _rerankers[name] = model
+        return model
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    # (id, fused score) best first; each ranking contributes 1 / (k + rank)
+    scores = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+def build_faiss_index(embeddings: np.ndarray, index_type: str = 'flat', nlist: Optional[int] = None) -> faiss.Index:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f'Unknown index type {index_type!r}; expected one of {INDEX_TYPES}.')
+    n, dim = embeddings.shape
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+    elif index_type in ('ivf_flat', 'ivf_pq'):
+        if nlist is None:
+            nlist = int(4 * np.sqrt(n))
+        nlist = min(nlist, n // MIN_POINTS_PER_CENTROID)
+        # PQ needs 2^PQ_NBITS training points per centroid and PQ_M to divide the dimension
+        pq_unfit = index_type == 'ivf_pq' and (n < (1 << PQ_NBITS) * MIN_POINTS_PER_CENTROID or dim % PQ_M)
+        if nlist < 1 or pq_unfit:
+            index = faiss.IndexFlatL2(dim)
+        else:
+            quantizer = faiss.IndexFlatL2(dim)
+            if index_type == 'ivf_flat':
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+            else:
+                index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, PQ_NBITS)
+            index.train(embeddings)
+    else:
+        index = faiss.IndexFlatL2(dim)
+    index.add(embeddings)
+    return index
+
+def set_search_params(index: faiss.Index, nprobe: int = DEFAULT_NPROBE, ef_search: int = DEFAULT_EF_SEARCH):
+    # Query-time knobs; no-ops for index types that do not have them
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), 'hnsw', None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+
+def search_params_for(index: faiss.Index, selector, nprobe: int = DEFAULT_NPROBE,
+                      ef_search: int = DEFAULT_EF_SEARCH) -> faiss.SearchParameters:
+    # Per-call parameters restricting a search to the ids accepted by `selector`
+    kind = index_type_of(index)
+    if kind in ('ivf_flat', 'ivf_pq'):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(nprobe, faiss.extract_index_ivf(index).nlist))
+    if kind == 'hnsw':
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    return faiss.SearchParameters(sel=selector)
+
+def index_type_of(index: faiss.Index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf_flat'
+    return 'flat'
+
+def reconstruct_vectors(index: faiss.Index) -> np.ndarray:
+    # Stored vectors of an index without an _embeddings.npy (approximate for PQ)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def mmr_order(vectors: np.ndarray, count: int, diversity: float = MMR_DIVERSITY) -> List[int]:
+    # Maximal marginal relevance with the centroid as the query: start from the most
+    # representative vector, then repeatedly take the one that best trades closeness
+    # to the centroid against similarity to everything already picked
+    if not len(vectors):
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    centroid = vectors.mean(axis=0)
+    relevance = vectors @ (centroid / max(np.linalg.norm(centroid), 1e-12))
+    order = [int(np.argmax(relevance))]
+    max_sim = vectors @ vectors[order[0]]
+    while len(order) < min(count, len(vectors)):
+        scores = (1 - diversity) * relevance - diversity * max_sim
+        scores[order] = -np.inf
+        nxt = int(np.argmax(scores))
+        order.append(nxt)
+        max_sim = np.maximum(max_sim, vectors @ vectors[nxt])
+    return order
+
+class QueryEmbeddingCache:
+    # Size-bounded LRU of query string -> embedding row, with hit/miss counters
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        with self._lock:
+            emb = self._data.get(query)
+            if emb is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(query)
+            self.hits += 1
+            return emb
+
+    def put(self, query: str, emb: np.ndarray):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[query] = emb
+            self._data.move_to_end(query)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class ChapterFaissStore:
+    def __init__(self, index_dir: str = 'faiss_indexes', query_cache_size: int = QUERY_CACHE_SIZE,
+                 index_type: str = 'flat', nprobe: int = DEFAULT_NPROBE, ef_search: int = DEFAULT_EF_SEARCH,
+                 shared_index: Optional[str] = None, max_loaded_bytes: Optional[int] = MAX_LOADED_BYTES,
+                 embedding_backend: str = EMBEDDING_BACKEND, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 rerank_model: Optional[str] = RERANK_MODEL, hybrid_budget_ms: float = HYBRID_BUDGET_MS):
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f'Unknown embedding backend {embedding_backend!r}; expected one of {EMBEDDING_BACKENDS}.')
         self.index_dir = index_dir
         if not os.path.exists(index_dir):
             os.makedirs(index_dir)
-        self.indexes = {}  # unit -> (faiss index, id2chunk)
+        # unit -> (faiss index, PackedChunkStore or legacy id2chunk dict), least recently used first
+        self.indexes = OrderedDict()
+        self.max_loaded_bytes = max_loaded_bytes
+        self._loaded_bytes = {}
+        self._lock = threading.RLock()
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # Name of a shared multi-unit index (see store_shared); units it contains are
+        # searched through it with an id filter instead of their own index files
+        self.shared_index = shared_index
+        self._shared_units = None
+        self._selectors = {}
+        self.embedding_backend = embedding_backend
+        self.batch_size = batch_size
+        self._bm25 = {}  # unit -> BM25Index, evicted together with the FAISS index
+        self.rerank_model = rerank_model
+        self.hybrid_budget_ms = hybrid_budget_ms
+        self._rerank_pair_ms = None  # running estimate of cross-encoder cost per pair
+        self._diverse = {}  # unit -> (chunk ids in MMR order, chunks in the unit)
+        self._sentences = {}  # unit -> SentenceIndex, evicted together with the FAISS index
+
+    @property
+    def model(self):
+        return get_embedding_model(EMBEDDING_MODEL_NAME, self.embedding_backend)
 
     def embed_chunks(self, chunks: List[str]) -> np.ndarray:
-        return np.array(self.model.encode(chunks, show_progress_bar=False, convert_to_numpy=True))
+        model = self.model  # the first call's model load is not counted as embedding
+        with stage("embed"):
+            return np.array(model.encode(chunks, batch_size=self.batch_size, show_progress_bar=False,
+                                         convert_to_numpy=True))
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        # Serve repeated queries from the LRU cache and encode all misses in one batch
+        cached = [self.query_cache.get(q) for q in queries]
+        missing = list(dict.fromkeys(q for q, emb in zip(queries, cached) if emb is None))
+        fresh = {}
+        if missing:
+            for q, emb in zip(missing, self.embed_chunks(missing)):
+                fresh[q] = emb
+                self.query_cache.put(q, emb)
+        rows = [emb if emb is not None else fresh[q] for q, emb in zip(queries, cached)]
+        return np.ascontiguousarray(np.vstack(rows), dtype='float32')
+
+    def _path(self, unit: str, suffix: str) -> str:
+        return os.path.join(self.index_dir, f'{unit}{suffix}')
 
-    def store_chapter(self, unit: str, chunks: List[str]):
-        embeddings = self.embed_chunks(chunks)
+    @staticmethod
+    def chunk_hash(chunk: str) -> str:
+        return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        with self._lock:
+            for index, _ in self.indexes.values():
+                set_search_params(index, self.nprobe, self.ef_search)
+
+    def store_chapter(self, unit: str, chunks: List[str], embeddings: Optional[np.ndarray] = None,
+                      index_type: Optional[str] = None, nlist: Optional[int] = None,
+                      provenance: Optional[List[Dict]] = None):
+        if embeddings is None:
+            embeddings = self.embed_chunks(chunks)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
         dim = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dim)
-        index.add(embeddings)
-        id2chunk = {i: chunk for i, chunk in enumerate(chunks)}
+        index = build_faiss_index(embeddings, index_type or self.index_type, nlist)
+        set_search_params(index, self.nprobe, self.ef_search)
         # Save index and mapping
-        faiss.write_index(index, os.path.join(self.index_dir, f'{unit}.index'))
-        with open(os.path.join(self.index_dir, f'{unit}_id2chunk.pkl'), 'wb') as f:
-            pickle.dump(id2chunk, f)
-        self.indexes[unit] = (index, id2chunk)
+        faiss.write_index(index, self._path(unit, '.index'))
+        write_packed_chunks(self._path(unit, CHUNKS_SUFFIX), chunks)
+        bm25 = BM25Index.build(chunks)
+        bm25.save(self._path(unit, BM25_SUFFIX))
+        self._remember(unit, index, PackedChunkStore(self._path(unit, CHUNKS_SUFFIX)))
+        with self._lock:
+            self._bm25[unit] = bm25
+            self._diverse.clear()
+        # Keep the raw matrix and a manifest of chunk hashes so rebuilds can reuse embeddings
+        np.save(self._path(unit, '_embeddings.npy'), embeddings)
+        manifest = {
+            'model': EMBEDDING_MODEL_NAME,
+            'backend': self.embedding_backend,
+            'dim': int(dim),
+            'index_type': index_type_of(index),
+            'chunks': [self.chunk_hash(chunk) for chunk in chunks],
+        }
+        if provenance is not None:
+            # Per-chunk source location from text_chunking.iter_chunks (offsets, pages)
+            manifest['provenance'] = provenance
+        with open(self._path(unit, '_manifest.json'), 'w') as f:
+            json.dump(manifest, f)
 
-    def load_chapter(self, unit: str):
-        index_path = os.path.join(self.index_dir, f'{unit}.index')
-        id2chunk_path = os.path.join(self.index_dir, f'{unit}_id2chunk.pkl')
-        if os.path.exists(index_path) and os.path.exists(id2chunk_path):
-            index = faiss.read_index(index_path)
-            with open(id2chunk_path, 'rb') as f:
-                id2chunk = pickle.load(f)
+    def _stored_embeddings(self, unit: str) -> Dict[str, np.ndarray]:
+        manifest_path = self._path(unit, '_manifest.json')
+        embeddings_path = self._path(unit, '_embeddings.npy')
+        if not (os.path.exists(manifest_path) and os.path.exists(embeddings_path)):
+            return {}
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        # int8 and ONNX vectors differ slightly from fp32 torch ones; never mix them in one index
+        if manifest.get('model') != EMBEDDING_MODEL_NAME or manifest.get('backend') != self.embedding_backend:
+            return {}
+        embeddings = np.load(embeddings_path)
+        if len(embeddings) != len(manifest['chunks']):
+            return {}
+        return dict(zip(manifest['chunks'], embeddings))
+
+    def _embed_with_reuse(self, unit: str, chunks: List[str]) -> Tuple[np.ndarray, int]:
+        # Embed only chunks whose content hash is not in the unit's manifest
+        previous = self._stored_embeddings(unit)
+        hashes = [self.chunk_hash(chunk) for chunk in chunks]
+        missing = list(dict.fromkeys(h for h in hashes if h not in previous))
+        if missing:
+            by_hash = dict(zip(hashes, chunks))
+            fresh = self.embed_chunks([by_hash[h] for h in missing])
+            previous.update(zip(missing, fresh))
+        if not chunks:
+            return np.zeros((0, 0), dtype='float32'), 0
+        return np.vstack([previous[h] for h in hashes]), len(missing)
+
+    def update_chapter(self, unit: str, chunks: List[str], index_type: Optional[str] = None,
+                       nlist: Optional[int] = None, provenance: Optional[List[Dict]] = None) -> Dict[str, int]:
+        # Rebuild a unit, embedding only chunks whose content hash is not in its manifest
+        embeddings, embedded = self._embed_with_reuse(unit, chunks)
+        if chunks:
+            self.store_chapter(unit, chunks, embeddings, index_type, nlist, provenance)
+        return {'chunks': len(chunks), 'embedded': embedded, 'reused': len(chunks) - embedded}
+
+    def update_shared(self, name: str, units: Dict[str, List[str]], index_type: Optional[str] = None,
+                      nlist: Optional[int] = None,
+                      provenance: Optional[Dict[str, List[Dict]]] = None) -> Dict[str, int]:
+        # One index for many units: each unit's chunks get a contiguous id range and
+        # the whole book is the union, so no vector is stored twice
+        chunks = []
+        ranges = {}
+        for unit, unit_chunks in units.items():
+            ranges[unit] = [len(chunks), len(chunks) + len(unit_chunks)]
+            chunks.extend(unit_chunks)
+        sources = None
+        if provenance is not None:
+            sources = [source for unit in units for source in provenance[unit]]
+        stats = self.update_chapter(name, chunks, index_type, nlist, sources)
+        with open(self._path(name, UNITS_SUFFIX), 'w') as f:
+            json.dump({'units': ranges}, f)
+        with self._lock:
+            if name == self.shared_index:
+                self._shared_units = ranges
+                self._selectors.clear()
+                self._diverse.clear()
+        return stats
+
+    def update_sentences(self, name: str, chunks: Optional[List[str]] = None) -> Dict[str, int]:
+        # Build the sentence side index of a unit or shared index (see sentence_index)
+        # from its chunks, reusing the embeddings of sentences the last build had
+        if chunks is None:
+            _, id2chunk = self._get_loaded(name)
+            chunks = [id2chunk[i] for i in range(len(id2chunk))]
+        prefix = self._path(name, '')
+        previous = SentenceIndex.load(prefix) if SentenceIndex.exists(prefix) else None
+        path = self._path(name, '_embeddings.npy')
+        chunk_vectors = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+        with stage("sentences"):
+            sentences = SentenceIndex.build(chunks, self.embed_chunks, chunk_vectors, previous,
+                                            EMBEDDING_MODEL_NAME, self.embedding_backend)
+        sentences.save(prefix)
+        with self._lock:
+            old = self._sentences.pop(name, None)
+            if old is not None and name in self._loaded_bytes:
+                self._loaded_bytes[name] -= old.nbytes
+        return {'sentences': len(sentences), 'embedded': sentences.embedded,
+                'facts': sum(1 for term in sentences.terms if term)}
+
+    def shared_units(self) -> Dict[str, List[int]]:
+        # unit -> [first id, end id) inside the shared index; empty without one
+        if self.shared_index is None:
+            return {}
+        if self._shared_units is None:
+            path = self._path(self.shared_index, UNITS_SUFFIX)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'Unit map for shared index {self.shared_index} not found.')
+            with open(path) as f:
+                self._shared_units = json.load(f)['units']
+        return self._shared_units
+
+    def provenance(self, unit: str) -> Optional[List[Dict]]:
+        # Source locations of a unit's chunks in id order, or None if it was built
+        # without them (word chunker, older indexes)
+        name, first, end = unit, 0, None
+        if unit in self.shared_units():
+            name = self.shared_index
+            first, end = self.shared_units()[unit]
+        path = self._path(name, '_manifest.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            sources = json.load(f).get('provenance')
+        return sources[first:end] if sources is not None else None
+
+    def _remember(self, unit: str, index, id2chunk, nbytes: int = 0):
+        with self._lock:
+            self.indexes.pop(unit, None)
+            self._bm25.pop(unit, None)
+            self._sentences.pop(unit, None)
             self.indexes[unit] = (index, id2chunk)
+            self._loaded_bytes[unit] = nbytes or index.ntotal * index.d * 4
+            # Evict least recently used units; mmapped chunk stores close once unreferenced
+            while self.max_loaded_bytes is not None and len(self.indexes) > 1 and \
+                    sum(self._loaded_bytes.values()) > self.max_loaded_bytes:
+                old, _ = self.indexes.popitem(last=False)
+                self._loaded_bytes.pop(old, None)
+                self._bm25.pop(old, None)
+                self._sentences.pop(old, None)
+
+    def loaded_bytes(self) -> int:
+        with self._lock:
+            return sum(self._loaded_bytes.values())
+
+    def loaded_units(self) -> Dict[str, int]:
+        # Loaded index name -> accounted bytes, least recently used first
+        with self._lock:
+            return {unit: self._loaded_bytes.get(unit, 0) for unit in self.indexes}
+
+    def warm(self, unit) -> int:
+        # Load what a search of `unit` needs (FAISS index, chunks, BM25) ahead of the
+        # first query; returns the accounted bytes of the index it resolved to
+        name, _ = self._resolve(unit)
+        _, id2chunk = self._get_loaded(name)
+        self._get_bm25(name, id2chunk)
+        with self._lock:
+            return self._loaded_bytes.get(name, 0)
+
+    def load_chapter(self, unit: str):
+        index_path = self._path(unit, '.index')
+        chunks_path = self._path(unit, CHUNKS_SUFFIX)
+        legacy_path = self._path(unit, LEGACY_SUFFIX)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f'Index or mapping for unit {unit} not found.')
+        if os.path.exists(chunks_path):
+            id2chunk = PackedChunkStore(chunks_path)
+        elif os.path.exists(legacy_path):
+            # Pickled mapping from before the packed format; convert with `python chunk_store.py`
+            id2chunk = load_legacy_id2chunk(legacy_path)
         else:
             raise FileNotFoundError(f'Index or mapping for unit {unit} not found.')
+        index = faiss.read_index(index_path)
+        set_search_params(index, self.nprobe, self.ef_search)
+        self._remember(unit, index, id2chunk, os.path.getsize(index_path))
+        return index, id2chunk
+
+    def _get_loaded(self, unit: str):
+        with self._lock:
+            entry = self.indexes.get(unit)
+            if entry is not None:
+                self.indexes.move_to_end(unit)
+                return entry
+        return self.load_chapter(unit)
+
+    def _resolve(self, unit) -> Tuple[str, Optional[object]]:
+        # Map a unit, a list of units or the whole book onto (index name, id selector)
+        units = [unit] if isinstance(unit, str) else list(unit)
+        if self.shared_index is None:
+            if len(units) != 1:
+                raise ValueError('Searching several units at once needs a shared index.')
+            return units[0], None
+        ranges = self.shared_units()
+        if FULL_BOOK in units or self.shared_index in units or set(units) >= set(ranges):
+            return self.shared_index, None
+        unknown = [u for u in units if u not in ranges]
+        if unknown:
+            if len(units) == 1:
+                return units[0], None  # a unit kept in its own index files
+            raise FileNotFoundError(f'Units {unknown} are not in shared index {self.shared_index}.')
+        key = tuple(sorted(units))
+        with self._lock:
+            selector = self._selectors.get(key)
+            if selector is None:
+                if len(key) == 1:
+                    selector = faiss.IDSelectorRange(*ranges[key[0]])
+                else:
+                    ids = np.concatenate([np.arange(*ranges[u], dtype='int64') for u in key])
+                    selector = faiss.IDSelectorBatch(ids)
+                self._selectors[key] = selector
+        return self.shared_index, selector
+
+    def _get_bm25(self, name: str, id2chunk) -> BM25Index:
+        with self._lock:
+            bm25 = self._bm25.get(name)
+        if bm25 is None:
+            path = self._path(name, BM25_SUFFIX)
+            # Indexes built before BM25 was added get one in memory from their chunks
+            if os.path.exists(path):
+                bm25 = BM25Index.load(path)
+            else:
+                bm25 = BM25Index.build([id2chunk[i] for i in range(len(id2chunk))])
+            with self._lock:
+                if name in self.indexes:
+                    self._bm25[name] = bm25
+        return bm25
+
+    def _allowed_ids(self, unit, selector, n: int) -> Optional[np.ndarray]:
+        # Boolean id mask matching a shared-index selector, for the BM25 side
+        if selector is None:
+            return None
+        ranges = self.shared_units()
+        allowed = np.zeros(n, dtype=bool)
+        for u in ([unit] if isinstance(unit, str) else unit):
+            first, end = ranges[u]
+            allowed[first:end] = True
+        return allowed
+
+    def _diverse_ids(self, unit, count: int = DIVERSE_MAX) -> List[int]:
+        # Up to `count` chunk ids of a unit ordered for coverage (mmr_order over the
+        # stored vectors); computed once per unit and reused by every quiz
+        key = unit if isinstance(unit, str) else tuple(sorted(unit))
+        with self._lock:
+            order, total = self._diverse.get(key, (None, 0))
+        # A unit with fewer chunks than asked for has a complete, shorter order
+        if order is None or len(order) < min(count, total):
+            name, selector = self._resolve(unit)
+            index, _ = self._get_loaded(name)
+            allowed = self._allowed_ids(unit, selector, index.ntotal)
+            ids = np.arange(index.ntotal) if allowed is None else np.flatnonzero(allowed)
+            path = self._path(name, '_embeddings.npy')
+            vectors = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+            if vectors is None or len(vectors) != index.ntotal:
+                vectors = reconstruct_vectors(index)
+            order = [int(ids[i]) for i in mmr_order(np.asarray(vectors[ids], dtype='float32'),
+                                                    max(count, DIVERSE_MAX))]
+            with self._lock:
+                self._diverse[key] = (order, len(ids))
+        return order[:count]
+
+    def diverse_chunks(self, unit, count: int = DIVERSE_MAX) -> List[str]:
+        _, id2chunk = self._get_loaded(self._resolve(unit)[0])
+        return [id2chunk[i] for i in self._diverse_ids(unit, count)]
+
+    def _get_sentences(self, name: str) -> Optional[SentenceIndex]:
+        # None for indexes built without a sentence side index
+        with self._lock:
+            sentences = self._sentences.get(name)
+        if sentences is None:
+            prefix = self._path(name, '')
+            if not SentenceIndex.exists(prefix):
+                return None
+            sentences = SentenceIndex.load(prefix)
+            with self._lock:
+                if name in self.indexes:
+                    self._sentences[name] = sentences
+                    self._loaded_bytes[name] = self._loaded_bytes.get(name, 0) + sentences.nbytes
+        return sentences
+
+    def candidate_facts(self, unit, count: int, start: int = 0, num_distractors: int = 3) -> List[Dict]:
+        # Precomputed quiz facts of a unit, taken in its coverage order from position
+        # `start`: {'sentence', 'answer' (its key term), 'distractors', 'chunk_id'}.
+        # Empty if the index has no sentence side index (build_index --no-sentences).
+        name, _ = self._resolve(unit)
+        order = self._diverse_ids(unit)
+        sentences = self._get_sentences(name)
+        if sentences is None:
+            return []
+        return sentences.facts(order, count, start, num_distractors)
+
+    def _dense_search(self, index, selector, queries: List[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        query_embs = self.embed_queries(queries)
+        with stage("faiss_search"):
+            if selector is None:
+                return index.search(query_embs, top_k)
+            params = search_params_for(index, selector, self.nprobe, self.ef_search)
+            return index.search(query_embs, top_k, params=params)
+
+    def search(self, unit, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        return self.search_many(unit, [query], top_k)[0]
+
+    def hybrid_search(self, unit, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        return self.hybrid_search_many(unit, [query], top_k)[0]
+
+    def hybrid_search_many(self, unit, queries: List[str], top_k: int = 3,
+                           candidates: int = HYBRID_CANDIDATES) -> List[List[Tuple[str, float]]]:
+        # Dense + BM25 candidates fused by reciprocal rank, optionally re-ranked by the
+        # cross-encoder. Scores are higher-is-better (RRF or cross-encoder), unlike the
+        # L2 distances from search_many.
+        if not queries:
+            return []
+        start = time.perf_counter()
+        name, selector = self._resolve(unit)
+        index, id2chunk = self._get_loaded(name)
+        bm25 = self._get_bm25(name, id2chunk)
+        allowed = self._allowed_ids(unit, selector, bm25.n_docs)
+        _, dense = self._dense_search(index, selector, queries, max(candidates, top_k))
+        all_results = []
+        for row, query in enumerate(queries):
+            with stage("bm25"):
+                lexical, _ = bm25.search(query, max(candidates, top_k), allowed)
+            fused = reciprocal_rank_fusion([[int(i) for i in dense[row] if i != -1], lexical.tolist()])
+            if self.rerank_model:
+                deadline = start + self.hybrid_budget_ms * (row + 1) / 1000
+                fused = self._rerank(query, fused, id2chunk, deadline)
+            all_results.append([(id2chunk[i], float(score)) for i, score in fused[:top_k]])
+        return all_results
+
+    def _rerank(self, query: str, fused: List[Tuple[int, float]], id2chunk,
+                deadline: float) -> List[Tuple[int, float]]:
+        # Re-rank as many of the top fused candidates as the remaining budget allows,
+        # using a running per-pair cost estimate; the rest keep their fused order
+        model = get_reranker(self.rerank_model)
+        n = min(RERANK_TOP_N, len(fused))
+        if self._rerank_pair_ms is not None:
+            n = min(n, int((deadline - time.perf_counter()) * 1000 / self._rerank_pair_ms))
+        if n < 2:
+            return fused
+        start = time.perf_counter()
+        with stage("rerank"):
+            scores = model.predict([(query, id2chunk[i]) for i, _ in fused[:n]], show_progress_bar=False)
+        pair_ms = (time.perf_counter() - start) * 1000 / n
+        self._rerank_pair_ms = pair_ms if self._rerank_pair_ms is None else 0.8 * self._rerank_pair_ms + 0.2 * pair_ms
+        reranked = sorted(((i, float(score)) for (i, _), score in zip(fused[:n], scores)), key=lambda item: -item[1])
+        return reranked + fused[n:]
 
-    def search(self, unit: str, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
-        if unit not in self.indexes:
-            self.load_chapter(unit)
-        index, id2chunk = self.indexes[unit]
-        query_emb = self.embed_chunks([query])
-        D, I = index.search(query_emb, top_k)
-        results = []
-        for j, i in enumerate(I[0]):
-            if i == -1:
-                continue  # skip invalid results
-            results.append((id2chunk[i], float(D[0][j])))
-        return results 
\ No newline at end of file
+    def search_many(self, unit, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        # One encoder pass and one index.search call for the whole batch of queries.
+        # `unit` may be a unit name, a list of units or FULL_BOOK when a shared index is used.
+        if not queries:
+            return []
+        name, selector = self._resolve(unit)
+        index, id2chunk = self._get_loaded(name)
+        D, I = self._dense_search(index, selector, queries, top_k)
+        all_results = []
+        for row in range(len(queries)):
+            results = []
+            for j, i in enumerate(I[row]):
+                if i == -1:
+                    continue  # skip invalid results
+                results.append((id2chunk[i], float(D[row][j])))
+            all_results.append(results)
+        return all_results
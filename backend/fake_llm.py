@@ -0,0 +1,214 @@
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Dict, Iterator, Optional
+
+# Offline stand-in for the Together client: same `client.chat.completions.create(...)`
+# shape, canned answers and an injected per-call latency, so TogetherRAG can be
+# exercised and benchmarked without network access or an API key.
+
+
+def _fake_mcq(n: int, topic: str = "") -> str:
+    return (
+        f"Question: Which statement about {topic or f'sample topic {n}'} is correct?\n"
+        f"A) Statement {n}a\nB) Statement {n}b\nC) Statement {n}c\nD) Statement {n}d\n"
+        f"Answer: {'ABCD'[n % 4]}\n"
+        f"Explanation: Statement {n}{'abcd'[n % 4]} follows from the context."
+    )
+
+
+def _requested_mcqs(prompt: str) -> int:
+    match = re.search(r"generate (\d+) different multiple-choice questions", prompt)
+    if match:
+        return int(match.group(1))
+    if "multiple-choice question" in prompt:
+        return 1
+    return 0
+
+
+class FakeRateLimitError(Exception):
+    # Shaped like together.RateLimitError: a 429 status and the response's Retry-After
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.3f}s")
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": f"{retry_after:.3f}"})
+
+
+# Distinct questions the fake can ask about one context passage
+QUESTIONS_PER_PASSAGE = 3
+
+
+def _topics(prompt: str, count: int, rng: random.Random) -> List[str]:
+    # Like a real model, base question i on the context it was given: a few words of
+    # the i-th passage, chosen from a handful of spots, so contexts that repeat soon
+    # give repeated questions
+    match = re.search(r"Context:\n(.*?)\n\nFormat each question", prompt, re.S)
+    passages = [p.split() for p in match.group(1).split("\n\n") if p.strip()] if match else []
+    if not passages:
+        return [""] * count
+    topics = []
+    for i in range(count):
+        words = passages[i % len(passages)]
+        start = 6 * (i // len(passages) + rng.randrange(QUESTIONS_PER_PASSAGE))
+        topics.append(" ".join(words[start:start + 6]))
+    return topics
+
+
+class _Completions:
+    def __init__(self, owner: "FakeLLMClient"):
+        self._owner = owner
+
+    def create(self, model: str, messages: List[Dict], **kwargs):
+        return self._owner._respond(model, messages, **kwargs)
+
+
+class FakeLLMClient:
+    def __init__(self, latency: float = 0.5, malformed_rate: float = 0.0, seed: Optional[int] = None,
+                 token_latency: float = 0.0, completion_words: int = 0, rate_limit: float = 0.0,
+                 rate_limit_burst: int = 1):
+        # With stream=True, `latency` is the time to the first token and each further
+        # word-sized delta takes `token_latency`. With `rate_limit` (requests/sec) calls
+        # beyond the limit fail with a 429 and a Retry-After, like the real API.
+        self.latency = latency
+        self.token_latency = token_latency
+        self.completion_words = completion_words
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self.rate_limit = rate_limit
+        self.rate_limit_burst = max(1, rate_limit_burst)
+        self.rejected = 0
+        self._allowance = float(self.rate_limit_burst)
+        self._checked = time.monotonic()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self.calls += 1
+            return self.calls
+
+    def _admit(self) -> Optional[float]:
+        # None if the call is within the rate limit, else the seconds until it would be
+        if not self.rate_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate_limit_burst, self._allowance + (now - self._checked) * self.rate_limit)
+            self._checked = now
+            if self._allowance >= 1:
+                self._allowance -= 1
+                return None
+            self.rejected += 1
+            return (1 - self._allowance) / self.rate_limit
+
+    def _malformed(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.malformed_rate
+
+    def _content(self, call_id: int, prompt: str) -> str:
+        count = _requested_mcqs(prompt)
+        if count:
+            blocks = []
+            with self._lock:
+                topics = _topics(prompt, count, self._rng)
+            for i, topic in enumerate(topics):
+                if self._malformed():
+                    blocks.append("Question: ???\nA) only one option")
+                else:
+                    blocks.append(_fake_mcq(call_id * 100 + i, topic))
+            return "\n\n".join(blocks)
+        filler = "".join(f" word{i}" for i in range(self.completion_words))
+        return f"Fake completion #{call_id} for a {len(prompt)}-character prompt.{filler}"
+
+    def _respond(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        wait = self._admit()
+        if wait is not None:
+            raise FakeRateLimitError(wait)
+        call_id = self._next_id()
+        content = self._content(call_id, messages[-1]["content"])
+        if stream:
+            return self._stream(model, content)
+        if self.latency:
+            time.sleep(self.latency)
+        time.sleep(self.token_latency * len(content.split()))
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message)])
+
+    def _stream(self, model: str, content: str) -> Iterator:
+        if self.latency:
+            time.sleep(self.latency)
+        for i, word in enumerate(re.findall(r"\S+\s*", content)):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            delta = SimpleNamespace(role="assistant", content=word)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta)])
+
+
+def create_fake_llm_app(latency: float = 0.5, token_latency: float = 0.0, completion_words: int = 0,
+                        malformed_rate: float = 0.0, seed: Optional[int] = None, rate_limit: float = 0.0,
+                        rate_limit_burst: int = 1):
+    # OpenAI/Together-compatible HTTP endpoint (POST /v1/chat/completions, optional SSE
+    # streaming) for load tests: point TOGETHER_BASE_URL at http://host:port/v1
+    import asyncio
+    import json
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    fake = FakeLLMClient(latency=latency, token_latency=token_latency, completion_words=completion_words,
+                         malformed_rate=malformed_rate, seed=seed, rate_limit=rate_limit,
+                         rate_limit_burst=rate_limit_burst)
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        wait = fake._admit()
+        if wait is not None:
+            return JSONResponse({"error": {"message": "rate limit exceeded", "type": "rate_limit"}},
+                                status_code=429, headers={"retry-after": f"{wait:.3f}"})
+        call_id = fake._next_id()
+        prompt = body["messages"][-1]["content"]
+        content = fake._content(call_id, prompt)
+        base = {"id": f"fake-{call_id}", "created": int(time.time()), "model": body.get("model", "fake")}
+        if not body.get("stream"):
+            await asyncio.sleep(fake.latency + fake.token_latency * len(content.split()))
+            return {**base, "object": "chat.completion",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(content.split()),
+                              "total_tokens": len(prompt.split()) + len(content.split())}}
+
+        async def events():
+            await asyncio.sleep(fake.latency)
+            for i, word in enumerate(re.findall(r"\S+\s*", content)):
+                if i and fake.token_latency:
+                    await asyncio.sleep(fake.token_latency)
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "finish_reason": None, "delta": {"content": word}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve a fake chat-completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--completion-words", type=int, default=200)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/sec before answering 429")
+    parser.add_argument("--rate-limit-burst", type=int, default=1)
+    args = parser.parse_args()
+    uvicorn.run(create_fake_llm_app(args.latency, args.token_latency, args.completion_words, args.malformed_rate,
+                                    rate_limit=args.rate_limit, rate_limit_burst=args.rate_limit_burst),
+                host=args.host, port=args.port, log_level="warning")
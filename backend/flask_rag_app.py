@@ -1,16 +1,22 @@
 from flask import Flask, render_template_string, request, redirect, url_for, session
-from faiss_store import ChapterFaissStore
-from together_rag import TogetherRAG
+from embedding_server import make_faiss_store
+from together_rag import TogetherRAG, open_response_cache
+from answer_keys import open_quiz_store
+from chapter_registry import ChapterRegistry
+from metrics import instrument_flask
 import os
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "supersecretkey")
 
-# Available chapters (based on your faiss_indexes)
-CHAPTERS = ["Full Book", "UNIT 1"]
-
-faiss_store = ChapterFaissStore(index_dir="../faiss_indexes")
-rag = TogetherRAG(faiss_store)
+faiss_store = make_faiss_store("../faiss_indexes")
+rag = TogetherRAG(faiss_store, cache=open_response_cache())
+# Available chapters, discovered from faiss_indexes; hot ones load in the background
+registry = ChapterRegistry(faiss_store, "../faiss_indexes")
+registry.prewarm()
+# Quizzes live server-side; the quiz form only carries the quiz id
+quiz_store = open_quiz_store()
+instrument_flask(app, rag, quiz_store, registry)
 
 TEMPLATE_INDEX = '''
 <!doctype html>
@@ -115,8 +121,7 @@ TEMPLATE_MCQ = '''
 <div class="container shadow p-4 bg-white rounded">
   <h2 class="mb-4">MCQ Quiz - {{chapter}}</h2>
   <form method="post" action="/mcq_submit" onsubmit="showLoader()">
-    <input type="hidden" name="chapter" value="{{chapter}}">
-    <input type="hidden" name="num_mcqs" value="{{mcqs|length}}">
+    <input type="hidden" name="quiz_id" value="{{quiz_id}}">
     {% for mcq in mcqs %}
       {% set qidx = loop.index0 %}
       <div class="mb-4">
@@ -172,7 +177,7 @@ TEMPLATE_RESULT = '''
 
 @app.route("/", methods=["GET"])
 def index():
-    return render_template_string(TEMPLATE_INDEX, chapters=CHAPTERS)
+    return render_template_string(TEMPLATE_INDEX, chapters=registry.chapters())
 
 @app.route("/select", methods=["POST"])
 def select():
@@ -195,28 +200,21 @@ def mcq():
     chapter = request.form["chapter"]
     num_mcqs = int(request.form.get("num_mcqs", 3))
     mcqs = rag.generate_mcq(chapter, num_mcqs=num_mcqs, num_options=4)
-    session["mcqs"] = mcqs
-    session["chapter"] = chapter
-    return render_template_string(TEMPLATE_MCQ, chapter=chapter, mcqs=mcqs)
+    quiz_id = quiz_store.create(chapter, mcqs)
+    return render_template_string(TEMPLATE_MCQ, chapter=chapter, mcqs=mcqs, quiz_id=quiz_id)
 
 @app.route("/mcq_submit", methods=["POST"])
 def mcq_submit():
-    chapter = session.get("chapter")
-    mcqs = session.get("mcqs")
-    num_mcqs = int(request.form.get("num_mcqs", len(mcqs)))
-    user_answers = []
-    explanations = []
-    score = 0
-    for i in range(num_mcqs):
-        ans_idx = int(request.form.get(f"q{i}"))
-        user_ans = mcqs[i]["options"][ans_idx]
-        user_answers.append(user_ans)
-        if user_ans == mcqs[i]["correct"]:
-            explanations.append("")
-            score += 1
-        else:
-            explain = rag.explain_answer(chapter, mcqs[i]["question"], user_ans, mcqs[i]["correct"])
-            explanations.append(explain)
+    quiz = quiz_store.get(request.form.get("quiz_id", ""))
+    if quiz is None:
+        # Expired or unknown quiz
+        return redirect(url_for("index"))
+    chapter, mcqs = quiz["chapter"], quiz["mcqs"]
+    answers = [int(request.form.get(f"q{i}", -1)) for i in range(len(mcqs))]
+    results = rag.grade_quiz(chapter, mcqs, answers)
+    user_answers = [r["user_answer"] for r in results]
+    explanations = [r["explanation"] for r in results]
+    score = sum(r["is_correct"] for r in results)
     return render_template_string(TEMPLATE_RESULT, chapter=chapter, mcqs=mcqs, user_answers=user_answers, explanations=explanations, score=score)
 
 if __name__ == "__main__":
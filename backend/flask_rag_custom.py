@@ -1,18 +1,32 @@
-from flask import Flask, render_template, request, jsonify
-from faiss_store import ChapterFaissStore
-from together_rag import TogetherRAG
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from embedding_server import make_faiss_store
+from together_rag import TogetherRAG, open_response_cache
+from answer_keys import open_quiz_store, parse_answers, public_mcqs
+from chapter_registry import ChapterRegistry
+from metrics import instrument_flask
 import os
+import json
 
 app = Flask(__name__)
 
 FAISS_INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../faiss_indexes'))
-faiss_store = ChapterFaissStore(index_dir=FAISS_INDEX_DIR)
-rag = TogetherRAG(faiss_store)
-CHAPTERS = ["Full Book", "UNIT 1"]
+faiss_store = make_faiss_store(FAISS_INDEX_DIR)
+rag = TogetherRAG(faiss_store, cache=open_response_cache())
+# Chapters come from the index directory; hot ones load in the background now
+registry = ChapterRegistry(faiss_store, FAISS_INDEX_DIR)
+registry.prewarm()
+
+quiz_store = open_quiz_store()
+# /metrics, plus per-request stage timings and JSON request logs with METRICS=1
+instrument_flask(app, rag, quiz_store, registry)
 
 @app.route("/")
 def index():
-    return render_template("rag_ui.html", chapters=CHAPTERS)
+    return render_template("rag_ui.html", chapters=registry.chapters())
+
+@app.route("/chapters", methods=["GET"])
+def chapters():
+    return jsonify({"chapters": registry.info()})
 
 @app.route("/generate_notes", methods=["POST"])
 def generate_notes():
@@ -23,41 +37,53 @@ def generate_notes():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+def sse_response(deltas):
+    # Server-sent events: one `data:` line per completion delta, then a `done` event
+    def events():
+        try:
+            for delta in deltas:
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/stream_notes", methods=["GET"])
+def stream_notes():
+    chapter = request.args.get("chapter")
+    return sse_response(rag.stream_chapter_notes(chapter))
+
+@app.route("/stream_explanation", methods=["GET"])
+def stream_explanation():
+    args = request.args
+    return sse_response(rag.stream_explanation(args.get("chapter"), args.get("question"),
+                                               args.get("user_answer"), args.get("correct_answer")))
+
 @app.route("/generate_mcqs", methods=["POST"])
 def generate_mcqs():
     chapter = request.json.get("chapter")
     num_mcqs = int(request.json.get("num_mcqs", 3))
     try:
         mcqs = rag.generate_mcq(chapter, num_mcqs=num_mcqs, num_options=4)
-        # Don't send correct answers to the frontend!
-        for mcq in mcqs:
-            mcq.pop("correct")
-            mcq.pop("correct_letter")
-            mcq.pop("explanation")
-        return jsonify({"success": True, "mcqs": mcqs})
+        # Answer keys stay on the server; the client only gets the quiz id
+        quiz_id = quiz_store.create(chapter, mcqs)
+        return jsonify({"success": True, "quiz_id": quiz_id, "mcqs": public_mcqs(mcqs)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 @app.route("/check_mcqs", methods=["POST"])
 def check_mcqs():
-    chapter = request.json.get("chapter")
     user_answers = request.json.get("user_answers")
-    mcqs = request.json.get("mcqs")
-    results = []
-    for i, mcq in enumerate(mcqs):
-        correct = rag.generate_mcq(chapter, num_mcqs=1, num_options=4)[0]["options"].index(mcq["correct"])
-        is_correct = user_answers[i] == correct
-        explanation = ""
-        if not is_correct:
-            explanation = rag.explain_answer(chapter, mcq["question"], mcq["options"][user_answers[i]], mcq["correct"])
-        results.append({
-            "question": mcq["question"],
-            "user_answer": mcq["options"][user_answers[i]],
-            "correct_answer": mcq["correct"],
-            "is_correct": is_correct,
-            "explanation": explanation
-        })
-    return jsonify({"results": results})
+    quiz = quiz_store.get(request.json.get("quiz_id") or "")
+    if quiz is None:
+        return jsonify({"success": False, "error": "Quiz expired, please start a new one."})
+    try:
+        answers = parse_answers(user_answers, len(quiz["mcqs"]))
+        results = rag.grade_quiz(quiz["chapter"], quiz["mcqs"], answers)
+        return jsonify({"results": results})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
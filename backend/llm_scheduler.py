@@ -0,0 +1,238 @@
+import contextvars
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Iterator, Optional
+import metrics
+
+# Every LLM call from TogetherRAG goes through one LLMScheduler:
+#   - singleflight: concurrent identical requests (same coalescing key) share one call,
+#     or one upstream stream whose deltas are replayed to every subscriber
+#   - priority: a fixed pool of LLM_MAX_CONCURRENCY workers takes queued calls
+#     interactive-first, so explanations overtake MCQ bank pre-generation
+#   - token bucket: at most LLM_RATE_PER_MINUTE calls/min (bursts of LLM_BURST); a 429
+#     pauses the bucket for its Retry-After (or the backoff), holding back all callers
+#   - retries: 429/5xx/timeouts retried up to LLM_MAX_RETRIES times with full-jitter
+#     exponential backoff; a stream is only retried before its first delta
+
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "0"))  # 0: no client-side limit
+LLM_BURST = int(os.getenv("LLM_BURST", "5"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError")
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0  # a user is waiting on this call: explanations
+PRIORITY_DEFAULT = 1      # notes, quiz MCQs generated on demand
+PRIORITY_BULK = 2         # MCQ bank pre-generation
+
+class TokenBucket:
+    # `rate` tokens/sec up to `burst`; rate <= 0 turns limiting off, but pause() still
+    # applies. Tokens are reserved in call order, so waiters are served FIFO.
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # Take a token; returns the seconds to wait before using it
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate <= 0:
+                return wait
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def error_status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: BaseException) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, (ConnectionError, TimeoutError))
+
+class SharedStream:
+    # Deltas of one upstream stream, replayed from the start to each subscriber
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def append(self, delta: str):
+        with self._cond:
+            self.parts.append(delta)
+            self._cond.notify_all()
+
+    def set_result(self, _=None):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def set_exception(self, error: BaseException):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[str]:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.parts) and not self.done:
+                    self._cond.wait()
+                parts = self.parts[i:]
+                done, error = self.done, self.error
+            i += len(parts)
+            yield from parts
+            if done and i >= len(self.parts):
+                if error is not None:
+                    raise error
+                return
+
+class LLMScheduler:
+    def __init__(self, rate_per_minute: float = LLM_RATE_PER_MINUTE, burst: int = LLM_BURST,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY,
+                 seed: Optional[int] = None):
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._inflight = {}  # coalescing key -> Future or SharedStream
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def run(self, key: Optional[Hashable], call: Callable[[], Any], priority: int = PRIORITY_DEFAULT) -> Any:
+        # `call` makes one attempt; callers with the same non-None key share its result
+        return self._submit(key, priority, call, Future).result()
+
+    def stream(self, key: Optional[Hashable], produce: Callable[[Callable[[str], None]], None],
+               priority: int = PRIORITY_DEFAULT) -> Iterator[str]:
+        # `produce(emit)` opens the upstream stream and emits each delta
+        shared = self._submit(key, priority, produce, SharedStream)
+        return iter(shared)
+
+    def _submit(self, key, priority, fn, make_handle):
+        with self._lock:
+            handle = self._inflight.get(key) if key is not None else None
+            if handle is not None:
+                self.coalesced += 1
+                metrics.inc("llm_coalesced_total")
+                return handle
+            handle = make_handle()
+            if key is not None:
+                self._inflight[key] = handle
+            while len(self._workers) < self.max_concurrency:
+                worker = threading.Thread(target=self._work, name=f"llm-{len(self._workers)}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        # Run in the submitter's context so stage timings reach its request trace
+        context = contextvars.copy_context()
+        self._queue.put((priority, next(self._seq), time.perf_counter(), key, fn, handle, context))
+        return handle
+
+    def _work(self):
+        while True:
+            priority, _, queued, key, fn, handle, context = self._queue.get()
+            metrics.observe("llm_queue_seconds", time.perf_counter() - queued, priority=priority)
+            try:
+                if isinstance(handle, SharedStream):
+                    context.run(self._attempt, lambda: fn(handle.append), handle)
+                    handle.set_result()
+                elif handle.set_running_or_notify_cancel():
+                    handle.set_result(context.run(self._attempt, fn, handle))
+            except BaseException as e:
+                handle.set_exception(e)
+            finally:
+                with self._lock:
+                    if key is not None and self._inflight.get(key) is handle:
+                        del self._inflight[key]
+
+    def _attempt(self, fn: Callable[[], Any], handle) -> Any:
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.count_call()
+            try:
+                return fn()
+            except Exception as e:
+                started = isinstance(handle, SharedStream) and handle.parts
+                delay = None if started or attempt >= self.max_retries else self.backoff(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                if delay > 0:
+                    time.sleep(delay)
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def backoff(self, error: BaseException, attempt: int) -> Optional[float]:
+        # Seconds to sleep before retry `attempt + 1`, or None if `error` is not retryable.
+        # A 429 also pauses the shared bucket for its Retry-After, holding back every
+        # caller; the jitter on top keeps the callers it held from retrying in lockstep.
+        if not is_retryable(error):
+            return None
+        with self._lock:
+            jitter = self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        rate_limited = error_status(error) == 429
+        with self._lock:
+            self.retries += 1
+            self.rate_limited += rate_limited
+        metrics.inc("llm_retries_total", reason="rate_limit" if rate_limited else "error")
+        wait = retry_after(error)
+        if rate_limited:
+            self.bucket.pause(wait if wait is not None else jitter)
+            return jitter if wait is not None else 0.0
+        return wait if wait is not None else jitter
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "retries": self.retries,
+                    "rate_limited": self.rate_limited, "inflight": len(self._inflight),
+                    "queued": self._queue.qsize()}
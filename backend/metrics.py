@@ -0,0 +1,270 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional, Tuple
+
+# In-process metrics and per-request tracing, no dependencies:
+#   with stage("embed"): ...       learn_medico_stage_seconds{stage="embed"} histogram, plus
+#                                  the request's own breakdown when a trace is active
+#   inc("mcq_parsed_total", n)     counter
+#   add_collector("query_cache", store.query_cache.stats)   gauges read at scrape time
+#   render()                       Prometheus text format, served on /metrics
+# Each traced request also logs one JSON line (route, status, ms, per-stage ms, tokens)
+# on the "learn_medico.trace" logger.
+#
+# Off unless METRICS=1: stage() then hands back a shared no-op context manager and
+# inc()/observe() return at once, so instrumented hot paths cost one flag check.
+
+METRICS_ENABLED = os.getenv("METRICS", "0") == "1"
+METRICS_PREFIX = "learn_medico_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a cached embedding lookup up to a long LLM completion
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+trace_logger = logging.getLogger("learn_medico.trace")
+_NOOP = nullcontext()
+_trace = contextvars.ContextVar("learn_medico_trace", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], list] = {}  # bucket counts..., +Inf, sum
+        self._collectors: Dict[str, Callable[[], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float, labels: Labels):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels):
+        with self._lock:
+            counts = self._histograms.get((name, labels))
+            if counts is None:
+                counts = self._histograms[(name, labels)] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-2] += 1
+            counts[-1] += value
+
+    def add_collector(self, name: str, collect: Callable[[], Dict]):
+        # One collector per name; re-adding replaces it
+        self._collectors[name] = collect
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(counts)) for key, counts in self._histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} counter")
+                typed.add(name)
+            lines.append(f"{METRICS_PREFIX}{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), counts in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{METRICS_PREFIX}{name}_sum{_format_labels(labels)} {counts[-1]:.6f}")
+            lines.append(f"{METRICS_PREFIX}{name}_count{_format_labels(labels)} {cumulative}")
+        for name, collect in list(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                lines.append(f"# {name}: collector failed: {e}")
+                continue
+            values = {key: value for key, value in values.items() if isinstance(value, (int, float))}
+            if "hits" in values and "misses" in values:
+                lookups = values["hits"] + values["misses"]
+                values["hit_ratio"] = values["hits"] / lookups if lookups else 0.0
+            for key, value in sorted(values.items()):
+                lines.append(f"# TYPE {METRICS_PREFIX}{name}_{key} gauge")
+                lines.append(f"{METRICS_PREFIX}{name}_{key} {value:g}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+REGISTRY = MetricsRegistry()
+
+def enable(flag: bool = True):
+    # For benchmarks and tools; servers use METRICS=1
+    global METRICS_ENABLED
+    METRICS_ENABLED = flag
+
+def inc(name: str, value: float = 1, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.inc(name, value, tuple(sorted(labels.items())))
+
+def observe(name: str, value: float, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.observe(name, value, tuple(sorted(labels.items())))
+
+def add_collector(name: str, collect: Callable[[], Dict]):
+    REGISTRY.add_collector(name, collect)
+
+def render() -> str:
+    if not METRICS_ENABLED:
+        return "# metrics disabled; start the server with METRICS=1\n"
+    return REGISTRY.render()
+
+def record_stage(name: str, seconds: float, **labels):
+    # Time spent outside a `with stage(...)` block, e.g. a streamed completion
+    if not METRICS_ENABLED:
+        return
+    REGISTRY.observe("stage_seconds", seconds, tuple(sorted(labels.items())) + (("stage", name),))
+    trace = _trace.get()
+    if trace is not None:
+        trace["stages"][name] = trace["stages"].get(name, 0.0) + seconds
+
+def trace_count(key: str, value: float):
+    # Add to a per-request total (e.g. tokens) reported in the request's log line
+    trace = _trace.get() if METRICS_ENABLED else None
+    if trace is not None:
+        trace["counts"][key] = trace["counts"].get(key, 0) + value
+
+class _Stage:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: Dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+def stage(name: str, **labels):
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Stage(name, labels)
+
+def start_trace() -> Optional[contextvars.Token]:
+    if not METRICS_ENABLED:
+        return None
+    return _trace.set({"start": time.perf_counter(), "stages": {}, "counts": {}})
+
+def finish_trace(token: Optional[contextvars.Token], route: str, status: int):
+    if token is None:
+        return
+    trace = _trace.get()
+    _trace.reset(token)
+    seconds = time.perf_counter() - trace["start"]
+    REGISTRY.observe("request_seconds", seconds, (("route", route), ("status", str(status))))
+    if trace_logger.isEnabledFor(logging.INFO):
+        trace_logger.info(json.dumps({
+            "event": "request", "route": route, "status": status, "ms": round(seconds * 1000, 2),
+            "stages_ms": {name: round(s * 1000, 2) for name, s in trace["stages"].items()},
+            **trace["counts"],
+        }))
+
+def _ensure_trace_logging():
+    # Structured request logs go to stderr unless the app configured logging itself
+    if not trace_logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+
+def watch(rag=None, quiz_store=None, registry=None):
+    # Cache hit ratios and sizes, LLM queue state, read at scrape time
+    if rag is not None and rag.cache is not None:
+        add_collector("response_cache", rag.cache.stats)
+    query_cache = getattr(getattr(rag, "faiss_store", None), "query_cache", None)
+    if query_cache is not None:
+        add_collector("query_cache", query_cache.stats)
+    scheduler = getattr(rag, "scheduler", None)
+    if scheduler is not None:
+        add_collector("llm_scheduler", scheduler.stats)
+    if quiz_store is not None:
+        add_collector("quiz_store", quiz_store.stats)
+    if registry is not None:
+        add_collector("chapters", registry.stats)
+
+def instrument_flask(app, rag=None, quiz_store=None, registry=None):
+    from flask import Response, g, request
+    from flask.signals import before_render_template, template_rendered
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), mimetype=CONTENT_TYPE)
+
+    if not METRICS_ENABLED:
+        return app
+    _ensure_trace_logging()
+    watch(rag, quiz_store, registry)
+
+    @app.before_request
+    def _start_trace():
+        g.metrics_trace = start_trace()
+
+    @app.after_request
+    def _finish_trace(response):
+        # Streamed (SSE) bodies are still being produced here, so their time is not included
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        finish_trace(g.pop("metrics_trace", None), route, response.status_code)
+        return response
+
+    def _render_start(sender, **extra):
+        g.metrics_render = time.perf_counter()
+
+    def _render_end(sender, **extra):
+        start = g.pop("metrics_render", None)
+        if start is not None:
+            record_stage("render", time.perf_counter() - start)
+
+    before_render_template.connect(_render_start, app, weak=False)
+    template_rendered.connect(_render_end, app, weak=False)
+    return app
+
+def instrument_asgi(app, rag=None, quiz_store=None, registry=None):
+    from fastapi.responses import PlainTextResponse
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+
+    if not METRICS_ENABLED:
+        return app
+    _ensure_trace_logging()
+    watch(rag, quiz_store, registry)
+
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        token = start_trace()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            finish_trace(token, route.path if route is not None else "unmatched", status)
+    return app
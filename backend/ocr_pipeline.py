@@ -1,8 +1,76 @@
 import os
-from pdf2image import convert_from_path
+import hashlib
+import time
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from pdf2image import convert_from_path, pdfinfo_from_path
+import numpy as np
 import pytesseract
 from paddleocr import PaddleOCR
-from typing import List
+from PIL import Image
+from typing import Dict, List, Iterator, Optional, Tuple
+from disk_cache import DiskCache
+
+OCR_METHODS = ("pytesseract", "paddle", "adaptive")
+
+# Pages rendered per convert_from_path call in the streaming pipeline
+RENDER_BATCH_PAGES = 4
+DEFAULT_DPI = 200
+
+# Adaptive OCR: tesseract on preprocessed pages (grayscale, deskewed, Otsu-binarized,
+# at OCR_DPI), then PaddleOCR only for text blocks whose mean word confidence is
+# below REGION_MIN_CONFIDENCE. A page goes to Paddle whole when most of its text is
+# low-confidence, or when tesseract finds no words on a page with ink (figures,
+# equations). Regions from many pages go to one warm Paddle process in batches.
+OCR_DPI = 300
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.25
+SKEW_ESTIMATE_WIDTH = 800  # deskew angle is estimated on a page downscaled to this width
+# Untuned starting points; `benchmarks/bench_ocr.py --mode compare` sweeps both and
+# reports pages/sec and word accuracy per setting. PAGE_FALLBACK_FRACTION is the
+# share of a page's characters in low-confidence blocks that sends it to Paddle whole.
+REGION_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))
+PAGE_FALLBACK_FRACTION = float(os.getenv("OCR_PAGE_FALLBACK", "0.5"))
+PAGE_MIN_INK = 0.01  # share of dark pixels that makes a wordless page worth a second look
+OTSU_FALLBACK_THRESHOLD = 128  # binarization threshold of pages with a single grey level
+REGION_PADDING = 8
+PADDLE_BATCH_REGIONS = 16
+PADDLE_WINDOW_PAGES = 8  # pages held back waiting for a fuller Paddle batch
+
+# Engine settings are part of the OCR cache key, so changing them invalidates old text
+OCR_CACHE_PATH = os.path.join("ocr_cache", "ocr_cache.sqlite")
+OCR_CACHE_MAX_BYTES = 512 * 1024 * 1024
+PADDLE_SETTINGS = "paddle:lang=en:angle_cls=1"
+TESSERACT_CONFIG = ""
+
+def open_ocr_cache(path: str = OCR_CACHE_PATH, max_bytes: int = OCR_CACHE_MAX_BYTES) -> DiskCache:
+    return DiskCache(path, max_bytes=max_bytes)
+
+@lru_cache(maxsize=None)
+def _engine_settings(method: str) -> str:
+    if method == "paddle":
+        return PADDLE_SETTINGS
+    tesseract = f"pytesseract:{pytesseract.get_tesseract_version()}:{TESSERACT_CONFIG}"
+    if method == "adaptive":
+        return (f"adaptive:dpi={OCR_DPI}:conf={REGION_MIN_CONFIDENCE}:page={PAGE_FALLBACK_FRACTION}:"
+                f"{tesseract}:{PADDLE_SETTINGS}")
+    return tesseract
+
+# Cache key for a page: hash of the image content plus the engine and its settings
+def ocr_cache_key(image, method: str) -> str:
+    digest = hashlib.sha256()
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            digest.update(f.read())
+    elif isinstance(image, np.ndarray):
+        digest.update(str((image.shape, image.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(image).tobytes())
+    else:
+        digest.update(str((image.mode, image.size)).encode())
+        digest.update(image.tobytes())
+    digest.update(_engine_settings(method).encode())
+    return digest.hexdigest()
 
 # Convert PDF to images
 def pdf_to_images(pdf_path: str, output_folder: str = "temp_images") -> List[str]:
@@ -16,26 +84,411 @@ def pdf_to_images(pdf_path: str, output_folder: str = "temp_images") -> List[str
         image_paths.append(img_path)
     return image_paths
 
-# OCR using pytesseract
-def ocr_image_pytesseract(image_path: str) -> str:
-    return pytesseract.image_to_string(image_path)
+# Render PDF pages lazily, a few at a time, instead of the whole document at once
+def iter_pdf_pages(pdf_path: str, dpi: int = DEFAULT_DPI, batch_pages: int = RENDER_BATCH_PAGES,
+                   output_folder: Optional[str] = None, max_pages: Optional[int] = None) -> Iterator:
+    num_pages = pdfinfo_from_path(pdf_path)["Pages"]
+    if max_pages is not None:
+        num_pages = min(num_pages, max_pages)
+    if output_folder and not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    for first in range(1, num_pages + 1, batch_pages):
+        last = min(first + batch_pages - 1, num_pages)
+        for offset, img in enumerate(convert_from_path(pdf_path, dpi=dpi, first_page=first, last_page=last)):
+            if output_folder:
+                img.save(os.path.join(output_folder, f"page_{first + offset}.png"), "PNG")
+            yield img
+
+# OCR using pytesseract (accepts a file path or a PIL image)
+def ocr_image_pytesseract(image_path, cache: Optional[DiskCache] = None) -> str:
+    key = None
+    if cache is not None:
+        key = ocr_cache_key(image_path, "pytesseract")
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    text = pytesseract.image_to_string(image_path, config=TESSERACT_CONFIG)
+    if cache is not None:
+        cache.set(key, text)
+    return text
 
-# OCR using PaddleOCR
-def ocr_image_paddle(image_path: str, ocr=None) -> str:
+# OCR using PaddleOCR (accepts a file path, PIL image or numpy array).
+# On a cache hit the PaddleOCR model is never constructed.
+def ocr_image_paddle(image_path, ocr=None, cache: Optional[DiskCache] = None) -> str:
+    key = None
+    if cache is not None:
+        key = ocr_cache_key(image_path, "paddle")
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     if ocr is None:
         ocr = PaddleOCR(use_angle_cls=True, lang='en')
+    if not isinstance(image_path, (str, np.ndarray)):
+        image_path = np.array(image_path.convert("RGB"))
     result = ocr.ocr(image_path, cls=True)
-    text = "\n".join([line[1][0] for line in result[0]])
+    text = "\n".join([line[1][0] for line in result[0] or []])
+    if cache is not None:
+        cache.set(key, text)
     return text
 
+# Otsu's threshold on a grayscale array: ink is `gray <= threshold`. A page with fewer
+# than two grey levels (blank, or one flat colour) has no split and gets a fixed one.
+def otsu_threshold(gray: np.ndarray) -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    if np.count_nonzero(hist) < 2:
+        return OTSU_FALLBACK_THRESHOLD
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * levels)
+    total, total_mean = weight[-1], mean[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (total_mean * weight - mean * total) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(between))
+
+# Skew angle (degrees) that makes the text lines most horizontal: the rotation whose
+# row-ink profile has the largest variance
+def estimate_skew(gray: Image.Image, max_degrees: float = MAX_SKEW_DEGREES,
+                  step: float = SKEW_STEP_DEGREES) -> float:
+    scale = min(1.0, SKEW_ESTIMATE_WIDTH / gray.width)
+    small = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))))
+    pixels = np.asarray(small)
+    ink = Image.fromarray(((pixels <= otsu_threshold(pixels)) * 255).astype(np.uint8))
+    best, best_score = 0.0, -1.0
+    for angle in np.arange(-max_degrees, max_degrees + step / 2, step):
+        rows = np.asarray(ink.rotate(float(angle), resample=Image.NEAREST, fillcolor=0)).sum(axis=1)
+        score = float(rows.var())
+        if score > best_score:
+            best, best_score = float(angle), score
+    return best
+
+# Grayscale, DPI-normalized and deskewed page (for Paddle) plus its binarized version
+# (for tesseract). `source_dpi` is the page's render resolution, if not in its metadata.
+def preprocess_page(image, source_dpi: Optional[int] = None, dpi: int = OCR_DPI) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(image, str):
+        image = Image.open(image)
+    elif isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    source_dpi = source_dpi or int(round(image.info.get("dpi", (dpi, dpi))[0])) or dpi
+    gray = image.convert("L")
+    if source_dpi != dpi:
+        scale = dpi / source_dpi
+        gray = gray.resize((int(gray.width * scale), int(gray.height * scale)), Image.LANCZOS)
+    angle = estimate_skew(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    pixels = np.asarray(gray)
+    binary = np.where(pixels <= otsu_threshold(pixels), 0, 255).astype(np.uint8)
+    return pixels, binary
+
+# Tesseract words grouped into blocks of lines, with the word confidences per block
+def tesseract_blocks(binary: np.ndarray) -> List[Dict]:
+    data = pytesseract.image_to_data(Image.fromarray(binary), config=TESSERACT_CONFIG,
+                                     output_type=pytesseract.Output.DICT)
+    blocks = {}
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        conf = float(data["conf"][i])
+        if not word or conf < 0:
+            continue
+        block = blocks.setdefault(data["block_num"][i], {"lines": {}, "confs": [], "chars": 0, "box": None})
+        block["lines"].setdefault((data["par_num"][i], data["line_num"][i]), []).append(word)
+        block["confs"].append((conf, len(word)))
+        block["chars"] += len(word)
+        left, top = data["left"][i], data["top"][i]
+        right, bottom = left + data["width"][i], top + data["height"][i]
+        box = block["box"]
+        block["box"] = (left, top, right, bottom) if box is None else \
+            (min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom))
+    result = []
+    for num in sorted(blocks):
+        block = blocks[num]
+        lines, previous = [], None
+        for (par, line) in sorted(block["lines"]):
+            if previous is not None and par != previous:
+                lines.append("")  # blank line between paragraphs, as image_to_string does
+            lines.append(" ".join(block["lines"][(par, line)]))
+            previous = par
+        confidence = sum(c * n for c, n in block["confs"]) / block["chars"]
+        result.append({"text": "\n".join(lines), "confidence": confidence, "words": len(block["confs"]),
+                       "chars": block["chars"], "box": block["box"]})
+    return result
+
+def _crop(pixels: np.ndarray, box: Tuple[int, int, int, int], padding: int = REGION_PADDING) -> np.ndarray:
+    left, top, right, bottom = box
+    height, width = pixels.shape
+    crop = pixels[max(0, top - padding):min(height, bottom + padding), max(0, left - padding):min(width, right + padding)]
+    # White margin around the crop; Paddle's detector misses text touching the border
+    return np.pad(crop, padding, constant_values=255)
+
+# First tier for one page: tesseract text per block plus the crops Paddle should redo.
+# `targets[i]` is the block index regions[i] replaces, or -1 for the whole page.
+# min_confidence <= 0 turns the second tier off (preprocessed tesseract only).
+def ocr_page_fast(image, source_dpi: Optional[int] = None, min_confidence: float = REGION_MIN_CONFIDENCE,
+                  page_fraction: float = PAGE_FALLBACK_FRACTION) -> Dict:
+    start = time.perf_counter()
+    pixels, binary = preprocess_page(image, source_dpi)
+    blocks = tesseract_blocks(binary)
+    low = [i for i, block in enumerate(blocks) if block["confidence"] < min_confidence]
+    chars = sum(block["chars"] for block in blocks)
+    low_chars = sum(blocks[i]["chars"] for i in low)
+    if min_confidence <= 0:
+        whole = False
+    elif not blocks:
+        whole = float((binary == 0).mean()) >= PAGE_MIN_INK
+    else:
+        whole = low_chars > page_fraction * chars
+    if whole:
+        targets, regions = [-1], [pixels]
+    else:
+        targets, regions = low, [_crop(pixels, blocks[i]["box"]) for i in low]
+    return {"blocks": [block["text"] for block in blocks], "targets": targets, "regions": regions,
+            "words": sum(block["words"] for block in blocks),
+            "low_words": sum(blocks[i]["words"] for i in low),
+            "confidence": sum(block["confidence"] * block["chars"] for block in blocks) / chars if chars else 0.0,
+            "seconds": time.perf_counter() - start}
+
+# Second tier: Paddle text for a batch of crops, possibly from many pages
+def ocr_regions_paddle(regions: List[np.ndarray], ocr=None) -> Tuple[List[str], float]:
+    start = time.perf_counter()
+    if ocr is None:
+        ocr = PaddleOCR(use_angle_cls=True, lang='en')
+    texts = [ocr_image_paddle(np.stack([region] * 3, axis=-1), ocr) for region in regions]
+    return texts, time.perf_counter() - start
+
+# Page text from the first tier with Paddle's text swapped in; an empty Paddle result
+# keeps tesseract's text
+def merge_page(page: Dict, paddle_texts: List[str]) -> str:
+    blocks = list(page["blocks"])
+    for target, text in zip(page["targets"], paddle_texts):
+        if not text.strip():
+            continue
+        if target == -1:
+            return text
+        blocks[target] = text
+    return "\n\n".join(blocks)
+
+def new_ocr_report() -> Dict:
+    return {"pages": 0, "cached_pages": 0, "words": 0, "low_confidence_words": 0, "confidence_sum": 0.0,
+            "paddle_pages": 0, "paddle_regions": 0, "tesseract_seconds": 0.0, "paddle_seconds": 0.0,
+            "seconds": 0.0}
+
+def _count_page(report: Dict, page: Dict):
+    report["pages"] += 1
+    report["words"] += page["words"]
+    report["low_confidence_words"] += page["low_words"]
+    report["confidence_sum"] += page["confidence"]
+    report["paddle_pages"] += page["targets"] == [-1]
+    report["paddle_regions"] += len(page["targets"]) if page["targets"] != [-1] else 0
+    report["tesseract_seconds"] += page["seconds"]
+
+def summarize_ocr_report(report: Dict) -> str:
+    ocred = report["pages"] - report["cached_pages"]
+    return (f"{report['pages']} pages ({report['cached_pages']} cached) in {report['seconds']:.1f}s; "
+            f"tesseract {report['tesseract_seconds']:.1f}s, mean confidence "
+            f"{report['confidence_sum'] / ocred if ocred else 0:.1f}, "
+            f"{report['low_confidence_words']}/{report['words']} words low-confidence; "
+            f"Paddle {report['paddle_seconds']:.1f}s on {report['paddle_pages']} whole pages and "
+            f"{report['paddle_regions']} regions")
+
 # OCR all images in a folder
-def ocr_images(image_paths: List[str], method: str = "pytesseract") -> List[str]:
+def ocr_images(image_paths: List[str], method: str = "pytesseract", cache: Optional[DiskCache] = None,
+               dpi: int = DEFAULT_DPI, report: Optional[Dict] = None) -> List[str]:
+    if method == "adaptive":
+        # `dpi` is what the images were rendered at (pdf_to_images uses the default)
+        return ocr_images_adaptive(image_paths, cache, dpi, report)
     texts = []
     if method == "paddle":
-        ocr = PaddleOCR(use_angle_cls=True, lang='en')
+        ocr = None
         for img_path in image_paths:
-            texts.append(ocr_image_paddle(img_path, ocr))
+            key = ocr_cache_key(img_path, "paddle") if cache is not None else None
+            text = cache.get(key) if cache is not None else None
+            if text is None:
+                # Only build the model once a page actually misses the cache
+                if ocr is None:
+                    ocr = PaddleOCR(use_angle_cls=True, lang='en')
+                text = ocr_image_paddle(img_path, ocr)
+                if cache is not None:
+                    cache.set(key, text)
+            texts.append(text)
     else:
         for img_path in image_paths:
-            texts.append(ocr_image_pytesseract(img_path))
-    return texts 
\ No newline at end of file
+            texts.append(ocr_image_pytesseract(img_path, cache))
+    return texts
+
+# Both tiers in this process: tesseract page by page, then every low-confidence
+# region of the document through one PaddleOCR instance
+def ocr_images_adaptive(image_paths: List[str], cache: Optional[DiskCache] = None, dpi: int = DEFAULT_DPI,
+                        report: Optional[Dict] = None) -> List[str]:
+    report = report if report is not None else new_ocr_report()
+    start = time.perf_counter()
+    texts, pages, keys = [], {}, {}
+    for i, img_path in enumerate(image_paths):
+        key = ocr_cache_key(img_path, "adaptive") if cache is not None else None
+        text = cache.get(key) if cache is not None else None
+        if text is not None:
+            report["pages"] += 1
+            report["cached_pages"] += 1
+        else:
+            pages[i] = ocr_page_fast(img_path, dpi)
+            keys[i] = key
+            _count_page(report, pages[i])
+        texts.append(text)
+    regions = [region for page in pages.values() for region in page["regions"]]
+    paddle_texts = []
+    if regions:
+        paddle_texts, seconds = ocr_regions_paddle(regions)
+        report["paddle_seconds"] += seconds
+    offset = 0
+    for i, page in pages.items():
+        texts[i] = merge_page(page, paddle_texts[offset:offset + len(page["regions"])])
+        offset += len(page["regions"])
+        if cache is not None:
+            cache.set(keys[i], texts[i])
+    report["seconds"] += time.perf_counter() - start
+    return texts
+
+# Per-process OCR state for the streaming pipeline: each worker builds its engine once
+_worker_method = None
+_worker_ocr = None
+
+def _init_ocr_worker(method: str):
+    global _worker_method, _worker_ocr
+    _worker_method = method
+    if method == "paddle":
+        _worker_ocr = PaddleOCR(use_angle_cls=True, lang='en')
+
+def _ocr_page(image) -> str:
+    if _worker_method == "paddle":
+        return ocr_image_paddle(image, _worker_ocr)
+    return ocr_image_pytesseract(image)
+
+def _ocr_regions(regions: List[np.ndarray]) -> Tuple[List[str], float]:
+    return ocr_regions_paddle(regions, _worker_ocr)
+
+# Stream OCR text for a PDF in page order: pages are rendered incrementally and OCRed
+# by a pool of warm worker processes, with a bounded number of pages in flight.
+# With a cache, pages are looked up in this process and only misses reach the pool.
+def ocr_pdf_streaming(pdf_path: str, method: str = "pytesseract", workers: Optional[int] = None,
+                      dpi: int = DEFAULT_DPI, batch_pages: int = RENDER_BATCH_PAGES,
+                      output_folder: Optional[str] = None, cache: Optional[DiskCache] = None,
+                      report: Optional[Dict] = None, max_pages: Optional[int] = None) -> Iterator[str]:
+    if method == "adaptive":
+        # Renders at OCR_DPI; `report` (see new_ocr_report) collects the tier statistics
+        yield from ocr_pdf_adaptive(pdf_path, workers, OCR_DPI, batch_pages, output_folder, cache, report,
+                                    max_pages=max_pages)
+        return
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    def finish(entry):
+        key, result = entry
+        if isinstance(result, str):
+            return result
+        text = result.result()
+        if cache is not None:
+            cache.set(key, text)
+        return text
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker, initargs=(method,)) as pool:
+        in_flight = deque()
+        for img in iter_pdf_pages(pdf_path, dpi=dpi, batch_pages=batch_pages, output_folder=output_folder,
+                                  max_pages=max_pages):
+            key = cached = None
+            if cache is not None:
+                key = ocr_cache_key(img, method)
+                cached = cache.get(key)
+            in_flight.append((key, cached if cached is not None else pool.submit(_ocr_page, img)))
+            if len(in_flight) >= max_in_flight:
+                yield finish(in_flight.popleft())
+        while in_flight:
+            yield finish(in_flight.popleft())
+
+# Adaptive OCR for a PDF, streamed in page order. A pool of tesseract workers runs the
+# first tier; low-confidence regions queue up across pages and go to a single warm
+# Paddle process PADDLE_BATCH_REGIONS at a time (it is only started if a page needs
+# it). A page is yielded once its regions are back, holding back at most
+# PADDLE_WINDOW_PAGES finished pages while a batch fills.
+def ocr_pdf_adaptive(pdf_path: str, workers: Optional[int] = None, dpi: int = OCR_DPI,
+                     batch_pages: int = RENDER_BATCH_PAGES, output_folder: Optional[str] = None,
+                     cache: Optional[DiskCache] = None, report: Optional[Dict] = None,
+                     min_confidence: float = REGION_MIN_CONFIDENCE,
+                     page_fraction: float = PAGE_FALLBACK_FRACTION, max_pages: Optional[int] = None) -> Iterator[str]:
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    report = report if report is not None else new_ocr_report()
+    start = time.perf_counter()
+    default_thresholds = (min_confidence, page_fraction) == (REGION_MIN_CONFIDENCE, PAGE_FALLBACK_FRACTION)
+    # Results of other thresholds are not cached under the default settings' keys
+    cache = cache if default_thresholds else None
+    first_tier = deque()  # (cache key, cached text or tesseract future)
+    second_tier = deque()  # pages with first-tier results, waiting on Paddle
+    batch = []  # (page entry, region) not yet sent to Paddle
+
+    def flush():
+        if batch:
+            future = paddle.submit(_ocr_regions, [region for _, region in batch])
+            for i, (entry, _) in enumerate(batch):
+                entry["paddle"].append((future, i))
+            batch.clear()
+
+    def advance():
+        key, result = first_tier.popleft()
+        if isinstance(result, str):
+            second_tier.append({"text": result})
+            return
+        page = result.result()
+        _count_page(report, page)
+        entry = {"key": key, "page": page, "paddle": []}
+        batch.extend((entry, region) for region in page["regions"])
+        if len(batch) >= PADDLE_BATCH_REGIONS:
+            flush()
+        second_tier.append(entry)
+
+    def ready(entry) -> bool:
+        if "text" in entry:
+            return True
+        pending = entry["paddle"]
+        return len(pending) == len(entry["page"]["regions"]) and all(future.done() for future, _ in pending)
+
+    def finish(entry) -> str:
+        if "text" in entry:
+            return entry["text"]
+        if len(entry["paddle"]) < len(entry["page"]["regions"]):
+            flush()
+        texts = []
+        for future, i in entry["paddle"]:
+            batch_texts, seconds = future.result()
+            if i == 0:
+                report["paddle_seconds"] += seconds  # once per batch
+            texts.append(batch_texts[i])
+        text = merge_page(entry["page"], texts)
+        if cache is not None:
+            cache.set(entry["key"], text)
+        return text
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker, initargs=("pytesseract",)) as fast, \
+                ProcessPoolExecutor(max_workers=1, initializer=_init_ocr_worker, initargs=("paddle",)) as paddle:
+            for img in iter_pdf_pages(pdf_path, dpi=dpi, batch_pages=batch_pages, output_folder=output_folder,
+                                      max_pages=max_pages):
+                key = cached = None
+                if cache is not None:
+                    key = ocr_cache_key(img, "adaptive")
+                    cached = cache.get(key)
+                if cached is not None:
+                    report["pages"] += 1
+                    report["cached_pages"] += 1
+                    first_tier.append((key, cached))
+                else:
+                    first_tier.append((key, fast.submit(ocr_page_fast, img, dpi, min_confidence, page_fraction)))
+                while len(first_tier) >= max_in_flight:
+                    advance()
+                while second_tier and (ready(second_tier[0]) or len(second_tier) > PADDLE_WINDOW_PAGES):
+                    yield finish(second_tier.popleft())
+            while first_tier:
+                advance()
+            flush()
+            while second_tier:
+                yield finish(second_tier.popleft())
+    finally:
+        report["seconds"] += time.perf_counter() - start
@@ -0,0 +1,261 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+import faiss
+import numpy as np
+from bm25_index import tokenize
+from chunk_store import PackedChunkStore, write_packed_chunks
+from text_chunking import iter_sentences
+
+# Sentence-level side index built next to a unit's chunk index, so quizzes can be
+# assembled from precomputed facts instead of LLM calls:
+#   <unit>.sentences        packed sentence texts (chunk_store format)
+#   <unit>.sentences.faiss  their normalized embeddings (inner product = cosine)
+#   <unit>.sentences.npz    per sentence: source chunk id, how well it represents that
+#                           chunk, its key term and its nearest neighbours
+# The key term is the sentence's content word that best looks like a concept of the
+# unit; it is the answer of the sentence's cloze question and neighbours' key terms
+# are its distractors. Neighbours come from one batched FAISS search at build time.
+# None of these suffixes end in ".index", so chapter discovery never lists them as units.
+
+SENTENCES_SUFFIX = '.sentences'
+SENTENCE_INDEX_SUFFIX = '.sentences.faiss'
+SENTENCE_META_SUFFIX = '.sentences.npz'
+MIN_SENTENCE_WORDS = 6
+MAX_SENTENCE_WORDS = 40
+MIN_LETTER_FRACTION = 0.6  # drops table rows, equations and OCR noise
+MIN_TERM_LENGTH = 4
+STEM_LENGTH = 5  # options sharing this prefix ("vibrate", "vibration") are one answer
+SENTENCE_NEIGHBOURS = 16
+# Neighbours closer than this say the same thing (overlapping chunks, repeated
+# definitions); further than DISTRACTOR_MIN_SIMILARITY they are off topic
+DISTRACTOR_MIN_SIMILARITY = 0.3
+DISTRACTOR_MAX_SIMILARITY = 0.9
+SEARCH_BATCH = 1024  # sentences searched per FAISS call while building
+STOPWORDS = frozenset('''
+about above after again against also although among another because been before being
+below between both could does doing down during each either every from further have having
+here however into itself just more most much must neither only other ought over same
+shall should since some such than that their theirs them themselves then there these they
+this those through thus under until upon very were what when where whether which while
+whom whose will with within without would your yours called known example figure
+following given shown table used using uses various several many often usually
+'''.split())
+
+def split_sentences(text: str) -> List[str]:
+    # Sentences of a chunk that can stand alone as a fact
+    sentences = []
+    for start, end, _ in iter_sentences(text):
+        sentence = ' '.join(text[start:end].split())
+        words = len(sentence.split())
+        letters = sum(c.isalpha() for c in sentence)
+        if MIN_SENTENCE_WORDS <= words <= MAX_SENTENCE_WORDS and letters >= MIN_LETTER_FRACTION * len(sentence):
+            sentences.append(sentence)
+    return sentences
+
+def sentence_hash(sentence: str) -> str:
+    return hashlib.sha256(sentence.encode('utf-8')).hexdigest()
+
+def _candidate_terms(sentence: str) -> List[str]:
+    return [t for t in dict.fromkeys(tokenize(sentence))
+            if t.isalpha() and len(t) >= MIN_TERM_LENGTH and t not in STOPWORDS]
+
+def key_terms(sentences: List[str]) -> List[str]:
+    # Per sentence, the content word maximizing log(1 + df) * log(n / df) over the
+    # unit's sentences, as it is written there: words repeated across the unit but not
+    # everywhere. A word seen once is more likely an OCR error than a concept.
+    candidates = [_candidate_terms(s) for s in sentences]
+    df = Counter(t for terms in candidates for t in terms)
+    n = max(len(sentences), 1)
+    terms = []
+    for sentence, words in zip(sentences, candidates):
+        shared = [t for t in words if df[t] >= 2]
+        if not shared:
+            terms.append('')
+            continue
+        best = max(shared, key=lambda t: (math.log1p(df[t]) * math.log(n / df[t]), len(t)))
+        match = re.search(rf'\b{re.escape(best)}\b', sentence, re.IGNORECASE)
+        terms.append(match.group(0) if match else best)
+    return terms
+
+def match_case(term: str, like: str) -> str:
+    # Options written the way the answer is, so casing does not give it away
+    if like.isupper():
+        return term.upper()
+    if like[:1].isupper():
+        return term[:1].upper() + term[1:].lower()
+    return term.lower()
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+class SentenceIndex:
+    def __init__(self, sentences, index: faiss.Index, chunk_ids: np.ndarray, scores: np.ndarray,
+                 terms: List[str], neighbours: np.ndarray, similarities: np.ndarray, model: str = '',
+                 backend: str = ''):
+        self.sentences = sentences  # PackedChunkStore or list
+        self.index = index
+        self.chunk_ids = chunk_ids
+        self.scores = scores
+        self.terms = terms
+        self.neighbours = neighbours
+        self.similarities = similarities
+        # Embedding model name and backend; vectors are only reused under the same pair
+        self.model = model
+        self.backend = backend
+        self.embedded = 0  # sentences embedded by build(), the rest were reused
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.index.ntotal * self.index.d * 4 + self.neighbours.nbytes + self.similarities.nbytes
+
+    def vectors(self) -> np.ndarray:
+        return self.index.reconstruct_n(0, self.index.ntotal) if self.index.ntotal else \
+            np.zeros((0, self.index.d), dtype='float32')
+
+    @classmethod
+    def build(cls, chunks: List[str], embed: Callable[[List[str]], np.ndarray],
+              chunk_vectors: Optional[np.ndarray] = None,
+              previous: Optional['SentenceIndex'] = None, model: str = '', backend: str = '',
+              neighbours: int = SENTENCE_NEIGHBOURS) -> 'SentenceIndex':
+        # Sentences repeated by chunk overlap are kept once, under their first chunk
+        sentences, chunk_ids, seen = [], [], set()
+        for chunk_id, chunk in enumerate(chunks):
+            for sentence in split_sentences(chunk):
+                if sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append(sentence)
+                    chunk_ids.append(chunk_id)
+        chunk_ids = np.array(chunk_ids, dtype='int32')
+
+        # Embed only sentences the previous build did not have
+        reused = {}
+        if previous is not None and len(previous) and (previous.model, previous.backend) == (model, backend):
+            reused = dict(zip((sentence_hash(s) for s in previous.sentences), previous.vectors()))
+        hashes = [sentence_hash(s) for s in sentences]
+        missing = [i for i, h in enumerate(hashes) if h not in reused]
+        fresh = _normalized(embed([sentences[i] for i in missing])) if missing else None
+        if sentences:
+            dim = fresh.shape[1] if fresh is not None else len(next(iter(reused.values())))
+            vectors = np.zeros((len(sentences), dim), dtype='float32')
+            for i, h in enumerate(hashes):
+                if h in reused:
+                    vectors[i] = reused[h]
+            if missing:
+                vectors[missing] = fresh
+        else:
+            dim = chunk_vectors.shape[1] if chunk_vectors is not None else (previous.index.d if previous else 1)
+            vectors = np.zeros((0, dim), dtype='float32')
+        index = faiss.IndexFlatIP(dim)
+        index.add(vectors)
+
+        # How central each sentence is to its chunk: cosine with the chunk's vector
+        scores = np.zeros(len(sentences), dtype='float32')
+        if chunk_vectors is not None and len(chunk_vectors) == len(chunks) and len(sentences):
+            centres = _normalized(np.asarray(chunk_vectors, dtype='float32')[chunk_ids])
+            scores = np.einsum('ij,ij->i', vectors, centres).astype('float32')
+
+        # Nearest neighbours of every sentence, batched; each row's own id is dropped
+        # (or its last hit, when an identical vector outranked it)
+        k = min(neighbours + 1, len(sentences))
+        ids = np.full((len(sentences), neighbours), -1, dtype='int32')
+        sims = np.zeros((len(sentences), neighbours), dtype='float16')
+        for start in range(0, len(sentences), SEARCH_BATCH):
+            d, i = index.search(vectors[start:start + SEARCH_BATCH], k)
+            keep = i != np.arange(start, start + len(i))[:, None]
+            keep[keep.all(axis=1), -1] = False
+            ids[start:start + len(i), :k - 1] = i[keep].reshape(len(i), k - 1)
+            sims[start:start + len(i), :k - 1] = d[keep].reshape(len(i), k - 1)
+        built = cls(sentences, index, chunk_ids, scores, key_terms(sentences), ids, sims, model, backend)
+        built.embedded = len(missing)
+        return built
+
+    def save(self, prefix: str):
+        write_packed_chunks(prefix + SENTENCES_SUFFIX, list(self.sentences))
+        faiss.write_index(self.index, prefix + SENTENCE_INDEX_SUFFIX)
+        tmp_path = prefix + SENTENCE_META_SUFFIX + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            # Key terms as one newline-joined UTF-8 blob (a term is a single word)
+            terms = np.frombuffer('\n'.join(self.terms).encode('utf-8'), dtype='uint8')
+            np.savez(f, chunk_ids=self.chunk_ids, scores=self.scores, terms=terms,
+                     neighbours=self.neighbours, similarities=self.similarities, model=np.array(self.model),
+                     backend=np.array(self.backend))
+        os.replace(tmp_path, prefix + SENTENCE_META_SUFFIX)
+
+    @classmethod
+    def load(cls, prefix: str) -> 'SentenceIndex':
+        with np.load(prefix + SENTENCE_META_SUFFIX) as data:
+            terms = data['terms'].tobytes().decode('utf-8').split('\n') if len(data['chunk_ids']) else []
+            meta = {name: data[name] for name in ('chunk_ids', 'scores', 'neighbours', 'similarities')}
+            model = str(data['model'])
+            backend = str(data['backend']) if 'backend' in data else ''
+        return cls(PackedChunkStore(prefix + SENTENCES_SUFFIX), faiss.read_index(prefix + SENTENCE_INDEX_SUFFIX),
+                   meta['chunk_ids'], meta['scores'], terms, meta['neighbours'], meta['similarities'], model,
+                   backend)
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return all(os.path.exists(prefix + suffix)
+                   for suffix in (SENTENCES_SUFFIX, SENTENCE_INDEX_SUFFIX, SENTENCE_META_SUFFIX))
+
+    def distractors(self, i: int, count: int) -> List[str]:
+        # Key terms of sentence i's neighbours within the distractor similarity band,
+        # distinct from each other and absent from the sentence itself
+        answer = self.terms[i]
+        words = set(tokenize(self.sentences[i]))
+        picked, stems = [], {answer.lower()[:STEM_LENGTH]}
+        for j, similarity in zip(self.neighbours[i], self.similarities[i]):
+            if j < 0 or not DISTRACTOR_MIN_SIMILARITY <= similarity < DISTRACTOR_MAX_SIMILARITY:
+                continue
+            term = self.terms[j]
+            if not term or term.lower()[:STEM_LENGTH] in stems or term.lower() in words:
+                continue
+            stems.add(term.lower()[:STEM_LENGTH])
+            picked.append(match_case(term, answer))
+            if len(picked) == count:
+                break
+        return picked
+
+    def facts(self, chunk_order: List[int], count: int, start: int = 0, num_distractors: int = 3) -> List[Dict]:
+        # Up to `count` facts walking `chunk_order` (chunk ids, e.g. the coverage order)
+        # from position `start`: each chunk's most representative usable sentence first,
+        # its next best on the following pass. No two facts share an answer.
+        chunk_order = list(dict.fromkeys(chunk_order))
+        if not len(self) or not chunk_order:
+            return []
+        order = np.argsort(self.chunk_ids, kind='stable')
+        sorted_ids = self.chunk_ids[order]
+        per_chunk = {}
+        for chunk_id in chunk_order:
+            first, end = np.searchsorted(sorted_ids, [chunk_id, chunk_id + 1])
+            rows = order[first:end]
+            rows = rows[np.argsort(-self.scores[rows], kind='stable')]
+            per_chunk[chunk_id] = [int(i) for i in rows if self.terms[i]]
+        facts, answers = [], set()
+        for depth in range(max((len(rows) for rows in per_chunk.values()), default=0)):
+            for k in range(len(chunk_order)):
+                chunk_id = chunk_order[(start + k) % len(chunk_order)]
+                rows = per_chunk[chunk_id]
+                if depth >= len(rows):
+                    continue
+                i = rows[depth]
+                if self.terms[i].lower() in answers:
+                    continue
+                distractors = self.distractors(i, num_distractors)
+                if len(distractors) < num_distractors:
+                    continue
+                answers.add(self.terms[i].lower())
+                facts.append({'sentence': self.sentences[i], 'answer': self.terms[i],
+                              'distractors': distractors, 'chunk_id': int(chunk_id)})
+                if len(facts) == count:
+                    return facts
+        return facts
@@ -1,32 +1,43 @@
 import streamlit as st
-from faiss_store import ChapterFaissStore
-from together_rag import TogetherRAG
+from embedding_server import make_faiss_store
+from together_rag import TogetherRAG, open_response_cache
+from chapter_registry import ChapterRegistry
 
 # Set up Streamlit page config
 st.set_page_config(page_title="RAG Learning System", layout="centered")
 st.title("📚 RAG Learning System")
 
-# Initialize FAISS and RAG
-faiss_store = ChapterFaissStore(index_dir="../faiss_indexes")
-rag = TogetherRAG(faiss_store)
+# Initialize FAISS and RAG once per server process; Streamlit reruns this script on
+# every interaction, so building them at top level would reload them each time
+@st.cache_resource
+def get_rag():
+    faiss_store = make_faiss_store("../faiss_indexes")
+    return TogetherRAG(faiss_store, cache=open_response_cache())
 
-CHAPTERS = ["Full Book", "UNIT 1"]
+@st.cache_resource
+def get_registry():
+    # Chapters discovered from faiss_indexes; hot ones load in the background once
+    registry = ChapterRegistry(get_rag().faiss_store, "../faiss_indexes")
+    registry.prewarm()
+    return registry
+
+rag = get_rag()
+registry = get_registry()
 
 # Sidebar for chapter selection
 st.sidebar.header("Select Chapter")
-chapter = st.sidebar.selectbox("Chapter", CHAPTERS)
+chapter = st.sidebar.selectbox("Chapter", registry.chapters())
 
 st.markdown("---")
 
 # Notes generation
 if st.button("Generate Chapter Notes", type="primary"):
-    with st.spinner("Generating notes..."):
-        try:
-            notes = rag.generate_chapter_notes(chapter)
-            st.subheader(f"Notes for {chapter}")
-            st.code(notes)
-        except Exception as e:
-            st.error(f"Error generating notes: {e}")
+    try:
+        st.subheader(f"Notes for {chapter}")
+        # Render tokens as they arrive instead of waiting for the whole completion
+        st.write_stream(rag.stream_chapter_notes(chapter))
+    except Exception as e:
+        st.error(f"Error generating notes: {e}")
 
 st.markdown("---")
 
@@ -75,25 +86,26 @@ if st.button("Start MCQ Quiz", type="secondary") or st.session_state.quiz_starte
                 st.session_state.quiz_started = False
 
 if st.session_state.quiz_submitted:
-    score = 0
-    explanations = []
-    incorrect_indices = []
-    for i, mcq in enumerate(st.session_state.mcqs):
-        if st.session_state.user_answers[i] == mcq['correct']:
-            score += 1
-            explanations.append("")
-        else:
-            incorrect_indices.append(i)
-            with st.spinner(f"Explaining Q{i+1}..."):
-                explain = rag.explain_answer(chapter, mcq['question'], st.session_state.user_answers[i], mcq['correct'])
-                explanations.append(explain)
-    st.success(f"Your score: {score} / {len(st.session_state.mcqs)}")
-    for i, mcq in enumerate(st.session_state.mcqs):
-        st.markdown(f"**Q{i+1}: {mcq['question']}**")
-        st.markdown(f"- Your answer: {st.session_state.user_answers[i]}")
-        st.markdown(f"- Correct answer: {mcq['correct']}")
-        if i in incorrect_indices:
-            st.info(f"Explanation: {explanations[i]}")
+    mcqs = st.session_state.mcqs
+    score = sum(st.session_state.user_answers[i] == mcq['correct'] for i, mcq in enumerate(mcqs))
+    st.success(f"Your score: {score} / {len(mcqs)}")
+    # One placeholder per question, filled in as concurrent explanations complete
+    slots = [st.empty() for _ in mcqs]
+    for i, mcq in enumerate(mcqs):
+        with slots[i].container():
+            st.markdown(f"**Q{i+1}: {mcq['question']}**")
+            st.markdown(f"- Your answer: {st.session_state.user_answers[i]}")
+            st.markdown(f"- Correct answer: {mcq['correct']}")
+    with st.spinner("Explaining wrong answers..."):
+        for result in rag.grade_answers(chapter, mcqs, st.session_state.user_answers):
+            if result['is_correct']:
+                continue
+            i = result['index']
+            with slots[i].container():
+                st.markdown(f"**Q{i+1}: {result['question']}**")
+                st.markdown(f"- Your answer: {result['user_answer']}")
+                st.markdown(f"- Correct answer: {result['correct_answer']}")
+                st.info(f"Explanation: {result['explanation']}")
     if st.button("Start New Quiz"):
         st.session_state.quiz_started = False
         st.session_state.mcqs = []
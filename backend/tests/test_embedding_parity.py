@@ -0,0 +1,84 @@
+import glob
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+faiss = pytest.importorskip('faiss')
+pytest.importorskip('sentence_transformers')
+
+from chunk_store import PackedChunkStore, CHUNKS_SUFFIX
+from faiss_store import get_embedding_model, EMBEDDING_MODEL_NAME
+
+# The quantized and ONNX embedding backends against the fp32 torch reference, on the
+# bundled indexes (benchmarks/bench_embedding.py measures the same with throughput).
+# Skipped when the model is not available locally; it is never downloaded here.
+
+INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../faiss_indexes'))
+MIN_COSINE = 0.98
+MIN_OVERLAP = 0.90
+K = 5
+NUM_TEXTS = 64
+NUM_QUERIES = 20
+
+
+def model_available(name):
+    if os.path.isdir(name):
+        return True
+    from huggingface_hub import try_to_load_from_cache
+    repo = name if '/' in name else 'sentence-transformers/' + name
+    return isinstance(try_to_load_from_cache(repo, 'config.json'), str)
+
+
+def encode(model, texts):
+    return np.ascontiguousarray(model.encode(texts, show_progress_bar=False, convert_to_numpy=True), dtype='float32')
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    units = {}
+    for path in sorted(glob.glob(os.path.join(INDEX_DIR, '*' + CHUNKS_SUFFIX))):
+        unit = os.path.basename(path)[:-len(CHUNKS_SUFFIX)]
+        if os.path.exists(os.path.join(INDEX_DIR, unit + '.index')):
+            units[unit] = list(PackedChunkStore(path))
+    if not units:
+        pytest.skip(f'no bundled indexes in {INDEX_DIR}')
+    rng = np.random.default_rng(0)
+    chunks = [chunk for unit_chunks in units.values() for chunk in unit_chunks]
+    texts = [chunks[i] for i in rng.integers(0, len(chunks), NUM_TEXTS)]
+    # Query-like strings: the first dozen words of some of each unit's chunks
+    queries = {unit: [' '.join(chunk.split()[:12]) for chunk in unit_chunks[:NUM_QUERIES]]
+               for unit, unit_chunks in units.items()}
+    indexes = {unit: faiss.read_index(os.path.join(INDEX_DIR, unit + '.index')) for unit in units}
+    return texts, queries, indexes
+
+
+def run(backend, corpus):
+    texts, queries, indexes = corpus
+    model = get_embedding_model(EMBEDDING_MODEL_NAME, backend)
+    hits = {unit: indexes[unit].search(encode(model, queries[unit]), K)[1] for unit in queries}
+    return encode(model, texts), hits
+
+
+@pytest.fixture(scope='module')
+def reference(corpus):
+    if not model_available(EMBEDDING_MODEL_NAME):
+        pytest.skip(f'embedding model {EMBEDDING_MODEL_NAME} not available locally')
+    return run('torch', corpus)
+
+
+@pytest.mark.parametrize('backend', ['torch_int8', 'onnx', 'onnx_int8'])
+def test_backend_matches_fp32(backend, corpus, reference):
+    if backend.startswith('onnx'):
+        pytest.importorskip('onnxruntime')
+        pytest.importorskip('optimum')
+    embeddings, hits = run(backend, corpus)
+    a = reference[0] / np.linalg.norm(reference[0], axis=1, keepdims=True)
+    b = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+    assert cosine.min() >= MIN_COSINE
+    overlap = np.mean([len(set(x) & set(y)) / K for unit in hits for x, y in zip(reference[1][unit], hits[unit])])
+    assert overlap >= MIN_OVERLAP
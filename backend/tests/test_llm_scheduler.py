@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_llm import FakeLLMClient
+from llm_scheduler import LLMScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from together_rag import TogetherRAG
+
+
+class StaticStore:
+    def search_many(self, unit, queries, top_k=3):
+        return [[(f"Context chunk {i} about {unit}.", float(i)) for i in range(top_k)] for _ in queries]
+
+
+def concurrently(fns):
+    results = [None] * len(fns)
+
+    def run(i):
+        results[i] = fns[i]()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(fns))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def ask(client, prompt):
+    return lambda: client.chat.completions.create(model='fake', messages=[{'role': 'user', 'content': prompt}])
+
+
+def test_identical_requests_share_one_upstream_call():
+    client = FakeLLMClient(latency=0.2, seed=0)
+    rag = TogetherRAG(StaticStore(), client=client, cache=None, hybrid=False, scheduler=LLMScheduler())
+    notes = concurrently([lambda: rag.generate_chapter_notes('UNIT 1')] * 10)
+    assert client.calls == 1
+    assert len(set(notes)) == 1
+    assert rag.scheduler.stats()['coalesced'] == 9
+
+
+def test_rate_limited_calls_are_retried_until_they_succeed():
+    client = FakeLLMClient(latency=0.0, seed=0, rate_limit=20, rate_limit_burst=1)
+    scheduler = LLMScheduler(max_concurrency=4, max_retries=50, base_delay=0.01, max_delay=0.1, seed=0)
+    responses = concurrently([lambda i=i: scheduler.run(None, ask(client, f'prompt {i}')) for i in range(10)])
+    assert all(r.choices[0].message.content for r in responses)
+    assert client.calls == 10
+    assert client.rejected > 0
+    assert scheduler.stats()['rate_limited'] == client.rejected
+
+
+def test_interactive_calls_overtake_queued_bulk_calls():
+    scheduler = LLMScheduler(max_concurrency=1)
+    release = threading.Event()
+    order = []
+
+    def call(name):
+        def run():
+            order.append(name)
+            return name
+        return run
+    blocker = threading.Thread(target=scheduler.run, args=(None, lambda: release.wait(5)))
+    blocker.start()
+    while scheduler.stats()['queued']:  # the only worker has taken the blocking call
+        time.sleep(0.01)
+    threads = [threading.Thread(target=scheduler.run, args=(None, call(f'bulk {i}'), PRIORITY_BULK))
+               for i in range(3)]
+    threads.append(threading.Thread(target=scheduler.run, args=(None, call('interactive'), PRIORITY_INTERACTIVE)))
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)  # queue in this order
+    while scheduler.stats()['queued'] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads + [blocker]:
+        thread.join()
+    assert order[0] == 'interactive'
+    assert order[1:] == ['bulk 0', 'bulk 1', 'bulk 2']
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip('paddleocr')  # imported by ocr_pipeline at module level
+
+from ocr_pipeline import otsu_threshold, preprocess_page, OTSU_FALLBACK_THRESHOLD
+
+
+def test_blank_page_gets_fixed_threshold():
+    white = np.full((50, 40), 255, dtype=np.uint8)
+    assert otsu_threshold(white) == OTSU_FALLBACK_THRESHOLD
+    assert otsu_threshold(np.zeros((50, 40), dtype=np.uint8)) == OTSU_FALLBACK_THRESHOLD
+
+
+def test_blank_page_preprocesses_to_no_ink():
+    pixels, binary = preprocess_page(Image.new('RGB', (1700, 2200), 'white'), 200)
+    assert pixels.shape == binary.shape
+    assert (binary == 255).all()
+
+
+def test_bilevel_page_keeps_its_ink():
+    page = np.full((100, 100), 255, dtype=np.uint8)
+    page[40:60, 10:90] = 0
+    threshold = otsu_threshold(page)
+    assert ((page <= threshold) == (page == 0)).all()
+
+
+def test_grey_page_splits_between_classes():
+    rng = np.random.default_rng(0)
+    page = np.clip(rng.normal(200, 10, size=(100, 100)), 0, 255).astype(np.uint8)
+    page[30:50] = np.clip(rng.normal(60, 10, size=(20, 100)), 0, 255).astype(np.uint8)
+    threshold = otsu_threshold(page)
+    assert 80 < threshold < 180
+    ink = page <= threshold
+    assert ink[30:50].all() and not ink[:30].any() and not ink[50:].any()
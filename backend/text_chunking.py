@@ -1,16 +1,36 @@
 import re
-from typing import List, Dict
+from bisect import bisect_right
+from itertools import islice
+from typing import List, Dict, Tuple, Iterator, Iterable, Callable, Optional
 
-def split_into_chapters(full_text: str) -> Dict[str, str]:
+# Sentence chunker defaults, in tokens of the embedding model's tokenizer. MiniLM
+# truncates at 256 wordpieces including [CLS]/[SEP]; build_index passes the limit of
+# the model actually loaded.
+MAX_CHUNK_TOKENS = 254
+OVERLAP_TOKENS = 32
+SENTENCE_BATCH = 512  # sentences tokenized per call
+
+PAGE_BREAK = '\f'
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*|\f')
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) followed by
+# whitespace and a capital or opening quote. Decimals, "e.g. the" and inline
+# equations like "v = d/t" do not match.
+SENTENCE_END = re.compile(r'[.!?][\'")\]]*(?=\s+[\'"(\[]?[A-Z])')
+WORD = re.compile(r'\S+')
+
+CountTokens = Callable[[List[str]], List[int]]
+
+def chapter_spans(full_text: str) -> Dict[str, Tuple[int, int]]:
     # Split text by 'Chapter [number]' or 'Unit [number]' pattern (case-insensitive)
-    chapters = {}
+    spans = {}
     matches = list(re.finditer(r'(Chapter \d+|Unit \d+)', full_text, re.IGNORECASE))
     for i, match in enumerate(matches):
-        start = match.start()
         end = matches[i+1].start() if i+1 < len(matches) else len(full_text)
-        chapter_title = match.group(1)
-        chapters[chapter_title] = full_text[start:end].strip()
-    return chapters
+        spans[match.group(1)] = (match.start(), end)
+    return spans
+
+def split_into_chapters(full_text: str) -> Dict[str, str]:
+    return {title: full_text[start:end].strip() for title, (start, end) in chapter_spans(full_text).items()}
 
 def chunk_text(text: str, max_tokens: int = 500, overlap: int = 50) -> List[str]:
     # Simple whitespace tokenization
@@ -23,4 +43,121 @@ def chunk_text(text: str, max_tokens: int = 500, overlap: int = 50) -> List[str]
         if i + max_tokens >= len(words):
             break
         i += max_tokens - overlap
-    return chunks 
\ No newline at end of file
+    return chunks
+
+def count_words(texts: List[str]) -> List[int]:
+    return [len(text.split()) for text in texts]
+
+def tokenizer_counter(tokenizer) -> CountTokens:
+    # Batched wordpiece counts from a Hugging Face tokenizer (the fast ones encode a
+    # batch in parallel). BERT pre-tokenizes on whitespace, so the count of a chunk
+    # is the sum of the counts of its sentences.
+    def count(texts: List[str]) -> List[int]:
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False, verbose=False)['input_ids']]
+    return count
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def iter_sentences(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, bool]]:
+    # (start, end, starts_paragraph) for each sentence of text[start:end]
+    end = len(text) if end is None else end
+    paragraph_start = start
+    for brk in list(PARAGRAPH_BREAK.finditer(text, start, end)) + [None]:
+        paragraph_end = brk.start() if brk else end
+        first = True
+        pos = paragraph_start
+        for match in SENTENCE_END.finditer(text, paragraph_start, paragraph_end):
+            s, e = _strip_span(text, pos, match.end())
+            if s < e:
+                yield s, e, first
+                first = False
+            pos = match.end()
+        s, e = _strip_span(text, pos, paragraph_end)
+        if s < e:
+            yield s, e, first
+        if brk:
+            paragraph_start = brk.end()
+
+def _split_long(text: str, start: int, end: int, max_tokens: int,
+                count_tokens: CountTokens) -> List[Tuple[int, int, int]]:
+    # A sentence over the limit (tables, run-on OCR lines) is cut between words
+    words = [m.span() for m in WORD.finditer(text, start, end)]
+    pieces = []
+    piece_start, size = None, 0
+    last_end = start
+    for (s, e), n in zip(words, count_tokens([text[s:e] for s, e in words])):
+        if piece_start is not None and size + n > max_tokens:
+            pieces.append((piece_start, last_end, size))
+            piece_start, size = None, 0
+        if piece_start is None:
+            piece_start = s
+        size += n
+        last_end = e
+    if piece_start is not None:
+        pieces.append((piece_start, last_end, size))
+    return pieces
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_chunks(text: str, max_tokens: int = MAX_CHUNK_TOKENS, overlap: int = OVERLAP_TOKENS,
+                count_tokens: CountTokens = count_words, start: int = 0, end: Optional[int] = None,
+                batch_size: int = SENTENCE_BATCH) -> Iterator[Tuple[str, Dict[str, int]]]:
+    # One streaming pass over text[start:end]: sentences are packed into chunks of at
+    # most max_tokens, a chunk is closed early at a paragraph break once it is half
+    # full, and up to `overlap` tokens of trailing sentences are repeated in the next
+    # chunk (not across paragraphs). Each chunk comes with its provenance: character
+    # offsets into `text`, 1-based pages (counted from form feeds) and token count.
+    page_breaks = [m.start() for m in re.finditer(PAGE_BREAK, text)]
+    window = []  # (start, end, tokens) of the sentences in the current chunk
+    size = 0
+
+    def emit():
+        s, e = window[0][0], window[-1][1]
+        return ' '.join(text[s:e].split()), {
+            'start': s, 'end': e,
+            'page': bisect_right(page_breaks, s) + 1, 'end_page': bisect_right(page_breaks, e - 1) + 1,
+            'tokens': size,
+        }
+
+    for batch in _batched(iter_sentences(text, start, end), batch_size):
+        counts = count_tokens([text[s:e] for s, e, _ in batch])
+        for (s, e, new_paragraph), n in zip(batch, counts):
+            pieces = [(s, e, n)] if n <= max_tokens else _split_long(text, s, e, max_tokens, count_tokens)
+            for piece_start, piece_end, piece_tokens in pieces:
+                if window and (size + piece_tokens > max_tokens or (new_paragraph and size >= max_tokens // 2)):
+                    yield emit()
+                    carry = []
+                    if not new_paragraph:
+                        carried = 0
+                        for item in reversed(window):
+                            if carried + item[2] > overlap or carried + item[2] + piece_tokens > max_tokens:
+                                break
+                            carry.insert(0, item)
+                            carried += item[2]
+                    window = carry
+                    size = sum(item[2] for item in window)
+                window.append((piece_start, piece_end, piece_tokens))
+                size += piece_tokens
+                new_paragraph = False
+    if window:
+        yield emit()
+
+def chunk_document(text: str, max_tokens: int = MAX_CHUNK_TOKENS, overlap: int = OVERLAP_TOKENS,
+                   count_tokens: CountTokens = count_words, start: int = 0,
+                   end: Optional[int] = None) -> Tuple[List[str], List[Dict[str, int]]]:
+    chunks, provenance = [], []
+    for chunk, source in iter_chunks(text, max_tokens, overlap, count_tokens, start, end):
+        chunks.append(chunk)
+        provenance.append(source)
+    return chunks, provenance
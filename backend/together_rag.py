@@ -1,70 +1,340 @@
 import os
 import re
+import json
+import random
+import hashlib
+import logging
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from together import Together
 from faiss_store import ChapterFaissStore
-from typing import List, Dict, Tuple
+from disk_cache import DiskCache
+from llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, PRIORITY_DEFAULT, PRIORITY_BULK
+import metrics
+from metrics import stage
+from context_budget import (assemble_context, estimate_tokens, NOTES_CONTEXT_TOKENS, EXPLAIN_CONTEXT_TOKENS,
+                            MCQ_CONTEXT_TOKENS)
+from typing import List, Dict, Tuple, Optional, Any, Iterator
 from dotenv import load_dotenv
 
 # Load .env for Together API key
 env_loaded = load_dotenv()
 
+# One INFO line per LLM call with prompt/completion token counts and latency;
+# context assembly details at DEBUG
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+# Optional override of the Together API endpoint, e.g. a local fake_llm server
+LLM_BASE_URL = os.getenv("TOGETHER_BASE_URL")
+
+# MCQ generation: questions requested per LLM call, concurrent calls, and how many
+# calls (as a multiple of the minimum needed) we allow before giving up on retries
+MCQ_QUESTIONS_PER_CALL = 5
+MCQ_MAX_WORKERS = 4
+MCQ_MAX_CALL_FACTOR = 3
+# Each MCQ call gets its own window of the chapter's coverage-ordered chunks (one
+# chunk per question asked, packed into MCQ_CONTEXT_TOKENS per question); a generated
+# question whose embedding is within MCQ_DUPLICATE_SIMILARITY cosine of a kept one is dropped
+MCQ_DUPLICATE_SIMILARITY = 0.9
+# Where quiz MCQs come from: "llm" generates them; "index" assembles fill-in-the-blank
+# questions from the facts and distractors precomputed at index time (sentence_index),
+# with no LLM call, and only asks the LLM for what the index cannot cover
+MCQ_SOURCES = ("llm", "index")
+MCQ_SOURCE = os.getenv("MCQ_SOURCE", "llm")
+MCQ_BLANK = "_____"
+
+# Generated-content cache: notes and explanations keyed by model, prompt hash and
+# generation parameters, plus a per-chapter bank of pre-generated MCQs
+RESPONSE_CACHE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../cache/responses.sqlite'))
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+# RESPONSE_CACHE=0 turns the cache off, e.g. for load tests that must reach the LLM
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+MCQ_BANK_SIZE = 50
+MCQ_BANK_MAX = 200
+
+# Retrieval through ChapterFaissStore.hybrid_search_many (dense + BM25, optional
+# re-ranking); HYBRID_RETRIEVAL=0 goes back to dense-only search
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") != "0"
+
+# Concurrent LLM calls when explaining a graded quiz's wrong answers
+EXPLAIN_MAX_WORKERS = 4
+
+def log_llm_call(kind: str, prompt: str, content: str, usage: Any, seconds: float):
+    # Token counts from the API's `usage` when it reports one, else estimated
+    log = logger.isEnabledFor(logging.INFO)
+    if not (log or metrics.METRICS_ENABLED):
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    source = "usage" if prompt_tokens is not None else "estimate"
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(content)
+    if log:
+        logger.info("llm_call kind=%s prompt_tokens=%d completion_tokens=%d seconds=%.3f tokens=%s",
+                    kind, prompt_tokens, completion_tokens, seconds, source)
+    metrics.record_stage("llm", seconds, kind=kind)
+    metrics.inc("llm_tokens_total", prompt_tokens, kind=kind, type="prompt")
+    metrics.inc("llm_tokens_total", completion_tokens, kind=kind, type="completion")
+    metrics.trace_count("prompt_tokens", prompt_tokens)
+    metrics.trace_count("completion_tokens", completion_tokens)
+
+def open_response_cache(path: str = RESPONSE_CACHE_PATH, max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                        ttl: Optional[float] = RESPONSE_CACHE_TTL) -> Optional[DiskCache]:
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    return DiskCache(path, max_bytes=max_bytes, ttl=ttl)
+
+class QuestionDeduper:
+    # Filters generated MCQs against those already kept (and `existing`, e.g. the
+    # chapter's bank) by cosine similarity of their question embeddings
+    def __init__(self, embed, existing: List[Dict] = (), threshold: float = MCQ_DUPLICATE_SIMILARITY):
+        self._embed = embed
+        self.threshold = threshold
+        self.dropped = 0
+        self._kept = None
+        if existing:
+            self._kept = self._vectors(existing)
+
+    def _vectors(self, mcqs: List[Dict]) -> np.ndarray:
+        vectors = np.asarray(self._embed([mcq["question"] for mcq in mcqs]), dtype='float32')
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def filter(self, mcqs: List[Dict]) -> List[Dict]:
+        if not mcqs:
+            return []
+        kept = []
+        for mcq, vector in zip(mcqs, self._vectors(mcqs)):
+            if self._kept is not None and float((self._kept @ vector).max()) >= self.threshold:
+                self.dropped += 1
+                metrics.inc("mcq_duplicates_total")
+                continue
+            kept.append(mcq)
+            self._kept = vector[None] if self._kept is None else np.vstack([self._kept, vector])
+        return kept
+
 class TogetherRAG:
-    def __init__(self, faiss_store: ChapterFaissStore):
-        api_key = os.getenv("TOGETHER_API")
-        if not api_key:
-            raise ValueError("TOGETHER_API key not found in environment variables.")
-        self.client = Together(api_key=api_key)
+    def __init__(self, faiss_store: ChapterFaissStore, client: Optional[Any] = None, model: str = DEFAULT_MODEL,
+                 cache: Optional[DiskCache] = None, hybrid: bool = HYBRID_RETRIEVAL,
+                 scheduler: Optional[LLMScheduler] = None):
+        # `client` is anything exposing `chat.completions.create(model=..., messages=..., **kwargs)`
+        # like the Together SDK, e.g. fake_llm.FakeLLMClient for offline runs and benchmarks
+        if client is None:
+            api_key = os.getenv("TOGETHER_API")
+            if not api_key:
+                raise ValueError("TOGETHER_API key not found in environment variables.")
+            # Retries and backoff are the scheduler's job
+            client = Together(api_key=api_key, base_url=LLM_BASE_URL, max_retries=0)
+        self.client = client
+        # All LLM calls: coalescing, priorities, rate limiting and retries
+        self.scheduler = scheduler if scheduler is not None else LLMScheduler()
         self.faiss_store = faiss_store
-        self.model = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+        self.model = model
+        self.cache = cache
+        self.hybrid = hybrid
+        self._mcq_cursor = {}  # chapter -> position in its coverage order
+        self._mcq_lock = threading.Lock()
+        self._bank_locks = {}  # chapter -> lock serializing its MCQ bank updates
 
-    def retrieve_context(self, chapter: str, query: str, top_k: int = 5) -> List[str]:
-        results = self.faiss_store.search(chapter, query, top_k)
-        return [chunk for chunk, _ in results]
+    def _cache_key(self, kind: str, **fields) -> str:
+        payload = json.dumps({"kind": kind, "model": self.model, **fields}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    def generate_chapter_notes(self, chapter: str) -> str:
-        context = "\n".join(self.retrieve_context(chapter, "summary"))
-        prompt = f"Summarize the following chapter for a student preparing for exams.\n{context}"
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-
-    def extract_facts_for_mcq(self, context_chunks: List[str], num_options: int = 4) -> List[str]:
-        # Naive approach: split context into sentences and pick unique ones as options
-        sentences = []
-        for chunk in context_chunks:
-            sentences.extend(re.split(r'(?<=[.!?]) +', chunk))
-        # Remove duplicates and empty
-        unique_sentences = list({s.strip() for s in sentences if len(s.strip()) > 20})
-        return unique_sentences[:num_options]
-
-    def generate_mcq(self, chapter: str, num_mcqs: int = 5, num_options: int = 4) -> List[Dict]:
-        context_chunks = self.retrieve_context(chapter, "mcq", top_k=3)
-        context = "\n".join(context_chunks)
-        if len(context) > 2000:
-            context = context[:2000]
-        mcqs = []
-        for i in range(num_mcqs):
-            prompt = (
-                f"Based only on the following context, generate one multiple-choice question for a student. "
-                f"Provide 4 options, mark the correct answer, and give a brief explanation. "
-                f"Do not use any information not present in the context.\n\n"
-                f"Context:\n{context}\n\n"
-                "Format your response as:\n"
-                "Question: ...\nA) ...\nB) ...\nC) ...\nD) ...\nAnswer: <A/B/C/D>\nExplanation: ..."
-            )
+    def _completion_key(self, prompt: str, params: Dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self._cache_key("completion", prompt=prompt, params=params)
+
+    def _request_key(self, prompt: str, params: Dict) -> str:
+        # Coalescing key for identical in-flight requests; needed with or without a cache
+        return self._cache_key("request", prompt=prompt, params=params)
+
+    def _complete(self, prompt: str, use_cache: bool = True, kind: str = "completion",
+                  priority: int = PRIORITY_DEFAULT, coalesce: bool = True, **kwargs) -> str:
+        # Identical (model, prompt, params) requests are answered from the cache, or share
+        # the call already in flight. MCQ generation opts out of both because it relies
+        # on sampling to get different questions.
+        key = self._completion_key(prompt, kwargs) if use_cache else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        def call():
+            start = time.perf_counter()
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=512
+                **kwargs
             )
             content = response.choices[0].message.content.strip()
-            # Parse the LLM response
-            q_match = re.search(r"Question:\s*(.*)", content)
-            opts = re.findall(r"([A-D])\)\s*(.*)", content)
-            ans_match = re.search(r"Answer:\s*([A-D])", content)
-            exp_match = re.search(r"Explanation:\s*(.*)", content)
+            log_llm_call(kind, prompt, content, getattr(response, "usage", None), time.perf_counter() - start)
+            if key is not None:
+                self.cache.set(key, content)
+            return content
+
+        request_key = ("complete", self._request_key(prompt, kwargs)) if coalesce else None
+        return self.scheduler.run(request_key, call, priority)
+
+    def _stream(self, prompt: str, key: Optional[str] = None, kind: str = "completion",
+                priority: int = PRIORITY_DEFAULT, **kwargs) -> Iterator[str]:
+        # Yield completion deltas as they arrive; a cached answer comes back as one delta
+        # and a finished stream is stored under `key` just like a blocking completion.
+        # Concurrent identical streams share one upstream stream.
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        yield from self._stream_upstream(prompt, key, kind, priority, **kwargs)
+
+    def _stream_upstream(self, prompt: str, key: Optional[str], kind: str, priority: int,
+                         **kwargs) -> Iterator[str]:
+        # _stream after a cache miss, for callers that already looked `key` up
+        def produce(emit):
+            start = time.perf_counter()
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **kwargs
+            )
+            parts = []
+            usage = None
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage  # sent with the last chunk, if at all
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    emit(delta)
+            log_llm_call(kind, prompt, "".join(parts), usage, time.perf_counter() - start)
+            if key is not None:
+                self.cache.set(key, "".join(parts).strip())
+
+        yield from self.scheduler.stream(("stream", self._request_key(prompt, kwargs)), produce, priority)
+
+    def retrieve_context(self, chapter: str, query: str, top_k: int = 5) -> List[str]:
+        return self.retrieve_contexts(chapter, [query], top_k)[0]
+
+    def retrieve_contexts(self, chapter: str, queries: List[str], top_k: int = 5) -> List[List[str]]:
+        # One batched encode + index search for several queries
+        if self.hybrid:
+            results = self.faiss_store.hybrid_search_many(chapter, queries, top_k)
+        else:
+            results = self.faiss_store.search_many(chapter, queries, top_k)
+        return [[chunk for chunk, _ in hits] for hits in results]
+
+    @staticmethod
+    def _context(chunks: List[str], query: str, budget: int) -> str:
+        with stage("context"):
+            context, stats = assemble_context(chunks, query, budget)
+        logger.debug("context chunks=%(chunks)d sentences=%(sentences)d duplicates=%(duplicates)d kept=%(kept)d "
+                     "input_tokens=%(input_tokens)d context_tokens=%(context_tokens)d", stats)
+        return context
+
+    def _explanation_context(self, question: str, correct_answer: str, chunks: List[str]) -> str:
+        return self._context(chunks, f"{question} {correct_answer}", EXPLAIN_CONTEXT_TOKENS)
+
+    def _notes_prompt(self, chapter: str) -> str:
+        # "summary" only steers retrieval; the context keeps every chunk represented
+        context = self._context(self.retrieve_context(chapter, "summary"), "", NOTES_CONTEXT_TOKENS)
+        return f"Summarize the following chapter for a student preparing for exams.\n{context}"
+
+    def generate_chapter_notes(self, chapter: str) -> str:
+        return self._complete(self._notes_prompt(chapter), kind="notes")
+
+    def stream_chapter_notes(self, chapter: str) -> Iterator[str]:
+        # A generator, so retrieval errors surface while streaming (as an SSE error
+        # frame) rather than when the stream is created
+        prompt = self._notes_prompt(chapter)
+        yield from self._stream(prompt, self._completion_key(prompt, {}), kind="notes")
+
+    def _cursor(self, chapter: str, size: int) -> int:
+        # Position in the chapter's coverage order (of `size` chunks) for the next
+        # questions; the LLM windows and index facts share it, so mixed quizzes do not
+        # repeat chunks
+        with self._mcq_lock:
+            start = self._mcq_cursor.get(chapter)
+            if start is None:
+                start = self._mcq_cursor[chapter] = random.randrange(size)
+        return start
+
+    def _advance_cursor(self, chapter: str, count: int, size: int) -> None:
+        with self._mcq_lock:
+            self._mcq_cursor[chapter] = (self._mcq_cursor.get(chapter, 0) + count) % size
+
+    def _take_cursor(self, chapter: str, count: int, size: int) -> int:
+        start = self._cursor(chapter, size)
+        self._advance_cursor(chapter, count, size)
+        return start
+
+    def extract_facts_for_mcq(self, chapter: str, count: int = MCQ_QUESTIONS_PER_CALL,
+                              num_options: int = 4) -> List[Dict]:
+        # Facts precomputed at index time with num_options - 1 semantically close
+        # distractors each; empty if the chapter was indexed without sentences. The
+        # cursor only moves past the facts actually returned.
+        size = len(self.faiss_store.diverse_chunks(chapter))
+        if not size:
+            return []
+        start = self._cursor(chapter, size)
+        facts = self.faiss_store.candidate_facts(chapter, count, start, num_options - 1)
+        self._advance_cursor(chapter, len(facts), size)
+        return facts
+
+    @staticmethod
+    def cloze_mcq(fact: Dict) -> Dict:
+        # A fill-in-the-blank MCQ in parse_mcqs' format: the fact with its key term
+        # blanked, the key term and its distractors shuffled as the options
+        blanked = re.sub(rf"\b{re.escape(fact['answer'])}\b", MCQ_BLANK, fact["sentence"], flags=re.IGNORECASE)
+        options = [fact["answer"]] + list(fact["distractors"])
+        random.shuffle(options)
+        correct_idx = options.index(fact["answer"])
+        return {
+            "question": f"Fill in the blank: {blanked}",
+            "options": options,
+            "correct": fact["answer"],
+            "correct_letter": chr(ord('A') + correct_idx),
+            "explanation": fact["sentence"]
+        }
+
+    def _index_mcqs(self, chapter: str, num_mcqs: int, num_options: int = 4) -> List[Dict]:
+        with stage("mcq_index"):
+            mcqs = [self.cloze_mcq(fact) for fact in self.extract_facts_for_mcq(chapter, num_mcqs, num_options)]
+        metrics.inc("mcq_index_total", len(mcqs))
+        return mcqs
+
+    @staticmethod
+    def _mcq_prompt(context: str, count: int) -> str:
+        if count == 1:
+            ask = "generate one multiple-choice question for a student. "
+        else:
+            ask = f"generate {count} different multiple-choice questions for a student. "
+        return (
+            f"Based only on the following context, {ask}"
+            f"Provide 4 options, mark the correct answer, and give a brief explanation. "
+            f"Do not use any information not present in the context.\n\n"
+            f"Context:\n{context}\n\n"
+            "Format each question as:\n"
+            "Question: ...\nA) ...\nB) ...\nC) ...\nD) ...\nAnswer: <A/B/C/D>\nExplanation: ..."
+        )
+
+    @staticmethod
+    def parse_mcqs(content: str) -> List[Dict]:
+        # Split the LLM response into one block per "Question:" and parse each,
+        # silently skipping malformed blocks
+        mcqs = []
+        for block in re.split(r"(?=Question:)", content):
+            q_match = re.search(r"Question:\s*(.*)", block)
+            opts = re.findall(r"([A-D])\)\s*(.*)", block)
+            ans_match = re.search(r"Answer:\s*([A-D])", block)
+            exp_match = re.search(r"Explanation:\s*(.*)", block)
             if not (q_match and len(opts) == 4 and ans_match):
                 continue  # skip malformed MCQ
             question = q_match.group(1).strip()
@@ -82,33 +352,250 @@ class TogetherRAG:
             })
         return mcqs
 
-    def explain_answer(self, chapter: str, question: str, user_answer: str, correct_answer: str) -> str:
-        context = "\n".join(self.retrieve_context(chapter, question, top_k=5))
-        prompt = (
+    def _mcq_windows(self, chapter: str, counts: List[int]) -> List[str]:
+        # One context per MCQ call: consecutive slices of the chapter's coverage order
+        # (faiss_store.diverse_chunks), continuing where the previous call stopped so
+        # successive calls and quizzes move through the whole chapter
+        chunks = self.faiss_store.diverse_chunks(chapter)
+        if not chunks:
+            return ["" for _ in counts]
+        start = self._take_cursor(chapter, sum(counts), len(chunks))
+        windows = []
+        for count in counts:
+            window = [chunks[(start + i) % len(chunks)] for i in range(min(count, len(chunks)))]
+            windows.append(self._context(window, "", MCQ_CONTEXT_TOKENS * count))
+            start += count
+        return windows
+
+    def _generate_mcq_batch(self, context: str, count: int, priority: int = PRIORITY_DEFAULT) -> List[Dict]:
+        content = self._complete(self._mcq_prompt(context, count), use_cache=False, kind="mcq", priority=priority,
+                                 coalesce=False, max_tokens=512 * count)
+        return self._parse_batch(content, count)
+
+    @classmethod
+    def _parse_batch(cls, content: str, count: int) -> List[Dict]:
+        # Parse failure rate = 1 - mcq_parsed_total / mcq_requested_total
+        with stage("parse"):
+            mcqs = cls.parse_mcqs(content)[:count]
+        metrics.inc("mcq_requested_total", count)
+        metrics.inc("mcq_parsed_total", len(mcqs))
+        return mcqs
+
+    def load_mcq_bank(self, chapter: str) -> List[Dict]:
+        # Banks are pinned: no TTL, and notes traffic cannot evict them from the cache
+        if self.cache is None:
+            return []
+        key = self._cache_key("mcq_bank", chapter=chapter)
+        stored = self.cache.get_pinned(key)
+        if stored is None:
+            stored = self.cache.get(key)  # a bank saved before banks were pinned
+        return json.loads(stored) if stored else []
+
+    def _bank_lock(self, chapter: str) -> threading.Lock:
+        with self._mcq_lock:
+            return self._bank_locks.setdefault(chapter, threading.Lock())
+
+    def _add_to_mcq_bank(self, chapter: str, fresh: List[Dict]) -> int:
+        # Re-read the bank under the chapter's lock and append, so concurrent quizzes do
+        # not overwrite each other's new questions (within this process); returns its size
+        if self.cache is None:
+            return 0
+        with self._bank_lock(chapter):
+            bank = self.load_mcq_bank(chapter)
+            known = {mcq["question"] for mcq in bank}
+            bank += [mcq for mcq in fresh if mcq["question"] not in known]
+            bank = bank[-MCQ_BANK_MAX:]
+            self.cache.set_pinned(self._cache_key("mcq_bank", chapter=chapter), json.dumps(bank))
+            return len(bank)
+
+    def clear_mcq_bank(self, chapter: str):
+        if self.cache is not None:
+            key = self._cache_key("mcq_bank", chapter=chapter)
+            with self._bank_lock(chapter):
+                self.cache.delete_pinned(key)
+                self.cache.delete(key)
+
+    def fill_mcq_bank(self, chapter: str, size: int = MCQ_BANK_SIZE) -> int:
+        # Pre-generate MCQs so quizzes for this chapter can be served without LLM calls
+        bank = self.load_mcq_bank(chapter)
+        if len(bank) < size:
+            fresh = self._generate_new_mcqs(chapter, size - len(bank), existing=bank, priority=PRIORITY_BULK)
+            return self._add_to_mcq_bank(chapter, fresh)
+        return len(bank)
+
+    def generate_mcq(self, chapter: str, num_mcqs: int = 5, num_options: int = 4,
+                     questions_per_call: int = MCQ_QUESTIONS_PER_CALL,
+                     max_workers: int = MCQ_MAX_WORKERS, use_bank: bool = True,
+                     source: str = MCQ_SOURCE) -> List[Dict]:
+        # With source="index", assemble questions from precomputed facts first. Then draw
+        # from the chapter's MCQ bank and only generate what it cannot cover; new
+        # questions are added to the bank for later quizzes
+        if source not in MCQ_SOURCES:
+            raise ValueError(f"Unknown MCQ source {source!r}; expected one of {MCQ_SOURCES}.")
+        mcqs = self._index_mcqs(chapter, num_mcqs, num_options) if source == "index" else []
+        missing = num_mcqs - len(mcqs)
+        if missing > 0:
+            bank = self.load_mcq_bank(chapter) if use_bank else []
+            mcqs += random.sample(bank, min(missing, len(bank)))
+            if len(mcqs) < num_mcqs:
+                fresh = self._generate_new_mcqs(chapter, num_mcqs - len(mcqs), questions_per_call, max_workers,
+                                                existing=bank)
+                if use_bank and fresh:
+                    self._add_to_mcq_bank(chapter, fresh)
+                mcqs += fresh
+        return [dict(mcq) for mcq in mcqs]
+
+    def _generate_new_mcqs(self, chapter: str, num_mcqs: int,
+                           questions_per_call: int = MCQ_QUESTIONS_PER_CALL,
+                           max_workers: int = MCQ_MAX_WORKERS, existing: List[Dict] = (),
+                           priority: int = PRIORITY_DEFAULT) -> List[Dict]:
+        dedupe = QuestionDeduper(self.faiss_store.embed_chunks, existing)
+        questions_per_call = max(1, questions_per_call)
+        max_workers = max(1, max_workers)
+        max_calls = -(-num_mcqs // questions_per_call) * MCQ_MAX_CALL_FACTOR
+        mcqs = []
+        calls = 0
+        # Keep at most `max_workers` calls in flight, asking each for just enough questions
+        # to cover what is still missing; malformed or duplicate output is retried until
+        # `num_mcqs` valid questions exist or the call budget runs out.
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {}
+            while len(mcqs) < num_mcqs:
+                requested = sum(pending.values())
+                while len(pending) < max_workers and calls < max_calls and len(mcqs) + requested < num_mcqs:
+                    count = min(questions_per_call, num_mcqs - len(mcqs) - requested)
+                    context = self._mcq_windows(chapter, [count])[0]
+                    pending[pool.submit(self._generate_mcq_batch, context, count, priority)] = count
+                    requested += count
+                    calls += 1
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    mcqs.extend(dedupe.filter(future.result()))
+            for future in pending:
+                future.cancel()
+        return mcqs[:num_mcqs]
+
+    def _explanation_key(self, chapter: str, question: str, user_answer: str, correct_answer: str) -> Optional[str]:
+        # Keyed on the (question, wrong answer) pair so repeats skip retrieval as well
+        if self.cache is None:
+            return None
+        return self._cache_key("explanation", chapter=chapter, question=question,
+                               user_answer=user_answer, correct_answer=correct_answer)
+
+    @staticmethod
+    def _explanation_prompt(question: str, user_answer: str, correct_answer: str, context: str) -> str:
+        return (
             f"Given the following question and context:\n{question}\nContext:\n{context}\n"
             f"The user's answer was: {user_answer}\nThe correct answer is: {correct_answer}.\n"
             "Explain why the user's answer is incorrect and provide the correct reasoning."
         )
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
+
+    def explain_answer(self, chapter: str, question: str, user_answer: str, correct_answer: str) -> str:
+        key = self._explanation_key(chapter, question, user_answer, correct_answer)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        context = self._explanation_context(question, correct_answer, self.retrieve_context(chapter, question, top_k=5))
+        prompt = self._explanation_prompt(question, user_answer, correct_answer, context)
+        explanation = self._complete(prompt, use_cache=False, kind="explanation", priority=PRIORITY_INTERACTIVE)
+        if key is not None:
+            self.cache.set(key, explanation)
+        return explanation
+
+    def stream_explanation(self, chapter: str, question: str, user_answer: str, correct_answer: str) -> Iterator[str]:
+        key = self._explanation_key(chapter, question, user_answer, correct_answer)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        context = self._explanation_context(question, correct_answer, self.retrieve_context(chapter, question, top_k=5))
+        prompt = self._explanation_prompt(question, user_answer, correct_answer, context)
+        yield from self._stream_upstream(prompt, key, "explanation", PRIORITY_INTERACTIVE)
+
+    def _grade_locally(self, chapter: str, mcqs: List[Dict], user_answers: List) -> Tuple[List[Dict], List[Tuple[Dict, Optional[str]]]]:
+        # Grade against the stored answer keys (no LLM call) and fill in cached explanations.
+        # Returns every result plus the (result, cache key) pairs still needing an explanation.
+        results = []
+        wrong = []
+        for i, mcq in enumerate(mcqs):
+            answer = user_answers[i] if i < len(user_answers) else None
+            if isinstance(answer, int):
+                answer = mcq["options"][answer] if 0 <= answer < len(mcq["options"]) else None
+            result = {
+                "index": i,
+                "question": mcq["question"],
+                "user_answer": answer,
+                "correct_answer": mcq["correct"],
+                "is_correct": answer == mcq["correct"],
+                "explanation": ""
+            }
+            results.append(result)
+            if result["is_correct"]:
+                continue
+            key = self._explanation_key(chapter, mcq["question"], answer, mcq["correct"])
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                result["explanation"] = cached
+            else:
+                wrong.append((result, key))
+        return results, wrong
+
+    def grade_answers(self, chapter: str, mcqs: List[Dict], user_answers: List,
+                      max_workers: int = EXPLAIN_MAX_WORKERS) -> Iterator[Dict]:
+        # Grade locally, then explain the remaining wrong answers with one batched
+        # retrieval and at most `max_workers` concurrent LLM calls. Results are yielded
+        # as they complete; each carries the question's `index`. `user_answers` holds
+        # option indexes or option texts.
+        results, wrong = self._grade_locally(chapter, mcqs, user_answers)
+        pending = {id(result) for result, _ in wrong}
+        for result in results:
+            if id(result) not in pending:
+                yield result
+        if not wrong:
+            return
+        contexts = self.retrieve_contexts(chapter, [result["question"] for result, _ in wrong], top_k=5)
+
+        def explain(result, key, context):
+            context = self._explanation_context(result["question"], result["correct_answer"], context)
+            prompt = self._explanation_prompt(result["question"], result["user_answer"],
+                                              result["correct_answer"], context)
+            result["explanation"] = self._complete(prompt, use_cache=False, kind="explanation",
+                                                   priority=PRIORITY_INTERACTIVE)
+            if key is not None:
+                self.cache.set(key, result["explanation"])
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [pool.submit(explain, result, key, context) for (result, key), context in zip(wrong, contexts)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def grade_quiz(self, chapter: str, mcqs: List[Dict], user_answers: List,
+                   max_workers: int = EXPLAIN_MAX_WORKERS) -> List[Dict]:
+        # grade_answers collected back into question order
+        return sorted(self.grade_answers(chapter, mcqs, user_answers, max_workers), key=lambda r: r["index"])
 
 if __name__ == "__main__":
     import sys
     print("=== TogetherRAG CLI Test ===")
-    faiss_store = ChapterFaissStore(index_dir="../faiss_indexes")
-    rag = TogetherRAG(faiss_store)
+    from embedding_server import make_faiss_store
+    faiss_store = make_faiss_store("../faiss_indexes")
+    rag = TogetherRAG(faiss_store, cache=open_response_cache())
 
-    chapters = ["Full Book", "UNIT 1"]
+    from chapter_registry import ChapterRegistry
+    chapters = ChapterRegistry(faiss_store, "../faiss_indexes").chapters()
     print("Available chapters:")
     for idx, ch in enumerate(chapters, 1):
         print(f"  {idx}. {ch}")
     ch_idx = int(input("Select chapter (number): ")) - 1
     chapter = chapters[ch_idx]
 
-    print("\n1. Generate Chapter Notes\n2. Generate MCQs\n3. Exit")
+    print("\n1. Generate Chapter Notes\n2. Generate MCQs\n3. Pre-generate MCQ bank\n4. Exit")
     choice = input("Choose an option: ")
 
     if choice == "1":
@@ -133,5 +620,8 @@ if __name__ == "__main__":
                 explain = rag.explain_answer(chapter, mcq['question'], user_ans, mcq['correct'])
                 print("Explanation:", explain)
         print(f"\nYour score: {score}/{len(mcqs)}")
+    elif choice == "3":
+        size = int(input(f"Bank size? (default {MCQ_BANK_SIZE}): ") or str(MCQ_BANK_SIZE))
+        print(f"MCQ bank for {chapter}: {rag.fill_mcq_bank(chapter, size)} questions")
     else:
         print("Exiting.") 
\ No newline at end of file